@@ -1,17 +1,28 @@
 import os
 #!/usr/bin/env python3
-"""Consolidate ETH from Moltlaunch wallet to skill wallet"""
+"""Consolidate ETH from Moltlaunch wallet to skill wallet
 
-from web3 import Web3
+One-shot version; treasury_sweeper.py does this continuously for many wallets.
+"""
+
+from rpc_pool import make_web3
+from tx_builder import TxBuilder
+from tx_sequencer import TxSequencer
 
-RPC = "https://mainnet.base.org"
 SKILL_WALLET = "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"
 
 # Moltlaunch wallet - has key
 MOLT_WALLET = "0x0DD2cBeE0504f6C5981e7e266CDC2B733Cb36EDA"
 MOLT_KEY = os.environ.get("MOLT_PRIVATE_KEY", "")
 
-w3 = Web3(Web3.HTTPProvider(RPC))
+# Set up by connect() so importing this module stays cheap
+w3 = builder = sequencer = None
+
+def connect():
+    global w3, builder, sequencer
+    w3 = make_web3()
+    builder = TxBuilder(w3)
+    sequencer = TxSequencer(w3, builder)
 
 def get_balance(addr):
     return w3.eth.get_balance(addr)
@@ -19,47 +30,44 @@ def get_balance(addr):
 def send_max(from_addr, from_key, to_addr):
     """Send max ETH minus gas"""
     balance = get_balance(from_addr)
-    gas_price = w3.eth.gas_price
-    gas_limit = 21000
-    gas_cost = gas_price * gas_limit
+    # Pin the fee quote so the amount + gas reservation exactly match the balance
+    tx = {'to': to_addr, **builder.fee_oracle.fees()}
+    gas_cost = builder.max_gas_cost(tx)
     
     if balance <= gas_cost:
         print(f"  Balance {w3.from_wei(balance, 'ether'):.6f} ETH <= gas cost, skipping")
         return None
     
     amount = balance - gas_cost
+    tx['value'] = amount
     
-    tx = {
-        'nonce': w3.eth.get_transaction_count(from_addr),
-        'to': to_addr,
-        'value': amount,
-        'gas': gas_limit,
-        'gasPrice': gas_price,
-        'chainId': 8453
-    }
-    
-    signed = w3.eth.account.sign_transaction(tx, from_key)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
+    pending = sequencer.submit(from_key, tx, sweep=True)
     print(f"  Sent {w3.from_wei(amount, 'ether'):.6f} ETH")
-    print(f"  TX: https://basescan.org/tx/{tx_hash.hex()}")
-    return tx_hash
+    print(f"  TX: https://basescan.org/tx/{pending.tx_hash}")
+    return pending
 
-print("=== Consolidating to Skill Wallet ===\n")
+def main():
+    connect()
+    print("=== Consolidating to Skill Wallet ===\n")
 
-print("Before:")
-skill_bal = get_balance(SKILL_WALLET)
-molt_bal = get_balance(MOLT_WALLET)
-print(f"  Skill:      {w3.from_wei(skill_bal, 'ether'):.6f} ETH")
-print(f"  Moltlaunch: {w3.from_wei(molt_bal, 'ether'):.6f} ETH")
+    print("Before:")
+    skill_bal = get_balance(SKILL_WALLET)
+    molt_bal = get_balance(MOLT_WALLET)
+    print(f"  Skill:      {w3.from_wei(skill_bal, 'ether'):.6f} ETH")
+    print(f"  Moltlaunch: {w3.from_wei(molt_bal, 'ether'):.6f} ETH")
 
-print(f"\nTransferring from Moltlaunch...")
-result = send_max(MOLT_WALLET, MOLT_KEY, SKILL_WALLET)
+    print(f"\nTransferring from Moltlaunch...")
+    result = send_max(MOLT_WALLET, MOLT_KEY, SKILL_WALLET)
 
-if result:
-    # Wait for confirmation
-    receipt = w3.eth.wait_for_transaction_receipt(result)
-    print(f"  Confirmed in block {receipt['blockNumber']}")
-    
-print("\nAfter:")
-print(f"  Skill: {w3.from_wei(get_balance(SKILL_WALLET), 'ether'):.6f} ETH")
+    if result:
+        # Wait for confirmation
+        receipt = result.result()
+        print(f"  Confirmed in block {receipt['blockNumber']}")
+
+    print("\nAfter:")
+    print(f"  Skill: {w3.from_wei(get_balance(SKILL_WALLET), 'ether'):.6f} ETH")
+
+
+if __name__ == "__main__":
+    main()
 # Security audit completed Wed Feb  4 15:14:01 CST 2026
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Estimate Store for FRED
+
+Each paid inference costs $0.005, so a scan should only re-ask the LLM
+about markets that changed. The store keeps, per market, the last paid
+probability and confidence plus the market price at estimation time. A
+market is re-estimated only when
+
+  - its price moved by REESTIMATE_PRICE_MOVE or more, or
+  - its estimate is older than REESTIMATE_MAX_AGE seconds.
+
+Everything else reuses the cached estimate, so paid volume and scan
+latency scale with market churn instead of market count.
+
+Usage:
+    store = EstimateStore.load("estimates.json")
+    estimate = cached_estimator(store, X402Estimator(...), market_price)
+    ...
+    store.save()
+"""
+
+import os
+import json
+import time
+import asyncio
+from typing import Callable, Optional
+
+# ============ CONFIG ============
+
+REESTIMATE_PRICE_MOVE = float(os.getenv("REESTIMATE_PRICE_MOVE", "0.02"))
+REESTIMATE_MAX_AGE = float(os.getenv("REESTIMATE_MAX_AGE", "21600"))  # 6h
+
+
+def market_id(market) -> str:
+    return str(getattr(market, "id", None) or market.question)
+
+
+class Estimate:
+    """Last paid estimate for one market."""
+
+    __slots__ = ("probability", "confidence", "price", "estimated_at")
+
+    def __init__(self, probability: float, confidence: float, price: float, estimated_at: float):
+        self.probability = probability
+        self.confidence = confidence
+        self.price = price
+        self.estimated_at = estimated_at
+
+    def as_dict(self) -> dict:
+        return {"probability": self.probability, "confidence": self.confidence}
+
+
+class EstimateStore:
+    """Paid estimates keyed by market id, with staleness rules."""
+
+    def __init__(
+        self,
+        price_move: float = REESTIMATE_PRICE_MOVE,
+        max_age: float = REESTIMATE_MAX_AGE,
+        path: Optional[str] = None,
+    ):
+        self.price_move = price_move
+        self.max_age = max_age
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._estimates: dict[str, Estimate] = {}
+
+    def __len__(self) -> int:
+        return len(self._estimates)
+
+    def get(self, key: str) -> Optional[Estimate]:
+        return self._estimates.get(key)
+
+    def put(self, key: str, probability: float, confidence: float, price: float,
+            now: Optional[float] = None):
+        self._estimates[key] = Estimate(
+            probability, confidence, price, time.time() if now is None else now
+        )
+
+    def is_fresh(self, key: str, price: float, now: Optional[float] = None) -> bool:
+        estimate = self._estimates.get(key)
+        if estimate is None:
+            return False
+        now = time.time() if now is None else now
+        return (
+            abs(price - estimate.price) < self.price_move
+            and now - estimate.estimated_at < self.max_age
+        )
+
+    def lookup(self, key: str, price: float, now: Optional[float] = None) -> Optional[Estimate]:
+        """Cached estimate if still fresh, counting hits and misses."""
+        if self.is_fresh(key, price, now):
+            self.hits += 1
+            return self._estimates[key]
+        self.misses += 1
+        return None
+
+    def partition(self, markets, prices, now: Optional[float] = None) -> tuple[list, list]:
+        """Split a scan into (needs paid estimate, reusable) market lists."""
+        stale, fresh = [], []
+        for market, price in zip(markets, prices):
+            (fresh if self.is_fresh(market_id(market), price, now) else stale).append(market)
+        return stale, fresh
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drop estimates past max_age; returns how many were removed."""
+        now = time.time() if now is None else now
+        expired = [k for k, e in self._estimates.items() if now - e.estimated_at >= self.max_age]
+        for key in expired:
+            del self._estimates[key]
+        return len(expired)
+
+    # -- persistence --
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "EstimateStore":
+        store = cls(path=path, **kwargs)
+        if os.path.exists(path):
+            with open(path) as f:
+                for key, row in json.load(f).items():
+                    store._estimates[key] = Estimate(*row)
+        return store
+
+    def save(self, path: Optional[str] = None):
+        path = path or self.path
+        if not path:
+            raise ValueError("EstimateStore has no path to save to")
+        data = {
+            k: [e.probability, e.confidence, e.price, e.estimated_at]
+            for k, e in self._estimates.items()
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+
+def cached_estimator(store: EstimateStore, estimate: Callable, price_of: Callable) -> Callable:
+    """
+    Wrap an async estimator so only stale markets reach the proxy.
+
+    `price_of(market)` gives the current YES price. Concurrent requests
+    for the same market share one paid call; if the caller making it is
+    cancelled, a waiting one takes over.
+    """
+    inflight: dict[str, asyncio.Future] = {}
+
+    async def cached(market) -> dict:
+        key, price = market_id(market), price_of(market)
+        hit = store.lookup(key, price)
+        if hit is not None:
+            return hit.as_dict()
+        while key in inflight:
+            shared = inflight[key]
+            try:
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled() or asyncio.current_task().cancelling():
+                    raise  # we were cancelled ourselves
+
+        future = asyncio.get_running_loop().create_future()
+        inflight[key] = future
+        try:
+            result = await estimate(market)
+            store.put(key, result["probability"], result.get("confidence", 1.0), price)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        except BaseException:
+            future.cancel()  # e.g. the caller was cancelled: wake the waiters, one of which retries
+            raise
+        finally:
+            del inflight[key]
+
+    cached.store = store
+    return cached
@@ -6,15 +6,15 @@ Register FRED trading agent on Base mainnet ERC-8004 Identity Registry
 
 import json
 import os
-from web3 import Web3
-from eth_account import Account
+
+from rpc_pool import make_web3
+from tx_builder import TxBuilder
 
 # Base Mainnet ERC-8004 Contracts (official)
 IDENTITY_REGISTRY = "0x8004A169FB4a3325136EB29fA0ceB6D2e539a432"
 REPUTATION_REGISTRY = "0x8004BAa17C55a88189AE136b182e5fdA19dE9b63"
 
-# Base Mainnet RPC
-BASE_RPC = "https://mainnet.base.org"
+# Base Mainnet RPC endpoints: BASE_RPC_URLS, see rpc_pool.py
 
 # FRED Registration File URI (to be hosted)
 FRED_REGISTRATION_URI = "https://raw.githubusercontent.com/rickyautobots/fred-agent/main/registration.json"
@@ -115,7 +115,9 @@ def create_registration_file():
 
 def register_agent(private_key: str, registration_uri: str):
     """Register FRED on Base ERC-8004 Identity Registry"""
-    w3 = Web3(Web3.HTTPProvider(BASE_RPC))
+    from eth_account import Account  # deferred: slow to import
+
+    w3 = make_web3()
     account = Account.from_key(private_key)
     
     identity = w3.eth.contract(address=IDENTITY_REGISTRY, abi=IDENTITY_ABI)
@@ -128,15 +130,10 @@ def register_agent(private_key: str, registration_uri: str):
         return token_id
     
     # Build registration transaction
-    tx = identity.functions.register(
-        account.address,
-        registration_uri
-    ).build_transaction({
+    tx = TxBuilder(w3, chain_id=8453).build({  # Base mainnet
         'from': account.address,
-        'nonce': w3.eth.get_transaction_count(account.address),
-        'gas': 200000,
-        'gasPrice': w3.eth.gas_price,
-        'chainId': 8453  # Base mainnet
+        'to': IDENTITY_REGISTRY,
+        'data': identity.encode_abi("register", args=[account.address, registration_uri]),
     })
     
     # Sign and send
@@ -156,7 +153,7 @@ def register_agent(private_key: str, registration_uri: str):
 
 def check_registration(address: str):
     """Check if an address has a registered agent"""
-    w3 = Web3(Web3.HTTPProvider(BASE_RPC))
+    w3 = make_web3()
     identity = w3.eth.contract(address=IDENTITY_REGISTRY, abi=IDENTITY_ABI)
     
     balance = identity.functions.balanceOf(address).call()
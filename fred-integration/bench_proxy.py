@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark the proxy's 402 path against a bare health check.
+
+Requests go through the ASGI app in-process (no sockets), so the numbers
+are the server's own cost per request. Also times building the 402 body
+with the pydantic model vs the pre-rendered template.
+
+Usage:
+    python bench_proxy.py [--requests 5000]
+"""
+
+import time
+import asyncio
+import argparse
+
+import httpx
+
+import json_codec
+import x402_inference_server as server
+
+
+async def _time_requests(client: httpx.AsyncClient, method: str, path: str, n: int, **kwargs) -> float:
+    """Mean microseconds per request."""
+    for _ in range(min(n, 200)):  # warm up
+        await client.request(method, path, **kwargs)
+    started = time.perf_counter()
+    for _ in range(n):
+        await client.request(method, path, **kwargs)
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def _time_call(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+async def run(n: int) -> dict:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        health = await _time_requests(client, "GET", "/health", n)
+        unpaid = await _time_requests(client, "POST", "/inference", n, json={"prompt": "hi"})
+
+    resource = "http://bench/inference"
+    pydantic_body = _time_call(lambda: server.PaymentRequired(
+        accepts=[server.payment_requirements()],
+        maxAmountRequired=str(server.PRICE_PER_CALL),
+        resource=resource,
+    ).model_dump_json(), n)
+    cached_body = _time_call(lambda: server.payment_required.body("/inference", server.PRICE_PER_CALL, resource), n)
+
+    return {
+        "health_us": health,
+        "payment_required_us": unpaid,
+        "body_pydantic_us": pydantic_body,
+        "body_cached_us": cached_body,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark 402 responses vs /health")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.requests))
+    print(f"⏱️  {args.requests} requests each, JSON backend: {json_codec.BACKEND}")
+    print(f"   GET /health              {result['health_us']:8.1f} µs/req")
+    print(f"   POST /inference (402)    {result['payment_required_us']:8.1f} µs/req "
+          f"({result['payment_required_us'] / result['health_us']:.2f}x health)")
+    print(f"   402 body, pydantic       {result['body_pydantic_us']:8.2f} µs")
+    print(f"   402 body, pre-rendered   {result['body_cached_us']:8.2f} µs "
+          f"({result['body_pydantic_us'] / result['body_cached_us']:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
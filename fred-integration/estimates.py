@@ -0,0 +1,50 @@
+"""
+Structured Estimates
+
+The prompt for a market probability estimate and the validation of the
+model's reply. The proxy's /estimate route and WebSocket estimate frames use
+them server-side; the agent's X402Estimator (market_pipeline.py) imports
+them for free-form /inference calls, so both ends share one prompt and one
+parser.
+"""
+
+import re
+from typing import Optional
+
+import json_codec
+
+ESTIMATE_PROMPT = (
+    "Prediction market: {question}\n"
+    "{price_line}"
+    'Reply with only {{"probability":p,"confidence":c}}, p = P(YES), both in [0,1].'
+)
+
+
+def estimate_prompt(question: str, price: Optional[float] = None, template: str = ESTIMATE_PROMPT) -> str:
+    price_line = "" if price is None else f"YES price: {price:.3f}\n"
+    return template.format(question=question, price_line=price_line)
+
+
+def parse_probability(text: str) -> dict:
+    """Validated {"probability", "confidence"} from a model reply. Raises ValueError."""
+    text = text.strip()
+    try:
+        data = json_codec.loads(text)
+    except ValueError:
+        match = re.search(r"\{[^{}]*\}", text)
+        if not match:
+            raise ValueError(f"no JSON object in {text[:80]!r}")
+        data = json_codec.loads(match.group(0))
+    if not isinstance(data, dict):
+        raise ValueError(f"expected an object, got {type(data).__name__}")
+
+    fields = {}
+    for key in ("probability", "confidence"):
+        try:
+            value = float(data[key])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"missing or non-numeric {key}") from None
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"{key} {value} outside [0, 1]")
+        fields[key] = value
+    return fields
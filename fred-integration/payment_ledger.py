@@ -0,0 +1,317 @@
+"""
+Payment Ledger for the x402 Inference Proxy
+
+Durable, append-only record of every verified payment.
+
+  - Records are JSON lines in rotating segment files
+    (ledger-000001.jsonl, ledger-000002.jsonl, ...), never rewritten.
+  - append() only writes and indexes. Durability is group-committed: the
+    proxy's maintenance task calls sync() every FSYNC_INTERVAL seconds,
+    which flushes, fsyncs and rotates a full segment, off the request path.
+  - A compact index (per-minute revenue buckets + per-payer totals) is kept
+    in memory and checkpointed to index.json, so /pricing and /revenue
+    never scan the history. On startup only records written after the last
+    checkpoint are replayed. Settled payment ids are kept for
+    SETTLED_RETENTION seconds, long past the point an authorization could
+    be settled again, and dropped at the next checkpoint.
+
+Record types: "payment" (verified payment), "settlement" and
+"settlement_failed" (added by the settlement worker, reference payments by
+settlement.payment_id, i.e. "payer:nonce"). Calls served over the
+WebSocket channel are paid by a deposit; their payment records carry that
+deposit's payment id in "deposit".
+"""
+
+import os
+import json
+import time
+import bisect
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+SEGMENT_BYTES = int(os.getenv("X402_LEDGER_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+FSYNC_INTERVAL = float(os.getenv("X402_LEDGER_FSYNC_INTERVAL", "0.05"))
+SETTLED_RETENTION = float(os.getenv("X402_LEDGER_SETTLED_RETENTION", str(7 * 86400)))
+
+BUCKET_SECONDS = 60
+INDEX_FILE = "index.json"
+
+
+def _fsync(fd: int):
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _segment_name(number: int) -> str:
+    return f"ledger-{number:06d}.jsonl"
+
+
+class PaymentLedger:
+    """Append-only payment log with an incremental aggregate index."""
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES,
+                 fsync_interval: float = FSYNC_INTERVAL, settled_retention: float = SETTLED_RETENTION,
+                 readonly: bool = False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.settled_retention = settled_retention
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()  # one sync/checkpoint at a time; append() never takes it
+        self._unsynced = 0
+
+        # Index
+        self._buckets: dict[int, list] = {}      # minute -> [count, amount, tokens]
+        self._bucket_keys: list[int] = []        # sorted minutes
+        self._payers: dict[str, dict] = {}
+        self._totals = {"count": 0, "amount": 0, "tokens": 0}
+        self._settled: dict[str, float] = {}  # payment id -> settlement ts
+
+        os.makedirs(directory, exist_ok=True)
+        self._segment = 1
+        self._load()
+        # Read-only views (another worker's ledger) never write or checkpoint
+        self._file = None if readonly else open(self._segment_path(self._segment), "ab")
+
+    # -- paths --
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, _segment_name(number))
+
+    def _segments(self) -> list[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith("ledger-") and name.endswith(".jsonl"):
+                numbers.append(int(name[7:13]))
+        return sorted(numbers)
+
+    # -- writes --
+
+    def append(self, record: dict):
+        """Append one record; durable after the next sync()."""
+        record.setdefault("type", "payment")
+        record.setdefault("ts", time.time())
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._index(record)
+            self._unsynced += 1
+
+    def record_payment(self, payer: str, agent_id, amount: int, nonce, tokens: int,
+                       latency_ms: float, **extra):
+        self.append({
+            "type": "payment",
+            "ts": time.time(),
+            "payer": payer,
+            "agent_id": agent_id,
+            "amount": amount,
+            "nonce": None if nonce is None else str(nonce),
+            "tokens": tokens,
+            "latency_ms": round(latency_ms, 2),
+            **extra,
+        })
+
+    def sync(self):
+        """Flush and fsync anything written since the last sync; rotate a full segment."""
+        with self._index_lock:
+            with self._lock:
+                fd = self._flush() if self._unsynced else None
+                if self._file.tell() < self.segment_bytes:
+                    state = None
+                else:
+                    if fd is None:
+                        fd = self._flush()
+                    self._file.close()
+                    self._segment += 1
+                    self._file = open(self._segment_path(self._segment), "ab")
+                    state = self._capture()
+            if fd is not None:
+                _fsync(fd)
+            if state is not None:
+                self._write_index(state)
+
+    def _flush(self) -> int:
+        """Push buffered records to the OS; returns a dup'd fd to fsync after the lock is dropped."""
+        self._file.flush()
+        self._unsynced = 0
+        return os.dup(self._file.fileno())
+
+    def close(self):
+        if self._file is None:
+            return
+        with self._index_lock:
+            with self._lock:
+                fd = self._flush()
+                state = self._capture()
+                self._file.close()
+            _fsync(fd)
+            self._write_index(state)
+
+    # -- index --
+
+    def _index(self, record: dict):
+        if record.get("type") == "settlement":
+            self._settled.update(dict.fromkeys(record.get("ids", []), record["ts"]))
+            return
+        if record.get("type") != "payment":
+            return
+
+        amount, tokens = int(record.get("amount") or 0), int(record.get("tokens") or 0)
+        minute = int(record["ts"]) // BUCKET_SECONDS
+        bucket = self._buckets.get(minute)
+        if bucket is None:
+            bucket = self._buckets[minute] = [0, 0, 0]
+            if not self._bucket_keys or minute > self._bucket_keys[-1]:
+                self._bucket_keys.append(minute)
+            else:
+                bisect.insort(self._bucket_keys, minute)
+        bucket[0] += 1
+        bucket[1] += amount
+        bucket[2] += tokens
+
+        payer = (record.get("payer") or "unknown").lower()
+        stats = self._payers.get(payer)
+        if stats is None:
+            stats = self._payers[payer] = {
+                "count": 0, "amount": 0, "tokens": 0,
+                "first_ts": record["ts"], "last_ts": record["ts"], "agent_id": record.get("agent_id"),
+            }
+        stats["count"] += 1
+        stats["amount"] += amount
+        stats["tokens"] += tokens
+        stats["last_ts"] = max(stats["last_ts"], record["ts"])
+
+        self._totals["count"] += 1
+        self._totals["amount"] += amount
+        self._totals["tokens"] += tokens
+
+    def _capture(self) -> dict:
+        """Copy of the index and the position it covers (segment, offset); under the lock."""
+        return {
+            "segment": self._segment,
+            "offset": self._file.tell() if not self._file.closed else 0,
+            "buckets": {minute: bucket[:] for minute, bucket in self._buckets.items()},
+            "payers": {payer: dict(stats) for payer, stats in self._payers.items()},
+            "totals": dict(self._totals),
+            "settled": dict(self._settled),
+        }
+
+    def _write_index(self, state: dict):
+        # Runs outside self._lock: pruning, serializing and the fsync never hold up append()
+        horizon = time.time() - self.settled_retention
+        expired = [pid for pid, ts in state["settled"].items() if ts < horizon]
+        for pid in expired:
+            del state["settled"][pid]
+        if expired:
+            with self._lock:
+                for pid in expired:
+                    if self._settled.get(pid, horizon) < horizon:
+                        del self._settled[pid]
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "wb") as f:
+            f.write(json.dumps(state, separators=(",", ":")).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def checkpoint(self):
+        with self._index_lock:
+            with self._lock:
+                fd = self._flush()
+                state = self._capture()
+            _fsync(fd)
+            self._write_index(state)
+
+    def _load(self):
+        segment, offset = 1, 0
+        path = os.path.join(self.directory, INDEX_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            segment, offset = state["segment"], state["offset"]
+            self._buckets = {int(k): v for k, v in state["buckets"].items()}
+            self._bucket_keys = sorted(self._buckets)
+            self._payers = state["payers"]
+            self._totals = state["totals"]
+            settled = state.get("settled", {})
+            if isinstance(settled, list):  # index written before settled ids expired
+                settled = dict.fromkeys(settled, time.time())
+            self._settled = settled
+
+        # Replay whatever was appended after the checkpoint
+        segments = [n for n in self._segments() if n >= segment]
+        for number in segments:
+            with open(self._segment_path(number), "rb") as f:
+                if number == segment:
+                    f.seek(offset)
+                for line in f:
+                    try:
+                        self._index(json.loads(line))
+                    except ValueError:
+                        # Torn final line from a crash; everything before it is intact
+                        logger.warning(f"Skipping unreadable ledger line in segment {number}")
+        if segments:
+            self._segment = segments[-1]
+
+    # -- queries --
+
+    def totals(self) -> dict:
+        with self._lock:
+            return dict(self._totals, payers=len(self._payers))
+
+    def revenue(self, start: Optional[float] = None, end: Optional[float] = None) -> dict:
+        """Aggregate payments with start <= ts < end (minute resolution)."""
+        with self._lock:
+            lo = 0 if start is None else bisect.bisect_left(self._bucket_keys, int(start) // BUCKET_SECONDS)
+            hi = (len(self._bucket_keys) if end is None
+                  else bisect.bisect_left(self._bucket_keys, -(-int(end) // BUCKET_SECONDS)))
+            count = amount = tokens = 0
+            for minute in self._bucket_keys[lo:hi]:
+                c, a, t = self._buckets[minute]
+                count, amount, tokens = count + c, amount + a, tokens + t
+        return {"count": count, "amount": amount, "tokens": tokens}
+
+    def payer(self, address: str) -> Optional[dict]:
+        with self._lock:
+            stats = self._payers.get(address.lower())
+            return dict(stats) if stats else None
+
+    def payers(self) -> dict[str, dict]:
+        """Per-payer stats for every payer (for merging worker ledgers)."""
+        with self._lock:
+            return {payer: dict(stats) for payer, stats in self._payers.items()}
+
+    def top_payers(self, n: int = 10) -> list[dict]:
+        with self._lock:
+            ranked = sorted(self._payers.items(), key=lambda kv: kv[1]["amount"], reverse=True)[:n]
+            return [dict(stats, payer=payer) for payer, stats in ranked]
+
+    def is_settled(self, pid: str) -> bool:
+        """Whether the payment with id "payer:nonce" has been settled."""
+        with self._lock:
+            return pid in self._settled
+
+    def records(self, start: Optional[float] = None, end: Optional[float] = None):
+        """Iterate raw records (full scan, for audits and exports only)."""
+        if self._file is not None:
+            with self._lock:
+                self._file.flush()
+        for number in self._segments():
+            with open(self._segment_path(number), "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    ts = record.get("ts", 0)
+                    if (start is None or ts >= start) and (end is None or ts < end):
+                        yield record
@@ -0,0 +1,303 @@
+"""
+Local x402 Payment Verification
+
+Verifies an "exact" scheme X-PAYMENT header in-process: the EIP-3009
+TransferWithAuthorization is checked against the proxy's recipient, asset
+and price, its time window is validated and the signer is recovered from
+the EIP-712 signature. No network hop; the facilitator is only needed to
+settle (see settlement.py).
+
+Signer recovery is the expensive part (~10ms in pure Python), so:
+  - recovered signers are cached by hash(digest, signature). The digest
+    covers every signed field, so a cached signature cannot be replayed
+    with different fields;
+  - cache misses run on a process pool (X402_VERIFY_WORKERS) instead of
+    the event loop, and verify_many() fans a batch out over the pool.
+"""
+
+import os
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import NamedTuple, Optional, Union
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+CHAIN_ID = 8453
+VERIFY_WORKERS = int(os.getenv("X402_VERIFY_WORKERS", str(os.cpu_count() or 1)))
+SIGNER_CACHE_SIZE = int(os.getenv("X402_SIGNER_CACHE_SIZE", "10000"))
+CLOCK_SKEW = 5  # seconds of tolerance on validAfter/validBefore
+
+# EIP-712 domain of USDC (FiatTokenV2) on Base
+USDC_DOMAIN_NAME = "USD Coin"
+USDC_DOMAIN_VERSION = "2"
+
+TRANSFER_WITH_AUTHORIZATION_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "TransferWithAuthorization": [
+        {"name": "from", "type": "address"},
+        {"name": "to", "type": "address"},
+        {"name": "value", "type": "uint256"},
+        {"name": "validAfter", "type": "uint256"},
+        {"name": "validBefore", "type": "uint256"},
+        {"name": "nonce", "type": "bytes32"},
+    ],
+}
+
+
+class VerificationError(ValueError):
+    """The payment header is malformed or does not pay for this call."""
+
+
+class VerifiedPayment(NamedTuple):
+    payer: str
+    amount: int          # USDC micros
+    nonce: str           # bytes32 hex
+    valid_before: int
+    agent_id: Optional[int]
+
+
+def decode_header(header: str) -> dict:
+    """X-PAYMENT as raw JSON (FREDAgent) or base64 JSON (x402 SDK clients)."""
+    try:
+        payment = json_codec.loads(header)
+    except ValueError:
+        try:
+            payment = json_codec.loads(base64.b64decode(header))
+        except ValueError:
+            payment = {}
+    return payment if isinstance(payment, dict) else {}
+
+
+def transfer_authorization(authorization: dict, asset: str, chain_id: int = CHAIN_ID) -> dict:
+    """EIP-712 typed data a client signs for an x402 "exact" payment."""
+    return {
+        "types": TRANSFER_WITH_AUTHORIZATION_TYPES,
+        "primaryType": "TransferWithAuthorization",
+        "domain": {
+            "name": USDC_DOMAIN_NAME,
+            "version": USDC_DOMAIN_VERSION,
+            "chainId": chain_id,
+            "verifyingContract": asset,
+        },
+        "message": {
+            "from": authorization["from"],
+            "to": authorization["to"],
+            "value": int(authorization["value"]),
+            "validAfter": int(authorization["validAfter"]),
+            "validBefore": int(authorization["validBefore"]),
+            "nonce": authorization["nonce"],
+        },
+    }
+
+
+def _recover(digest: bytes, signature: bytes) -> Optional[str]:
+    """Signer of `digest`, or None if the signature is not a valid one."""
+    # Module-level so it can run in a process pool; returns rather than raises
+    # so one bad signature cannot abort a pooled batch
+    from eth_account import Account
+
+    try:
+        return Account._recover_hash(digest, signature=signature)
+    except Exception:
+        return None
+
+
+def warm_up():
+    """Import the signing stack (~1s) now rather than on the first payment."""
+    from eth_account import Account  # noqa: F401
+    from eth_account.messages import encode_typed_data  # noqa: F401
+    from eth_utils import keccak  # noqa: F401
+
+
+def _hex_bytes(value, length: Optional[int] = None) -> bytes:
+    if not isinstance(value, str):
+        raise VerificationError("expected a hex string")
+    raw = bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    if length is not None and len(raw) != length:
+        raise VerificationError(f"expected {length} bytes, got {len(raw)}")
+    return raw
+
+
+class PaymentVerifier:
+    """In-process verifier for EIP-3009 x402 payments."""
+
+    def __init__(self, recipient: str, asset: str, min_amount: int, chain_id: int = CHAIN_ID,
+                 workers: int = VERIFY_WORKERS, cache_size: int = SIGNER_CACHE_SIZE,
+                 executor: Optional[Executor] = None):
+        self.recipient = recipient.lower()
+        self.asset = asset
+        self.min_amount = min_amount
+        self.chain_id = chain_id
+        self.workers = workers
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[bytes, str] = OrderedDict()
+        self._executor = executor
+
+    # -- field checks (cheap) --
+
+    def check(self, header: str, now: Optional[float] = None) -> tuple[VerifiedPayment, bytes, bytes]:
+        """Validate everything but the signature; returns (payment, digest, signature)."""
+        from eth_account.messages import encode_typed_data
+        from eth_utils import keccak
+
+        payment = decode_header(header)
+        payload = payment.get("payload") or {}
+        if not isinstance(payload, dict):
+            raise VerificationError("payload is not an object")
+        authorization = payload.get("authorization") or {}
+        if not isinstance(authorization, dict):
+            raise VerificationError("authorization is not an object")
+
+        if payment.get("scheme", "exact") != "exact":
+            raise VerificationError(f"unsupported scheme {payment.get('scheme')!r}")
+        network = payment.get("network", f"eip155:{self.chain_id}")
+        if network not in (f"eip155:{self.chain_id}", "base"):
+            raise VerificationError(f"wrong network {network!r}")
+
+        try:
+            payer = authorization["from"]
+            to = authorization["to"]
+            amount = int(authorization["value"])
+            valid_after = int(authorization["validAfter"])
+            valid_before = int(authorization["validBefore"])
+            nonce = authorization["nonce"]
+            signature = _hex_bytes(payload["signature"], 65)
+            _hex_bytes(nonce, 32)
+        except (KeyError, TypeError, ValueError) as e:
+            raise VerificationError(f"malformed authorization: {e}") from None
+        if not isinstance(payer, str) or not isinstance(to, str):
+            raise VerificationError("malformed authorization: from/to must be address strings")
+
+        if to.lower() != self.recipient:
+            raise VerificationError(f"pays {to}, not {self.recipient}")
+        if amount < self.min_amount:
+            raise VerificationError(f"value {amount} below price {self.min_amount}")
+        now = time.time() if now is None else now
+        if valid_after > now + CLOCK_SKEW:
+            raise VerificationError("authorization not yet valid")
+        if valid_before <= now - CLOCK_SKEW:
+            raise VerificationError("authorization expired")
+
+        try:
+            signable = encode_typed_data(
+                full_message=transfer_authorization(authorization, self.asset, self.chain_id))
+        except Exception as e:  # eth_abi rejects non-address / out-of-range fields with its own errors
+            raise VerificationError(f"malformed authorization: {e}") from None
+        digest = keccak(b"\x19" + signable.version + signable.header + signable.body)
+        return VerifiedPayment(payer, amount, nonce, valid_before, payload.get("agentId")), digest, signature
+
+    # -- signer recovery (expensive, cached) --
+
+    def _cached(self, key: bytes) -> Optional[str]:
+        signer = self._cache.get(key)
+        if signer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        return signer
+
+    def _remember(self, key: bytes, signer: str):
+        self._cache[key] = signer
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _match(payment: VerifiedPayment, signer: Optional[str]) -> VerifiedPayment:
+        if signer is None:
+            raise VerificationError("invalid signature")
+        if signer.lower() != payment.payer.lower():
+            raise VerificationError(f"signed by {signer}, not {payment.payer}")
+        return payment
+
+    @property
+    def executor(self) -> Optional[Executor]:
+        """Process pool for recovery, started on first use (None: inline)."""
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    def verify(self, header: str, now: Optional[float] = None) -> VerifiedPayment:
+        """Verify one payment inline. Raises VerificationError."""
+        payment, digest, signature = self.check(header, now)
+        key = hashlib.sha256(digest + signature).digest()
+        signer = self._cached(key)
+        if signer is None:
+            signer = _recover(digest, signature)
+            if signer is not None:
+                self._remember(key, signer)
+        return self._match(payment, signer)
+
+    async def averify(self, header: str, now: Optional[float] = None) -> VerifiedPayment:
+        """Verify one payment without blocking the event loop on a cache miss."""
+        payment, digest, signature = self.check(header, now)
+        key = hashlib.sha256(digest + signature).digest()
+        signer = self._cached(key)
+        if signer is None:
+            loop = asyncio.get_running_loop()
+            signer = await loop.run_in_executor(self.executor, _recover, digest, signature)
+            if signer is not None:
+                self._remember(key, signer)
+        return self._match(payment, signer)
+
+    def verify_many(self, headers: list[str],
+                    now: Optional[float] = None) -> list[Union[VerifiedPayment, VerificationError]]:
+        """Verify a batch, recovering cache misses in parallel on the pool."""
+        results: list = [None] * len(headers)
+        pending = []  # (index, payment, key, digest, signature)
+        for i, header in enumerate(headers):
+            try:
+                payment, digest, signature = self.check(header, now)
+            except VerificationError as e:
+                results[i] = e
+                continue
+            key = hashlib.sha256(digest + signature).digest()
+            signer = self._cached(key)
+            if signer is None:
+                pending.append((i, payment, key, digest, signature))
+            else:
+                results[i] = payment if signer.lower() == payment.payer.lower() else \
+                    VerificationError(f"signed by {signer}, not {payment.payer}")
+
+        if pending:
+            digests = [p[3] for p in pending]
+            signatures = [p[4] for p in pending]
+            if self.executor is None:
+                signers = map(_recover, digests, signatures)
+            else:
+                signers = self.executor.map(_recover, digests, signatures,
+                                            chunksize=max(1, len(pending) // (4 * self.workers)))
+            for (i, payment, key, _, _), signer in zip(pending, signers):
+                if signer is not None:
+                    self._remember(key, signer)
+                try:
+                    results[i] = self._match(payment, signer)
+                except VerificationError as e:
+                    results[i] = e
+        return results
+
+    def stats(self) -> dict:
+        return {"cache_size": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
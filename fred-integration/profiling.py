@@ -0,0 +1,276 @@
+"""
+Profiling Hooks for the x402 Inference Proxy
+
+Off by default (X402_PROFILE=1 to enable). When enabled:
+
+  - LoopLagMonitor wakes every X402_LOOP_LAG_INTERVAL seconds and records
+    how late it was; lag means something blocked the event loop.
+  - ProfilingMiddleware gives each HTTP request a RequestTimings. Code on
+    the request path calls mark("phase") at phase boundaries, and requests
+    slower than X402_SLOW_REQUEST_MS are kept, with their per-phase
+    timings, in a bounded SlowRequestLog.
+  - sample_stacks() is a time-boxed sampling profiler for one thread (the
+    event loop), and memory_snapshot() a time-boxed tracemalloc window.
+    Both back the admin-only /admin/profile endpoint.
+
+When disabled, the middleware is a single attribute check per request and
+mark() is a context-variable lookup.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter, deque
+from typing import Optional
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+PROFILE = os.getenv("X402_PROFILE", "0") not in ("", "0", "false")
+LOOP_LAG_INTERVAL = float(os.getenv("X402_LOOP_LAG_INTERVAL", "0.5"))
+LOOP_STALL_MS = float(os.getenv("X402_LOOP_STALL_MS", "100"))
+SLOW_REQUEST_MS = float(os.getenv("X402_SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_KEEP = int(os.getenv("X402_SLOW_REQUEST_KEEP", "100"))
+PROFILE_MAX_SECONDS = float(os.getenv("X402_PROFILE_MAX_SECONDS", "30"))
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+
+# ============================================================================
+# Per-request phase timings
+# ============================================================================
+
+class RequestTimings:
+    """Milliseconds spent in each named phase of one request."""
+
+    __slots__ = ("started", "last", "phases")
+
+    def __init__(self):
+        self.started = self.last = time.perf_counter()
+        self.phases: dict[str, float] = {}
+
+    def mark(self, phase: str):
+        """Close `phase`: the time since the previous mark is charged to it."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    @property
+    def total_ms(self) -> float:
+        return (self.last - self.started) * 1000
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def mark(phase: str):
+    """Mark a phase boundary in the current request (no-op when not profiling)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.mark(phase)
+
+
+class SlowRequestLog:
+    """The most recent requests slower than a threshold."""
+
+    def __init__(self, threshold_ms: float = SLOW_REQUEST_MS, keep: int = SLOW_REQUEST_KEEP):
+        self.threshold_ms = threshold_ms
+        self.requests: deque = deque(maxlen=keep)
+        self.observed = 0
+        self.slow = 0
+
+    def observe(self, method: str, path: str, status: int, timings: RequestTimings):
+        self.observed += 1
+        if timings.total_ms < self.threshold_ms:
+            return
+        self.slow += 1
+        self.requests.append({
+            "ts": time.time(),
+            "method": method,
+            "path": path,
+            "status": status,
+            "total_ms": round(timings.total_ms, 2),
+            "phases": {name: round(ms, 2) for name, ms in timings.phases.items()},
+        })
+
+    def stats(self) -> dict:
+        return {"threshold_ms": self.threshold_ms, "observed": self.observed, "slow": self.slow,
+                "recent": list(self.requests)}
+
+
+# ============================================================================
+# Event-loop lag
+# ============================================================================
+
+class LoopLagMonitor:
+    """Measures how late a periodic wake-up on the event loop fires."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, stall_ms: float = LOOP_STALL_MS, keep: int = 120):
+        self.interval = interval
+        self.stall_ms = stall_ms
+        self.samples: deque = deque(maxlen=keep)  # lag in ms
+        self.max_ms = 0.0
+        self.stalls = 0
+
+    def record(self, lag_ms: float):
+        self.samples.append(lag_ms)
+        self.max_ms = max(self.max_ms, lag_ms)
+        if lag_ms >= self.stall_ms:
+            self.stalls += 1
+
+    async def run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def stats(self) -> dict:
+        recent = sorted(self.samples)
+        return {
+            "interval_s": self.interval,
+            "samples": len(recent),
+            "last_ms": round(self.samples[-1], 2) if recent else None,
+            "p50_ms": round(recent[len(recent) // 2], 2) if recent else None,
+            "p99_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.99))], 2) if recent else None,
+            "max_ms": round(self.max_ms, 2),
+            "stalls": self.stalls,
+        }
+
+
+# ============================================================================
+# Profiler (state + ASGI middleware)
+# ============================================================================
+
+class Profiler:
+    """Switch and collected data for the proxy's instrumentation."""
+
+    def __init__(self, enabled: bool = PROFILE, slow_ms: float = SLOW_REQUEST_MS):
+        self.enabled = enabled
+        self.slow = SlowRequestLog(slow_ms)
+        self.loop_lag = LoopLagMonitor()
+        self.busy = asyncio.Lock()  # one on-demand profile at a time
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "loop_lag": self.loop_lag.stats(), "slow_requests": self.slow.stats()}
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware: times requests when the profiler is enabled."""
+
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if not self.profiler.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            _current.reset(token)
+            timings.mark("respond")
+            self.profiler.slow.observe(scope["method"], scope["path"], status, timings)
+
+
+# ============================================================================
+# On-demand profiles
+# ============================================================================
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = SAMPLE_INTERVAL, top: int = 30) -> dict:
+    """
+    Sample one thread's Python stack every `interval` for `seconds`.
+
+    Runs in its own thread. Returns the hottest functions by self and
+    total samples plus collapsed stacks ("outer;...;inner": count).
+    """
+    stacks: Counter = Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stacks[tuple(reversed(labels))] += 1
+            samples += 1
+        time.sleep(interval)
+
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for label in set(stack):
+            total[label] += count
+    return {
+        "mode": "cpu",
+        "seconds": seconds,
+        "interval_ms": interval * 1000,
+        "samples": samples,
+        "top": [{"function": label, "self": own[label], "total": count}
+                for label, count in total.most_common(top)],
+        "stacks": {";".join(stack): count for stack, count in stacks.most_common(top * 10)},
+    }
+
+
+async def memory_snapshot(seconds: float, top: int = 25, frames: int = 10) -> dict:
+    """
+    Trace allocations for `seconds` and report the largest live ones.
+
+    tracemalloc slows every allocation while it runs, so it is only on for
+    the window (unless something else already started it).
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(frames)
+    try:
+        await asyncio.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+        traced, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    return {
+        "mode": "memory",
+        "seconds": seconds,
+        "traced_kib": round(traced / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "top": [
+            {"size_kib": round(stat.size / 1024, 1), "count": stat.count,
+             "traceback": [str(frame) for frame in stat.traceback]}
+            for stat in snapshot.statistics("traceback")[:top]
+        ],
+    }
+
+
+async def run_profile(profiler: Profiler, mode: str, seconds: float) -> dict:
+    """Time-boxed CPU or memory profile of the running event loop."""
+    seconds = min(max(seconds, 0.01), PROFILE_MAX_SECONDS)
+    async with profiler.busy:
+        if mode == "memory":
+            return await memory_snapshot(seconds)
+        return await asyncio.to_thread(sample_stacks, threading.get_ident(), seconds)
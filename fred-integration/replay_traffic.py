@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Replay captured proxy traffic against a local build.
+
+Reads a capture written by traffic_capture.py (X402_CAPTURE_FILE) and
+re-sends every request to this tree's proxy, run in-process with a stub
+LLM provider and a stub facilitator. Requests keep their recorded
+schedule, divided by --speed (0 = all at once). Bodies are synthesized to
+the captured sizes. Paid requests carry real payments pre-signed by a
+fixed throwaway key, so verification cost is part of the measurement;
+rejected ones get an invalid header. The same capture and seed always
+produce the same requests.
+
+Run it in each build's checkout and compare the reports:
+
+    python replay_traffic.py capture.jsonl --speed 10 --output old.json
+    python replay_traffic.py capture.jsonl --speed 10 --compare old.json
+
+Usage:
+    python replay_traffic.py CAPTURE [--speed 1] [--provider-ms 0] [--limit N]
+                             [--stub-verifier] [--output FILE] [--compare FILE]
+"""
+
+import os
+import time
+import asyncio
+import logging
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from collections import Counter
+from typing import Optional
+
+import httpx
+
+import json_codec
+import x402_inference_server as server
+
+REPLAY_KEY = "0x" + hashlib.sha256(b"x402 replay payer").hexdigest()  # throwaway, never funded
+INVALID_PAYMENT = "replay-invalid-payment"
+FILLER = b"Will this prediction market resolve YES? "
+
+
+def load_capture(path: str, limit: Optional[int] = None) -> list[dict]:
+    """Request records of a capture, in time order."""
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                record = json_codec.loads(line)
+                if "t" in record:
+                    records.append(record)
+    records.sort(key=lambda r: r["t"])
+    return records[:limit] if limit else records
+
+
+def synth_body(path: str, size: int) -> Optional[bytes]:
+    """A valid JSON body for `path`, padded to about `size` bytes."""
+    if not size:
+        return None
+    field = {"/inference": "prompt", "/estimate": "question"}.get(path, "data")
+    overhead = len(json_codec.dumps({field: ""}))
+    filler = (FILLER * (size // len(FILLER) + 1))[:max(1, size - overhead)].decode()
+    return json_codec.dumps({field: filler})
+
+
+def sign_payments(count: int, seed: int = 0, sign: bool = True) -> list[str]:
+    """
+    Deterministic X-PAYMENT headers for this proxy's price and recipient.
+    With sign=False the signature is zeros (for --stub-verifier): cheaper
+    to build, and each header still carries its own nonce.
+    """
+    from eth_account import Account
+    from eth_account.messages import encode_typed_data
+    from payment_verifier import transfer_authorization
+
+    account = Account.from_key(REPLAY_KEY)
+    valid_before = int(time.time()) + 86400
+    headers = []
+    for i in range(count):
+        authorization = {
+            "from": account.address,
+            "to": server.RECIPIENT_ADDRESS,
+            "value": str(server.PRICE_PER_CALL),
+            "validAfter": "0",
+            "validBefore": str(valid_before),
+            "nonce": "0x" + hashlib.sha256(f"{seed}:{i}".encode()).hexdigest(),
+        }
+        signature = "0x" + "00" * 65
+        if sign:
+            signed = account.sign_message(encode_typed_data(
+                full_message=transfer_authorization(authorization, server.USDC_ADDRESS)))
+            signature = "0x" + signed.signature.hex().removeprefix("0x")
+        headers.append(json_codec.dumps({
+            "x402Version": 1,
+            "scheme": "exact",
+            "network": "eip155:8453",
+            "payload": {"signature": signature, "authorization": authorization},
+        }).decode())
+    return headers
+
+
+def install_stubs(ledger_dir: str, provider_ms: float = 0.0, stub_verifier: bool = False):
+    """Point the proxy at a scratch ledger, a fixed-latency LLM and a no-op facilitator."""
+    async def stub_llm(prompt, model, max_tokens, system=None):
+        if provider_ms:
+            await asyncio.sleep(provider_ms / 1000)
+        return server.LLMReply('{"probability": 0.5, "confidence": 0.5}', len(prompt) // 4 + 8)
+
+    async def stub_settle(batch):
+        return [True] * len(batch)
+
+    server.LEDGER_DIR = ledger_dir
+    server.CAPTURE_FILE = None  # never append the replay to a capture
+    server.call_llm = stub_llm
+    server.make_settler = lambda: stub_settle
+    if stub_verifier:
+        async def accept_valid(header):
+            return None if not header or header == INVALID_PAYMENT else server.PRICE_PER_CALL
+
+        server.verify_payment_header = accept_valid
+
+
+def payment_headers(records: list[dict], payments: list[str]) -> list[Optional[str]]:
+    paid = iter(payments)
+    headers = []
+    for record in records:
+        if record["payment"] in ("accepted", "failed"):
+            headers.append(next(paid))
+        elif record["payment"] == "rejected":
+            headers.append(INVALID_PAYMENT)
+        else:
+            headers.append(None)
+    return headers
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None, "mean": None}
+    ordered = sorted(values)
+
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)
+
+    return {"p50": at(0.5), "p90": at(0.9), "p99": at(0.99), "max": round(ordered[-1], 3),
+            "mean": round(sum(ordered) / len(ordered), 3)}
+
+
+async def replay(records: list[dict], headers: list[Optional[str]], speed: float = 1.0) -> tuple[list[dict], float]:
+    """Send every record on schedule; returns (results, elapsed seconds)."""
+    results: list[dict] = [None] * len(records)
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.lifespan(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=120) as client:
+            start = time.perf_counter()
+
+            async def one(i: int):
+                record = records[i]
+                scheduled = start + (record["t"] / speed if speed else 0.0)
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                request_headers = {}
+                if headers[i]:
+                    request_headers["X-PAYMENT"] = headers[i]
+                body = synth_body(record["path"], record["req"])
+                if body is not None:
+                    request_headers["Content-Type"] = "application/json"
+                sent = time.perf_counter()
+                try:
+                    response = await client.request(record["method"], record["path"], content=body,
+                                                    headers=request_headers)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                results[i] = {
+                    "path": record["path"],
+                    "status": status,
+                    "expected": record["status"],
+                    "ms": (time.perf_counter() - sent) * 1000,
+                    "lag_ms": (sent - scheduled) * 1000,
+                }
+
+            await asyncio.gather(*(one(i) for i in range(len(records))))
+            elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def build_id() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def summarize(records: list[dict], results: list[dict], elapsed: float, speed: float) -> dict:
+    routes = {}
+    for path in sorted({r["path"] for r in records}):
+        routes[path] = {
+            "requests": sum(1 for r in results if r["path"] == path),
+            "captured_ms": percentiles([r["ms"] for r in records if r["path"] == path]),
+            "latency_ms": percentiles([r["ms"] for r in results if r["path"] == path]),
+        }
+    return {
+        "build": build_id(),
+        "json_backend": json_codec.BACKEND,
+        "speed": speed,
+        "requests": len(results),
+        "capture_duration_s": round(records[-1]["t"], 3) if records else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 1) if elapsed else None,
+        "latency_ms": percentiles([r["ms"] for r in results]),
+        "captured_ms": percentiles([r["ms"] for r in records]),
+        "schedule_lag_ms": percentiles([r["lag_ms"] for r in results]),
+        "statuses": dict(Counter(str(r["status"]) for r in results)),
+        "mismatched": sum(1 for r in results if r["status"] != r["expected"]),
+        "routes": routes,
+    }
+
+
+def _change(new, old) -> str:
+    if new is None or old in (None, 0):
+        return "      n/a"
+    return f"{(new - old) / old * 100:+8.1f}%"
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    """Lines describing how `report` differs from `baseline`."""
+    lines = [f"   {'':24} {'baseline':>10} {'this build':>10} {'change':>9}"]
+    rows = [("throughput (req/s)", baseline["throughput_rps"], report["throughput_rps"])]
+    for q in ("p50", "p90", "p99"):
+        rows.append((f"latency {q} (ms)", baseline["latency_ms"][q], report["latency_ms"][q]))
+    for path in sorted(set(report["routes"]) & set(baseline["routes"])):
+        rows.append((f"{path} p50 (ms)", baseline["routes"][path]["latency_ms"]["p50"],
+                     report["routes"][path]["latency_ms"]["p50"]))
+    for label, old, new in rows:
+        lines.append(f"   {label:24} {old if old is not None else '-':>10} "
+                     f"{new if new is not None else '-':>10} {_change(new, old)}")
+    return lines
+
+
+def run(capture: str, speed: float = 1.0, provider_ms: float = 0.0, limit: Optional[int] = None,
+        stub_verifier: bool = False, seed: int = 0) -> dict:
+    records = load_capture(capture, limit)
+    paid = sum(1 for r in records if r["payment"] in ("accepted", "failed"))
+    with tempfile.TemporaryDirectory(prefix="x402-replay-") as ledger_dir:
+        install_stubs(ledger_dir, provider_ms, stub_verifier)
+        payments = sign_payments(paid, seed, sign=not stub_verifier)
+        results, elapsed = asyncio.run(replay(records, payment_headers(records, payments), speed))
+    return summarize(records, results, elapsed, speed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic against this build of the proxy")
+    parser.add_argument("capture")
+    parser.add_argument("--speed", type=float, default=1.0, help="schedule speed-up (0 = no pacing)")
+    parser.add_argument("--provider-ms", type=float, default=0.0, help="stub LLM latency")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-verifier", action="store_true", help="skip signing and signature checks")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)  # one INFO line per request would drown the report
+
+    report = run(args.capture, args.speed, args.provider_ms, args.limit, args.stub_verifier, args.seed)
+    print(f"🔁 Replayed {report['requests']} requests at {args.speed}x in {report['elapsed_s']}s "
+          f"(build {report['build']}, JSON backend: {report['json_backend']})")
+    print(f"   throughput     {report['throughput_rps']} req/s")
+    print(f"   latency        p50 {report['latency_ms']['p50']} ms, p99 {report['latency_ms']['p99']} ms "
+          f"(captured p50 {report['captured_ms']['p50']} ms)")
+    print(f"   schedule lag   p99 {report['schedule_lag_ms']['p99']} ms")
+    print(f"   statuses       {report['statuses']} ({report['mismatched']} differ from capture)")
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(json_codec.dumps(report))
+    if args.compare:
+        with open(args.compare, "rb") as f:
+            baseline = json_codec.loads(f.read())
+        print(f"📊 vs {args.compare} (build {baseline.get('build')})")
+        for line in compare(report, baseline):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
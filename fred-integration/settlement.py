@@ -0,0 +1,326 @@
+"""
+Deferred Settlement for the x402 Inference Proxy
+
+The request path only verifies payments. Verified authorizations go into a
+durable queue and a background worker settles them in batches:
+
+  - a batch is flushed when SETTLE_BATCH_SIZE payments are waiting or the
+    oldest one has waited SETTLE_WINDOW seconds;
+  - failed settlements are retried with exponential backoff, up to
+    SETTLE_MAX_ATTEMPTS, then recorded as failed;
+  - settled payments are marked in the payment ledger;
+  - unsettled exposure is capped at MAX_UNSETTLED (USDC micros): past the
+    cap the proxy stops accepting payments until the backlog drains.
+
+The queue is a small append-only journal (settlement-queue.jsonl) that is
+replayed on startup and compacted once it is mostly settled. Like the
+payment ledger, appends only reach the OS on the request path; sync() is
+the batched fsync (and compaction), run off the event loop by the proxy's
+maintenance task and by the worker after it records a batch.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+SETTLE_BATCH_SIZE = int(os.getenv("X402_SETTLE_BATCH_SIZE", "50"))
+SETTLE_WINDOW = float(os.getenv("X402_SETTLE_WINDOW", "30"))
+SETTLE_MAX_ATTEMPTS = int(os.getenv("X402_SETTLE_MAX_ATTEMPTS", "5"))
+SETTLE_RETRY_BASE = 2.0  # seconds, doubled per attempt
+MAX_UNSETTLED = int(os.getenv("X402_MAX_UNSETTLED", "1000000"))  # $1.00 USDC
+
+QUEUE_FILE = "settlement-queue.jsonl"
+COMPACT_AFTER = 10_000  # journal lines
+
+
+def payment_id(payer: Optional[str], nonce) -> str:
+    """Stable id of one authorization: payer and nonce."""
+    return f"{(payer or 'unknown').lower()}:{nonce}"
+
+
+def _fsync(fd: int):
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# ============================================================================
+# Durable queue
+# ============================================================================
+
+class SettlementQueue:
+    """Journal-backed queue of verified, unsettled payments."""
+
+    def __init__(self, directory: str, max_unsettled: int = MAX_UNSETTLED):
+        self.path = os.path.join(directory, QUEUE_FILE)
+        self.max_unsettled = max_unsettled
+        self.pending: dict[str, dict] = {}  # id -> item, insertion ordered
+        self.reserved = 0  # admitted requests still being served, not yet queued
+        self._lines = 0
+        self._unsynced = 0
+        self._tail: Optional[list[str]] = None  # lines written while compacting
+        self._lock = threading.Lock()  # guards the file; never held across an fsync
+        self._sync_lock = threading.Lock()  # one sync() at a time
+        os.makedirs(directory, exist_ok=True)
+        self._replay()
+        self._file = open(self.path, "a")
+
+    @property
+    def exposure(self) -> int:
+        """Unsettled amount in USDC micros, reservations included."""
+        return sum(item["amount"] for item in self.pending.values()) + self.reserved
+
+    def can_accept(self, amount: int) -> bool:
+        return self.exposure + amount <= self.max_unsettled
+
+    def reserve(self, amount: int) -> bool:
+        """Hold `amount` under the cap while a request is served; False if it does not fit."""
+        if not self.can_accept(amount):
+            return False
+        self.reserved += amount
+        return True
+
+    def release(self, amount: int):
+        """Drop a reservation: the request failed, or its payment is about to be added."""
+        self.reserved -= amount
+
+    def add(self, pid: str, payment: str, amount: int):
+        if pid in self.pending:
+            return
+        item = {"id": pid, "payment": payment, "amount": amount,
+                "queued_at": time.time(), "attempts": 0, "next_try": 0.0}
+        self.pending[pid] = item
+        self._write({"op": "add", **item})
+
+    def due(self, now: Optional[float] = None, limit: int = SETTLE_BATCH_SIZE) -> list[dict]:
+        now = time.time() if now is None else now
+        return [i for i in self.pending.values() if i["next_try"] <= now][:limit]
+
+    def oldest_age(self, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        waiting = [i["queued_at"] for i in self.pending.values() if i["next_try"] <= now]
+        return now - min(waiting) if waiting else 0.0
+
+    def done(self, ids: list[str]):
+        for pid in ids:
+            self.pending.pop(pid, None)
+        self._write({"op": "done", "ids": ids})
+
+    def retry(self, pid: str, now: Optional[float] = None) -> bool:
+        """Schedule another attempt; False once attempts are exhausted."""
+        item = self.pending[pid]
+        item["attempts"] += 1
+        if item["attempts"] >= SETTLE_MAX_ATTEMPTS:
+            return False
+        now = time.time() if now is None else now
+        item["next_try"] = now + SETTLE_RETRY_BASE * 2 ** (item["attempts"] - 1)
+        self._write({"op": "retry", "id": pid, "attempts": item["attempts"], "next_try": item["next_try"]})
+        return True
+
+    def sync(self):
+        """fsync journal entries written since the last sync; compact a long journal."""
+        with self._sync_lock:
+            with self._lock:
+                if not self._unsynced or self._file.closed:
+                    return
+                self._file.flush()
+                fd = os.dup(self._file.fileno())
+                self._unsynced = 0
+            _fsync(fd)
+            if self._lines >= COMPACT_AFTER:
+                self._compact()
+
+    def close(self):
+        with self._sync_lock:  # a sync() still running on its thread finishes first
+            with self._lock:
+                self._file.flush()
+                fd = os.dup(self._file.fileno())
+                self._file.close()
+            _fsync(fd)
+
+    def _write(self, entry: dict):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()  # to the OS now; durable after the next sync()
+            if self._tail is not None:
+                self._tail.append(line)
+            self._unsynced += 1
+            self._lines += 1
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._lines += 1
+                op = entry.pop("op", None)
+                if op == "add":
+                    self.pending[entry["id"]] = entry
+                elif op == "done":
+                    for pid in entry["ids"]:
+                        self.pending.pop(pid, None)
+                elif op == "retry" and entry["id"] in self.pending:
+                    self.pending[entry["id"]].update(attempts=entry["attempts"], next_try=entry["next_try"])
+
+    def _compact(self):
+        # Snapshot under the lock, rewrite and fsync without it; lines written
+        # meanwhile are kept in _tail and carried over to the new journal
+        with self._lock:
+            items = [dict(item) for item in self.pending.values()]
+            self._tail = []
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for item in items:
+                f.write(json.dumps({"op": "add", **item}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            tail, self._tail = self._tail, None
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "a")
+            self._file.writelines(tail)
+            self._file.flush()
+            self._lines = len(items) + len(tail)
+            self._unsynced = len(tail)
+
+
+# ============================================================================
+# Settlers
+# ============================================================================
+
+Settler = Callable[[list[dict]], Awaitable[list[bool]]]
+
+
+class FacilitatorSettler:
+    """
+    Settle through the x402 facilitator's /settle endpoint.
+
+    The facilitator takes one authorization per call, so a batch is sent
+    concurrently over a single keep-alive connection pool.
+    """
+
+    def __init__(self, url: str, requirements: dict, timeout: float = 30):
+        import httpx
+
+        self.url = url.rstrip("/") + "/settle"
+        self.requirements = requirements
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def __call__(self, batch: list[dict]) -> list[bool]:
+        async def settle_one(item):
+            try:
+                response = await self.client.post(self.url, json={
+                    "x402Version": 1,
+                    "paymentHeader": item["payment"],
+                    "paymentRequirements": self.requirements,
+                })
+                return response.status_code == 200 and response.json().get("success", False)
+            except Exception as e:
+                logger.warning(f"Settlement of {item['id']} failed: {e}")
+                return False
+
+        return list(await asyncio.gather(*(settle_one(i) for i in batch)))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+# ============================================================================
+# Worker
+# ============================================================================
+
+class SettlementWorker:
+    """Background task flushing the queue by batch size or time window."""
+
+    def __init__(self, queue: SettlementQueue, settle: Settler, ledger=None,
+                 batch_size: int = SETTLE_BATCH_SIZE, window: float = SETTLE_WINDOW):
+        self.queue = queue
+        self.settle = settle
+        self.ledger = ledger
+        self.batch_size = batch_size
+        self.window = window
+        self.settled = 0
+        self.failed = 0
+        self._wake = asyncio.Event()
+
+    def submit(self, pid: str, payment: str, amount: int):
+        """Queue a verified payment (request path: no network I/O)."""
+        self.queue.add(pid, payment, amount)
+        if len(self.queue.pending) >= self.batch_size or not self.queue.can_accept(0):
+            self._wake.set()
+
+    def kick(self):
+        """Settle now, e.g. when the exposure cap is reached."""
+        self._wake.set()
+
+    def status(self) -> dict:
+        return {
+            "pending": len(self.queue.pending),
+            "exposure": self.queue.exposure,
+            "reserved": self.queue.reserved,
+            "max_unsettled": self.queue.max_unsettled,
+            "settled": self.settled,
+            "failed": self.failed,
+        }
+
+    async def flush(self, force: bool = False) -> int:
+        """Settle one batch if it is due. Returns how many settled."""
+        batch = self.queue.due(limit=self.batch_size)
+        if not batch:
+            return 0
+        if not force and len(batch) < self.batch_size and self.queue.oldest_age() < self.window:
+            return 0
+
+        results = await self.settle(batch)
+        ok = [item["id"] for item, success in zip(batch, results) if success]
+        if ok:
+            self.queue.done(ok)
+            self.settled += len(ok)
+            if self.ledger is not None:
+                self.ledger.append({"type": "settlement", "batch": uuid.uuid4().hex[:12], "ids": ok,
+                                    "amount": sum(i["amount"] for i in batch if i["id"] in ok)})
+
+        given_up = [item["id"] for item, success in zip(batch, results)
+                    if not success and not self.queue.retry(item["id"])]
+        if given_up:
+            self.queue.done(given_up)
+            self.failed += len(given_up)
+            logger.error(f"Giving up settling {len(given_up)} payments after {SETTLE_MAX_ATTEMPTS} attempts")
+            if self.ledger is not None:
+                self.ledger.append({"type": "settlement_failed", "ids": given_up})
+        # Settled ids must not be replayed (and re-sent) after a crash
+        await asyncio.to_thread(self.queue.sync)
+        return len(ok)
+
+    async def run(self):
+        # Stop once cancelled even if a settler swallowed the CancelledError
+        while not asyncio.current_task().cancelling():
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=min(self.window, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            forced = self._wake.is_set()
+            self._wake.clear()
+            try:
+                while await self.flush(force=forced):
+                    forced = len(self.queue.due()) >= self.batch_size or not self.queue.can_accept(0)
+            except Exception as e:
+                logger.error(f"Settlement batch failed: {e}")
@@ -0,0 +1,171 @@
+"""
+Cross-Worker State for the x402 Inference Proxy
+
+When the proxy runs as several uvicorn worker processes, anything kept in
+one process's memory (used payment nonces, rate-limit counters, call
+counts) is invisible to the others. This module keeps that state in a
+local SQLite database in WAL mode, shared by all workers on the host:
+
+  - claim_nonce() is a single INSERT OR IGNORE, so exactly one worker can
+    accept a given payment authorization;
+  - hit() / count() are fixed-window counters (rate limits, calls served).
+
+Each worker also claims a stable slot (flock on worker-N.lock) that names
+its own ledger and settlement queue directory. Slot 0 uses the ledger
+directory itself, so a single-worker proxy keeps its existing layout.
+"""
+
+import os
+import time
+import fcntl
+import sqlite3
+import threading
+from typing import Optional
+
+from payment_verifier import CLOCK_SKEW
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+STATE_FILE = "shared.db"
+BUSY_TIMEOUT_MS = 5000
+NONCE_TTL = 86400  # seconds, for authorizations without a validBefore
+# Nonces outlive validBefore by more than the verifier's clock-skew tolerance,
+# or an authorization it still accepts could be pruned and claimed again
+NONCE_GRACE = CLOCK_SKEW + 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nonces (
+    id TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (key, window)
+);
+"""
+
+
+class SharedState:
+    """SQLite (WAL) store shared by the proxy's worker processes."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, STATE_FILE)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    # -- replay protection --
+
+    def claim_nonce(self, pid: str, expires: Optional[float] = None) -> bool:
+        """True for the first claim of a payment id across all workers."""
+        expires = time.time() + NONCE_TTL if expires is None else expires
+        with self._lock:
+            cursor = self._db.execute("INSERT OR IGNORE INTO nonces (id, expires) VALUES (?, ?)",
+                                      (pid, expires))
+        return cursor.rowcount == 1
+
+    def release_nonce(self, pid: str):
+        """Give a claimed authorization back (the call was not served)."""
+        with self._lock:
+            self._db.execute("DELETE FROM nonces WHERE id = ?", (pid,))
+
+    # -- counters --
+
+    def hit(self, key: str, window_seconds: int = 60, amount: int = 1,
+            now: Optional[float] = None) -> int:
+        """
+        Add to the counter for the current window; returns its new value.
+        window_seconds=0 is a single all-time window.
+        """
+        window = 0
+        if window_seconds:
+            window = int(time.time() if now is None else now) // window_seconds
+        with self._lock:
+            row = self._db.execute(
+                "INSERT INTO counters (key, window, count) VALUES (?, ?, ?) "
+                "ON CONFLICT (key, window) DO UPDATE SET count = count + excluded.count "
+                "RETURNING count",
+                (key, window, amount),
+            ).fetchone()
+        return row[0]
+
+    def count(self, key: str, window_seconds: int = 60, start: Optional[float] = None,
+              end: Optional[float] = None) -> int:
+        """Sum of a counter over windows overlapping [start, end)."""
+        if not window_seconds:
+            lo, hi = 0, 1
+        else:
+            lo = 1 if start is None else max(1, int(start) // window_seconds)  # window 0 is all-time
+            hi = 2**62 if end is None else -(-int(end) // window_seconds)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM counters WHERE key = ? AND window >= ? AND window < ?",
+                (key, lo, hi),
+            ).fetchone()
+        return row[0]
+
+    def take(self, key: str) -> int:
+        """Read and clear an all-time counter atomically (e.g. carried-over credit)."""
+        with self._lock:
+            row = self._db.execute("DELETE FROM counters WHERE key = ? AND window = 0 RETURNING count",
+                                   (key,)).fetchone()
+        return row[0] if row else 0
+
+    # -- housekeeping --
+
+    def prune(self, now: Optional[float] = None, keep_windows: int = 1440):
+        """Drop expired nonces (after NONCE_GRACE) and windowed counters older than keep_windows minutes."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute("DELETE FROM nonces WHERE expires < ?", (now - NONCE_GRACE,))
+            self._db.execute("DELETE FROM counters WHERE window > 0 AND window < ?",
+                             (int(now) // 60 - keep_windows,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ============================================================================
+# Worker slots
+# ============================================================================
+
+def slot_directory(directory: str, slot: int) -> str:
+    return directory if slot == 0 else os.path.join(directory, f"worker-{slot}")
+
+
+def worker_directories(directory: str) -> list[str]:
+    """Ledger directories of every slot that has ever been used."""
+    slots = [0] + sorted(int(name[7:]) for name in os.listdir(directory)
+                         if name.startswith("worker-") and name[7:].isdigit())
+    return [slot_directory(directory, slot) for slot in slots]
+
+
+class WorkerSlot:
+    """Exclusive, restart-stable slot number for one worker process."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.slot = 0
+        while True:
+            self._file = open(os.path.join(directory, f"worker-{self.slot}.lock"), "w")
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                self._file.close()
+                self.slot += 1
+        self.directory = slot_directory(directory, self.slot)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def release(self):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
@@ -0,0 +1,124 @@
+"""
+Traffic Capture for the x402 Inference Proxy
+
+Opt-in (X402_CAPTURE_FILE=path): an ASGI middleware that appends one JSON
+line per HTTP request with its timing, payload sizes and payment outcome.
+Request and response bodies are not stored, only their sizes, so a
+capture can leave the host without leaking prompts. replay_traffic.py
+re-sends a capture against a local build of the proxy.
+
+Format (JSON lines):
+    {"capture": 1, "started": <unix time>}
+    {"t": 0.012, "method": "POST", "path": "/inference", "req": 61,
+     "resp": 173, "status": 200, "ms": 4.21, "payment": "accepted"}
+
+`t` is seconds since the capture started. `payment` is one of
+    none      no X-PAYMENT header and no 402 (health, pricing, ...)
+    required  no X-PAYMENT header, answered 402
+    accepted  X-PAYMENT header, answered 2xx
+    rejected  X-PAYMENT header, answered 402
+    failed    X-PAYMENT header, any other status (429, 503, 5xx, ...)
+
+WebSocket traffic is not captured.
+"""
+
+import os
+import time
+from typing import Optional
+
+import json_codec
+
+CAPTURE_FILE = os.getenv("X402_CAPTURE_FILE")
+CAPTURE_VERSION = 1
+
+
+def payment_outcome(paid: bool, status: int) -> str:
+    if not paid:
+        return "required" if status == 402 else "none"
+    if 200 <= status < 300:
+        return "accepted"
+    return "rejected" if status == 402 else "failed"
+
+
+class TrafficRecorder:
+    """Appends capture records to a file while open."""
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.records = 0
+        self._file = None
+        self._started = 0.0
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def open(self, path: str):
+        self.path = path
+        self.records = 0
+        self._file = open(path, "ab")
+        self._started = time.perf_counter()
+        self._file.write(json_codec.dumps({"capture": CAPTURE_VERSION, "started": time.time()}) + b"\n")
+
+    def record(self, started: float, method: str, path: str, request_bytes: int, response_bytes: int,
+               status: int, paid: bool):
+        if self._file is None:
+            return
+        now = time.perf_counter()
+        self._file.write(json_codec.dumps({
+            "t": round(started - self._started, 6),
+            "method": method,
+            "path": path,
+            "req": request_bytes,
+            "resp": response_bytes,
+            "status": status,
+            "ms": round((now - started) * 1000, 3),
+            "payment": payment_outcome(paid, status),
+        }) + b"\n")
+        self.records += 1
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CaptureMiddleware:
+    """Pure ASGI middleware feeding a TrafficRecorder (pass-through when inactive)."""
+
+    def __init__(self, app, recorder: TrafficRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if not self.recorder.active or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        sizes = {"req": 0, "resp": 0}
+        status = 500
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["req"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["resp"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            paid = any(name == b"x-payment" for name, _ in scope.get("headers", ()))
+            self.recorder.record(started, scope["method"], scope["path"], sizes["req"], sizes["resp"],
+                                 status, paid)
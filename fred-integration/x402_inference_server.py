@@ -12,21 +12,29 @@ Usage:
 """
 
 import os
+import hmac
+import time
+import asyncio
 import logging
-from typing import Optional
-
-from fastapi import FastAPI, Request, Response, HTTPException
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Optional, Union
+
+from fastapi import FastAPI, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, ValidationError
+
+import json_codec
+from estimates import estimate_prompt, parse_probability
+from payment_ledger import PaymentLedger
+from payment_verifier import PaymentVerifier, VerificationError, decode_header, warm_up
+from profiling import PROFILE_MAX_SECONDS, Profiler, ProfilingMiddleware, mark, run_profile
+from settlement import MAX_UNSETTLED, FacilitatorSettler, SettlementQueue, SettlementWorker, payment_id
+from shared_state import SharedState, WorkerSlot, worker_directories
+from traffic_capture import CAPTURE_FILE, CaptureMiddleware, TrafficRecorder
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title="x402 Inference Proxy",
-    description="Pay for LLM inference with USDC micropayments",
-    version="0.1.0",
-)
-
 
 # ============================================================================
 # Configuration
@@ -36,18 +44,145 @@ PRICE_PER_CALL = int(os.getenv("X402_PRICE_PER_CALL", "5000"))  # $0.005 USDC de
 USDC_ADDRESS = "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913"  # Base USDC
 RECIPIENT_ADDRESS = os.getenv("X402_RECIPIENT", "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237")
 
+# Structured /estimate calls: the reply is ~20 tokens of JSON
+ESTIMATE_MAX_TOKENS = int(os.getenv("X402_ESTIMATE_MAX_TOKENS", "32"))
+
+# Payment ledger
+LEDGER_DIR = os.getenv("X402_LEDGER_DIR", "ledger")
+LEDGER_CHECKPOINT_INTERVAL = float(os.getenv("X402_LEDGER_CHECKPOINT_INTERVAL", "60"))
+
+# Deferred settlement (batching knobs are X402_SETTLE_* in settlement.py)
+FACILITATOR_URL = os.getenv("X402_FACILITATOR_URL", "https://x402.org/facilitator")
+
+# Worker processes (state shared through LEDGER_DIR/shared.db, see shared_state.py)
+WORKERS = int(os.getenv("X402_WORKERS", "1"))
+
+# Paid calls per payer per minute across all workers (0 = unlimited)
+RATE_LIMIT = int(os.getenv("X402_RATE_LIMIT", "0"))
+
+# /ws/inference: calls one deposit pays for, and concurrent requests per channel
+WS_DEPOSIT_CALLS = int(os.getenv("X402_WS_DEPOSIT_CALLS", "100"))
+WS_MAX_IN_FLIGHT = int(os.getenv("X402_WS_MAX_IN_FLIGHT", "32"))
+# A deposit may take at most 1/WS_DEPOSIT_SHARE of a worker's unsettled cap,
+# so several channels and HTTP payments fit under it at once
+WS_DEPOSIT_SHARE = 4
+
+# Admin endpoints (/revenue) are disabled unless a token is set
+ADMIN_TOKEN = os.getenv("X402_ADMIN_TOKEN")
+
 # LLM provider
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "anthropic")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 
+# ============================================================================
+# App
+# ============================================================================
+
+ledger: Optional[PaymentLedger] = None
+settlement: Optional[SettlementWorker] = None
+verifier: Optional[PaymentVerifier] = None
+state: Optional[SharedState] = None
+slot: Optional[WorkerSlot] = None
+profiler = Profiler()  # X402_PROFILE=1 to enable, see profiling.py
+recorder = TrafficRecorder()  # X402_CAPTURE_FILE to enable, see traffic_capture.py
+
+
+async def _ledger_maintenance():
+    """Batched fsync off the request path, periodic index checkpoints."""
+    last_checkpoint = time.monotonic()
+    while True:
+        await asyncio.sleep(ledger.fsync_interval)
+        await asyncio.to_thread(ledger.sync)
+        await asyncio.to_thread(settlement.queue.sync)
+        recorder.flush()
+        if time.monotonic() - last_checkpoint >= LEDGER_CHECKPOINT_INTERVAL:
+            await asyncio.to_thread(ledger.checkpoint)
+            await asyncio.to_thread(state.prune)
+            last_checkpoint = time.monotonic()
+
+
+def make_settler():
+    """Settles queued payments; the facilitator unless overridden."""
+    return FacilitatorSettler(FACILITATOR_URL, payment_requirements())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global ledger, settlement, verifier, state, slot, ws_deposit_calls
+    # Heavy imports happen here, once per worker, not at module import or per request
+    await asyncio.to_thread(warm_up)
+    try:
+        get_llm_client()
+    except Exception as e:
+        logger.warning(f"LLM provider not ready: {e}")
+    verifier = PaymentVerifier(RECIPIENT_ADDRESS, USDC_ADDRESS, PRICE_PER_CALL)
+    for route in ("/inference", "/estimate"):
+        payment_required.prepare(route, PRICE_PER_CALL)
+    # Each worker owns a ledger and settlement queue; nonces and counters are shared
+    slot = WorkerSlot(LEDGER_DIR)
+    state = SharedState(LEDGER_DIR)
+    ledger = PaymentLedger(slot.directory)
+    settler = make_settler()
+    queue = SettlementQueue(slot.directory, MAX_UNSETTLED // max(WORKERS, 1))
+    ws_deposit_calls = deposit_calls_for(queue.max_unsettled)
+    settlement = SettlementWorker(queue, settler, ledger)
+    maintenance = asyncio.create_task(_ledger_maintenance())
+    settling = asyncio.create_task(settlement.run())
+    loop_lag = asyncio.create_task(profiler.loop_lag.run()) if profiler.enabled else None
+    if CAPTURE_FILE:
+        # One file per worker so concurrent appends never interleave
+        recorder.open(CAPTURE_FILE if slot.slot == 0 else f"{CAPTURE_FILE}.{slot.slot}")
+    try:
+        yield
+    finally:
+        background = [t for t in (maintenance, settling, loop_lag) if t is not None]
+        for task in background:
+            task.cancel()
+        # Let in-flight syncs and batches unwind before their files are closed
+        await asyncio.gather(*background, return_exceptions=True)
+        recorder.close()
+        if hasattr(settler, "aclose"):
+            await settler.aclose()
+        settlement.queue.close()
+        settlement = None
+        ledger.close()
+        ledger = None
+        verifier.close()
+        verifier = None
+        state.close()
+        state = None
+        slot.release()
+        slot = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON responses rendered with json_codec (orjson when installed)."""
+
+    def render(self, content) -> bytes:
+        return json_codec.dumps(content)
+
+
+app = FastAPI(
+    title="x402 Inference Proxy",
+    description="Pay for LLM inference with USDC micropayments",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+app.add_middleware(CaptureMiddleware, recorder=recorder)
+
+
 # ============================================================================
 # Request/Response Models
 # ============================================================================
 
 class InferenceRequest(BaseModel):
     prompt: str
+    # Fixed instructions shared across calls; cached by the provider when supported
+    system: Optional[str] = None
     model: str = "claude-3-5-sonnet-20241022"
     max_tokens: int = 500
     temperature: float = 0.7
@@ -58,6 +193,21 @@ class InferenceResponse(BaseModel):
     model: str
     payment_amount: int
     tokens_used: int
+    cache_read_tokens: int = 0  # part of tokens_used served from the provider's prompt cache
+
+
+class EstimateRequest(BaseModel):
+    question: str
+    price: Optional[float] = Field(None, ge=0, le=1)  # current YES price, if known
+    model: str = "claude-3-5-sonnet-20241022"
+
+
+class EstimateResponse(BaseModel):
+    probability: float = Field(ge=0, le=1)
+    confidence: float = Field(ge=0, le=1)
+    model: str
+    payment_amount: int
+    tokens_used: int
 
 
 class PaymentRequired(BaseModel):
@@ -74,85 +224,155 @@ class PaymentRequired(BaseModel):
 # x402 Payment Verification
 # ============================================================================
 
-async def verify_x402_payment(request: Request) -> Optional[int]:
+def payment_requirements(price: Optional[int] = None) -> dict:
+    """The single payment option this proxy accepts."""
+    return {
+        "scheme": "exact",
+        "network": "eip155:8453",  # Base
+        "maxAmountRequired": str(PRICE_PER_CALL if price is None else price),
+        "asset": f"eip155:8453/erc20:{USDC_ADDRESS}",
+        "payTo": RECIPIENT_ADDRESS,
+    }
+
+
+class PaymentRequiredCache:
+    """
+    402 bodies rendered once per (route, price); only `resource` differs
+    between requests, so it is spliced into the pre-encoded bytes.
     """
-    Verify x402 payment header and return amount paid.
+
+    PLACEHOLDER = "\x00resource\x00"
+
+    def __init__(self):
+        self._templates: dict[tuple[str, int], tuple[bytes, bytes]] = {}
+
+    def prepare(self, route: str, price: int) -> tuple[bytes, bytes]:
+        rendered = json_codec.dumps(PaymentRequired(
+            accepts=[payment_requirements(price)],
+            maxAmountRequired=str(price),
+            resource=self.PLACEHOLDER,
+        ).model_dump())
+        prefix, suffix = rendered.split(json_codec.dumps(self.PLACEHOLDER))
+        self._templates[route, price] = prefix, suffix
+        return prefix, suffix
+
+    def body(self, route: str, price: int, resource: str) -> bytes:
+        template = self._templates.get((route, price)) or self.prepare(route, price)
+        return template[0] + json_codec.dumps(resource) + template[1]
+
+
+payment_required = PaymentRequiredCache()
+
+
+async def verify_payment_header(payment_header: Optional[str]) -> Optional[int]:
+    """
+    Verify an x402 payment and return amount paid.
     
     Returns None if no valid payment, amount in USDC micros if valid.
+    Verification is local (payment_verifier.py); nothing is settled here.
     """
-    payment_header = request.headers.get("X-PAYMENT")
-    if not payment_header:
+    if not payment_header or verifier is None:
         return None
-    
+
     try:
-        # Import x402 facilitator for verification
-        from x402 import x402Facilitator
-        from x402.mechanisms.evm.exact import ExactEvmScheme
-        
-        facilitator = x402Facilitator()
-        # In production, verify the payment on-chain
-        # For hackathon demo, we'll trust the signed payload
-        
-        # Parse and verify payment
-        # This would check signature, nonce, amount, etc.
-        result = await facilitator.verify_payment(
-            payment_header,
-            expected_recipient=RECIPIENT_ADDRESS,
-            expected_asset=USDC_ADDRESS,
-            min_amount=PRICE_PER_CALL,
-        )
-        
-        if result.valid:
-            return result.amount
-        return None
-        
-    except ImportError:
-        # Fallback: simple header parsing for demo
-        logger.warning("x402 package not installed, using demo mode")
-        # In demo mode, accept any payment header
-        return PRICE_PER_CALL
-    except Exception as e:
-        logger.error(f"Payment verification failed: {e}")
+        payment = await verifier.averify(payment_header)
+    except VerificationError as e:
+        logger.warning(f"Payment rejected: {e}")
         return None
+    return payment.amount
+
+
+async def verify_x402_payment(request: Request) -> Optional[int]:
+    """Verify the request's X-PAYMENT header (see verify_payment_header)."""
+    return await verify_payment_header(request.headers.get("X-PAYMENT"))
+
+
+def parse_payment_header(header: str) -> dict:
+    """
+    Payer, agentId, nonce and value from an X-PAYMENT header.
+
+    Accepts raw JSON (FREDAgent) or base64-encoded JSON (x402 SDK clients).
+    Missing fields come back as None.
+    """
+    payment = decode_header(header)
+    payload = payment.get("payload") or {}
+    authorization = payload.get("authorization") or {}
+    return {
+        "payer": authorization.get("from"),
+        "agent_id": payload.get("agentId"),
+        "nonce": authorization.get("nonce"),
+        "value": authorization.get("value"),
+        "valid_before": authorization.get("validBefore"),
+    }
 
 
 # ============================================================================
 # LLM Inference
 # ============================================================================
 
-async def call_llm(prompt: str, model: str, max_tokens: int) -> tuple[str, int]:
+class LLMReply(NamedTuple):
+    text: str
+    tokens: int                  # every token processed, cached input included
+    cache_read_tokens: int = 0   # input tokens read from the provider's prompt cache
+
+
+_llm_client = None
+
+
+def get_llm_client():
+    """Provider SDK client; imported and created once (at startup, see lifespan)."""
+    global _llm_client
+    if _llm_client is None:
+        if LLM_PROVIDER == "anthropic":
+            import anthropic
+            _llm_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+        elif LLM_PROVIDER == "openai":
+            import openai
+            _llm_client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
+        else:
+            raise HTTPException(500, f"Unknown LLM provider: {LLM_PROVIDER}")
+    return _llm_client
+
+
+async def call_llm(prompt: str, model: str, max_tokens: int, system: Optional[str] = None) -> LLMReply:
     """
     Call the underlying LLM provider.
-    
-    Returns (response_text, tokens_used).
+
+    `system` is the fixed part of the prompt. Anthropic caches it when it is
+    marked with cache_control; OpenAI caches long shared prefixes on its own.
     """
+    client = get_llm_client()
+
     if LLM_PROVIDER == "anthropic":
-        import anthropic
-        client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
-        
+        kwargs = {}
+        if system:
+            kwargs["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
         response = await client.messages.create(
             model=model,
             max_tokens=max_tokens,
             messages=[{"role": "user", "content": prompt}],
+            **kwargs,
         )
         
         text = response.content[0].text
-        tokens = response.usage.input_tokens + response.usage.output_tokens
-        return text, tokens
+        usage = response.usage
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+        tokens = usage.input_tokens + usage.output_tokens + cache_read + cache_write
+        return LLMReply(text, tokens, cache_read)
         
     elif LLM_PROVIDER == "openai":
-        import openai
-        client = openai.AsyncOpenAI(api_key=OPENAI_API_KEY)
-        
+        messages = [{"role": "system", "content": system}] if system else []
         response = await client.chat.completions.create(
             model=model,
             max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages + [{"role": "user", "content": prompt}],
         )
         
         text = response.choices[0].message.content
-        tokens = response.usage.total_tokens
-        return text, tokens
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        cache_read = getattr(details, "cached_tokens", None) or 0
+        return LLMReply(text, response.usage.total_tokens, cache_read)
     
     else:
         raise HTTPException(500, f"Unknown LLM provider: {LLM_PROVIDER}")
@@ -162,68 +382,230 @@ async def call_llm(prompt: str, model: str, max_tokens: int) -> tuple[str, int]:
 # Endpoints
 # ============================================================================
 
-@app.post("/inference")
-async def inference(request: Request, body: InferenceRequest):
+async def serve_paid(request: Request, route: str, produce) -> Union[Response, dict]:
     """
-    x402-protected inference endpoint.
-    
-    Returns 402 if no valid payment, 200 with inference result if paid.
+    The x402 flow shared by every paid route.
+
+    Returns the 402 response if unpaid. Otherwise runs `produce()` (an async
+    callable returning (fields, tokens_used)) and returns the fields plus
+    payment_amount and tokens_used. The payment is only queued for
+    settlement and recorded once `produce()` succeeded.
     """
+    started = time.perf_counter()
+    mark("validate")  # routing, body parsing and pydantic validation
+
     # Check for payment
     payment_amount = await verify_x402_payment(request)
+    mark("verify")
     
     if payment_amount is None:
-        # Return 402 with payment requirements
-        payment_req = PaymentRequired(
-            accepts=[{
-                "scheme": "exact",
-                "network": "eip155:8453",  # Base
-                "maxAmountRequired": str(PRICE_PER_CALL),
-                "asset": f"eip155:8453/erc20:{USDC_ADDRESS}",
-                "payTo": RECIPIENT_ADDRESS,
-            }],
-            maxAmountRequired=str(PRICE_PER_CALL),
-            resource=str(request.url),
-        )
+        # Return 402 with payment requirements (pre-rendered, see PaymentRequiredCache)
         return Response(
-            content=payment_req.model_dump_json(),
+            content=payment_required.body(route, PRICE_PER_CALL, str(request.url)),
             status_code=402,
             media_type="application/json",
             headers={"X-Payment-Required": "true"},
         )
     
-    # Payment verified, make inference call
+    # Verified only; settlement happens later, in batches
+    payment = parse_payment_header(request.headers["X-PAYMENT"])
+    pid = payment_id(payment["payer"], payment["nonce"])
+    if state is not None and RATE_LIMIT:
+        if state.hit(f"rate:{(payment['payer'] or 'unknown').lower()}") > RATE_LIMIT:
+            raise HTTPException(429, "Rate limit exceeded", headers={"Retry-After": "60"})
+    # Reserved, not just checked: concurrent requests must not overshoot the cap across produce()
+    queue = settlement.queue if settlement is not None else None
+    if queue is not None and not queue.reserve(payment_amount):
+        settlement.kick()
+        raise HTTPException(503, "Settlement backlog full, retry shortly", headers={"Retry-After": "5"})
     try:
-        response_text, tokens_used = await call_llm(
-            body.prompt,
-            body.model,
-            body.max_tokens,
-        )
-        
-        logger.info(f"Inference completed: {tokens_used} tokens, ${payment_amount/1_000_000:.6f} USDC")
-        
-        return InferenceResponse(
-            response=response_text,
-            model=body.model,
-            payment_amount=payment_amount,
-            tokens_used=tokens_used,
+        # One claim per authorization across all workers and restarts
+        if state is not None:
+            valid_before = payment["valid_before"]
+            if not state.claim_nonce(pid, float(valid_before) if valid_before else None):
+                raise HTTPException(402, "Payment authorization already used")
+        mark("admission")
+
+        try:
+            fields, tokens_used = await produce()
+        except Exception as e:
+            if state is not None:
+                state.release_nonce(pid)  # not served, so not charged: the client may retry
+            if isinstance(e, HTTPException):
+                raise
+            logger.error(f"Inference failed: {e}")
+            raise HTTPException(500, f"Inference failed: {e}")
+    finally:
+        if queue is not None:
+            queue.release(payment_amount)  # a served payment is queued below, with no await between
+    mark("provider")
+
+    logger.info(f"{route} completed: {tokens_used} tokens, ${payment_amount/1_000_000:.6f} USDC")
+
+    if state is not None:
+        state.hit("calls", 0)
+        state.hit("calls", 60)
+    if settlement is not None:
+        settlement.submit(pid, request.headers["X-PAYMENT"], payment_amount)
+    if ledger is not None:
+        ledger.record_payment(
+            payer=payment["payer"],
+            agent_id=payment["agent_id"],
+            amount=payment_amount,
+            nonce=payment["nonce"],
+            tokens=tokens_used,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            route=route,
         )
-        
-    except Exception as e:
-        logger.error(f"Inference failed: {e}")
-        raise HTTPException(500, f"Inference failed: {e}")
+    mark("record")
+    return dict(fields, payment_amount=payment_amount, tokens_used=tokens_used)
+
+
+@app.post("/inference")
+async def inference(request: Request, body: InferenceRequest):
+    """
+    x402-protected inference endpoint.
+    
+    Returns 402 if no valid payment, 200 with inference result if paid.
+    """
+    async def produce():
+        reply = await call_llm(body.prompt, body.model, body.max_tokens, system=body.system)
+        fields = {"response": reply.text, "model": body.model, "cache_read_tokens": reply.cache_read_tokens}
+        return fields, reply.tokens
+
+    result = await serve_paid(request, "/inference", produce)
+    if isinstance(result, Response):
+        return result
+    return InferenceResponse(**result)
+
+
+@app.post("/estimate")
+async def estimate(request: Request, body: EstimateRequest):
+    """
+    x402-protected structured probability estimate.
+
+    Same payment flow as /inference, but with a compact fixed prompt, a
+    small token cap and a validated, typed reply. A reply that does not
+    parse is a 502 and the payment is not charged.
+    """
+    async def produce():
+        reply = await call_llm(estimate_prompt(body.question, body.price), body.model, ESTIMATE_MAX_TOKENS)
+        try:
+            fields = parse_probability(reply.text)
+        except ValueError as e:
+            logger.warning(f"Unparseable estimate: {e}")
+            raise HTTPException(502, "Provider returned an invalid estimate")
+        return dict(fields, model=body.model), reply.tokens
+
+    result = await serve_paid(request, "/estimate", produce)
+    if isinstance(result, Response):
+        return result
+    return EstimateResponse(**result)
 
 
 @app.get("/pricing")
 async def pricing():
     """Get current pricing for inference calls."""
-    return {
+    result = {
         "price_per_call_usdc": PRICE_PER_CALL / 1_000_000,
         "price_per_call_raw": PRICE_PER_CALL,
         "network": "eip155:8453",
         "asset": "USDC",
         "recipient": RECIPIENT_ADDRESS,
     }
+    if state is not None:
+        result["calls_served"] = state.count("calls", 0)
+        result["calls_last_hour"] = state.count("calls", 60, start=time.time() - 3600)
+    return result
+
+
+def require_admin(request: Request):
+    """Admin endpoints need X402_ADMIN_TOKEN as a bearer token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not Found")
+    given = request.headers.get("Authorization", "").encode()
+    if not hmac.compare_digest(given, f"Bearer {ADMIN_TOKEN}".encode()):  # constant time
+        raise HTTPException(401, "Admin token required")
+
+
+@app.get("/revenue")
+async def revenue(
+    request: Request,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    payer: Optional[str] = None,
+    top: int = 10,
+):
+    """Revenue from the payment ledger index (admin only)."""
+    require_admin(request)
+    if ledger is None:
+        raise HTTPException(503, "Ledger not available")
+
+    # Other workers' ledgers are read from their last checkpoint plus replay
+    ledgers = [ledger] + [PaymentLedger(directory, readonly=True)
+                          for directory in worker_directories(LEDGER_DIR) if directory != slot.directory]
+
+    window = {"count": 0, "amount": 0, "tokens": 0}
+    totals = {"count": 0, "amount": 0, "tokens": 0}
+    payers: dict[str, dict] = {}
+    for each in ledgers:
+        for key, value in each.revenue(start, end).items():
+            window[key] += value
+        for key, value in each.totals().items():
+            if key in totals:
+                totals[key] += value
+        for address, stats in each.payers().items():
+            merged = payers.setdefault(address, {"count": 0, "amount": 0, "tokens": 0, "first_ts": stats["first_ts"],
+                                                 "last_ts": stats["last_ts"], "agent_id": stats["agent_id"]})
+            for key in ("count", "amount", "tokens"):
+                merged[key] += stats[key]
+            merged["first_ts"] = min(merged["first_ts"], stats["first_ts"])
+            merged["last_ts"] = max(merged["last_ts"], stats["last_ts"])
+
+    ranked = sorted(payers.items(), key=lambda kv: kv[1]["amount"], reverse=True)[:top]
+    result = {
+        "window": {"start": start, "end": end, **window, "amount_usdc": window["amount"] / 1_000_000},
+        "totals": dict(totals, payers=len(payers)),
+        "top_payers": [dict(stats, payer=address) for address, stats in ranked],
+        "workers": len(ledgers),
+    }
+    if payer:
+        result["payer"] = payers.get(payer.lower())
+    if settlement is not None:
+        result["settlement"] = settlement.status()
+    return result
+
+
+@app.get("/admin/diagnostics")
+async def diagnostics(request: Request):
+    """Event-loop lag and recent slow requests (admin only, X402_PROFILE=1)."""
+    require_admin(request)
+    if not profiler.enabled:
+        raise HTTPException(404, "Profiling is disabled")
+    result = profiler.stats()
+    if verifier is not None:
+        result["signer_cache"] = verifier.stats()
+    return result
+
+
+@app.get("/admin/profile")
+async def profile(request: Request, mode: str = "cpu", seconds: float = 5.0):
+    """
+    Time-boxed profile of this worker (admin only, X402_PROFILE=1).
+
+    mode=cpu samples the event-loop thread's stack; mode=memory traces
+    allocations with tracemalloc. `seconds` is capped at
+    X402_PROFILE_MAX_SECONDS, and only one profile runs at a time.
+    """
+    require_admin(request)
+    if not profiler.enabled:
+        raise HTTPException(404, "Profiling is disabled")
+    if mode not in ("cpu", "memory"):
+        raise HTTPException(422, "mode must be cpu or memory")
+    if profiler.busy.locked():
+        raise HTTPException(409, "A profile is already running")
+    logger.info(f"Profiling ({mode}) for {min(seconds, PROFILE_MAX_SECONDS)}s")
+    return await run_profile(profiler, mode, seconds)
 
 
 @app.get("/health")
@@ -231,10 +613,224 @@ async def health():
     return {"status": "ok", "x402_enabled": True}
 
 
+# ============================================================================
+# WebSocket Channel
+# ============================================================================
+
+WS_ROUTE = "/ws/inference"
+ws_deposit_calls = WS_DEPOSIT_CALLS  # set per worker at startup, see deposit_calls_for
+
+
+def deposit_calls_for(worker_cap: int) -> int:
+    """
+    Calls one /ws/inference deposit may pay for on a worker whose unsettled
+    cap is `worker_cap`: X402_WS_DEPOSIT_CALLS, lowered to fit the cap.
+    Refuses to start if not even a single call fits.
+    """
+    if worker_cap < PRICE_PER_CALL:
+        raise RuntimeError(
+            f"X402_MAX_UNSETTLED={MAX_UNSETTLED} over {WORKERS} workers leaves {worker_cap} micros per worker, "
+            f"less than one call ({PRICE_PER_CALL}); raise X402_MAX_UNSETTLED or lower X402_WORKERS")
+    fitting = max(1, worker_cap // (WS_DEPOSIT_SHARE * PRICE_PER_CALL))
+    if fitting < WS_DEPOSIT_CALLS:
+        logger.warning(f"{WS_ROUTE} deposits capped at {fitting} calls (X402_WS_DEPOSIT_CALLS={WS_DEPOSIT_CALLS}) "
+                       f"to fit the per-worker unsettled cap of {worker_cap} micros")
+    return min(WS_DEPOSIT_CALLS, fitting)
+
+
+class PaidChannel:
+    """
+    One /ws/inference connection, paid once by an x402 deposit.
+
+    Frames are JSON objects with a `type` and a client-chosen `id` that the
+    reply echoes. A deposit is verified, claimed and queued for settlement
+    like an HTTP payment, then each inference/estimate frame is debited
+    PRICE_PER_CALL. Requests run as separate tasks, so replies come back in
+    completion order. Failed requests are refunded, and whatever is left
+    when the socket closes is kept as credit for the payer's next deposit.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.balance = 0  # USDC micros
+        self.payer: Optional[str] = None
+        self.agent_id = None
+        self.nonce: Optional[str] = None
+        self.deposit_id: Optional[str] = None  # payment id of the latest deposit, as settlement records it
+        self.served = 0
+        self.tasks: set[asyncio.Task] = set()
+        self._send_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+
+    async def send(self, frame: dict):
+        async with self._send_lock:
+            try:
+                await self.websocket.send_text(json_codec.dumps(frame).decode())
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # client went away; close() settles the balance
+
+    async def error(self, request_id, code: int, message: str):
+        await self.send({"type": "error", "id": request_id, "code": code, "error": message})
+
+    async def run(self):
+        await self.send({
+            "type": "payment_required",
+            "accepts": [payment_requirements(PRICE_PER_CALL * ws_deposit_calls)],
+            "price_per_call": PRICE_PER_CALL,
+            "deposit_calls": ws_deposit_calls,
+            "max_in_flight": WS_MAX_IN_FLIGHT,
+        })
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                try:
+                    frame = json_codec.loads(message.get("text") or message.get("bytes") or b"")
+                except ValueError:
+                    frame = None
+                if not isinstance(frame, dict):
+                    await self.error(None, 400, "Frames must be JSON objects")
+                    continue
+                kind = frame.get("type")
+                if kind == "deposit":
+                    await self.deposit(frame)
+                elif kind in ("inference", "estimate"):
+                    await self.request(frame)
+                elif kind == "balance":
+                    await self.send({"type": "balance", "id": frame.get("id"), "balance": self.balance})
+                else:
+                    await self.error(frame.get("id"), 400, f"Unknown frame type {kind!r}")
+        finally:
+            await self.close()
+
+    async def deposit(self, frame: dict):
+        request_id = frame.get("id")
+        header = frame.get("payment")
+        if isinstance(header, dict):
+            header = json_codec.dumps(header).decode()
+        amount = await verify_payment_header(header)
+        if amount is None:
+            return await self.error(request_id, 402, "Invalid payment")
+        if amount > PRICE_PER_CALL * ws_deposit_calls:
+            return await self.error(request_id, 413, f"Deposits are limited to {ws_deposit_calls} calls")
+
+        payment = parse_payment_header(header)
+        payer = (payment["payer"] or "unknown").lower()
+        if self.payer is not None and payer != self.payer:
+            return await self.error(request_id, 403, "Deposits on a channel must come from one payer")
+        if settlement is not None and not settlement.queue.can_accept(amount):
+            settlement.kick()
+            return await self.error(request_id, 503, "Settlement backlog full, retry shortly")
+        pid = payment_id(payment["payer"], payment["nonce"])
+        credit = 0
+        if state is not None:
+            valid_before = payment["valid_before"]
+            if not state.claim_nonce(pid, float(valid_before) if valid_before else None):
+                return await self.error(request_id, 402, "Payment authorization already used")
+            credit = state.take(f"credit:{payer}")
+        if settlement is not None:
+            settlement.submit(pid, header, amount)
+
+        self.payer, self.agent_id, self.nonce = payer, payment["agent_id"], payment["nonce"]
+        self.deposit_id = pid
+        self.balance += amount + credit
+        logger.info(f"{WS_ROUTE} deposit: ${amount/1_000_000:.6f} USDC from {payer} (+{credit} credit)")
+        await self.send({"type": "deposited", "id": request_id, "amount": amount, "credit": credit,
+                         "balance": self.balance})
+
+    async def request(self, frame: dict):
+        request_id = frame.get("id")
+        kind = frame["type"]
+        try:
+            body = (InferenceRequest if kind == "inference" else EstimateRequest).model_validate(frame)
+        except ValidationError as e:
+            return await self.error(request_id, 422, str(e))
+        if self.balance < PRICE_PER_CALL:
+            return await self.error(request_id, 402, "Deposit exhausted")
+        if state is not None and RATE_LIMIT and state.hit(f"rate:{self.payer}") > RATE_LIMIT:
+            return await self.error(request_id, 429, "Rate limit exceeded")
+
+        self.balance -= PRICE_PER_CALL
+        # Stop reading frames while WS_MAX_IN_FLIGHT requests are running
+        await self._in_flight.acquire()
+        task = asyncio.create_task(self.serve(kind, request_id, body, self.deposit_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def serve(self, kind: str, request_id, body: Union[InferenceRequest, EstimateRequest],
+                    deposit_id: Optional[str] = None):
+        started = time.perf_counter()
+        try:
+            if kind == "inference":
+                reply = await call_llm(body.prompt, body.model, body.max_tokens, system=body.system)
+                fields = {"response": reply.text, "model": body.model, "cache_read_tokens": reply.cache_read_tokens}
+            else:
+                reply = await call_llm(estimate_prompt(body.question, body.price), body.model, ESTIMATE_MAX_TOKENS)
+                try:
+                    fields = dict(parse_probability(reply.text), model=body.model)
+                except ValueError as e:
+                    logger.warning(f"Unparseable estimate: {e}")
+                    self.balance += PRICE_PER_CALL
+                    return await self.error(request_id, 502, "Provider returned an invalid estimate")
+        except asyncio.CancelledError:
+            self.balance += PRICE_PER_CALL
+            raise
+        except Exception as e:
+            logger.error(f"Inference failed: {e}")
+            self.balance += PRICE_PER_CALL
+            return await self.error(request_id, 500, f"Inference failed: {e}")
+        finally:
+            self._in_flight.release()
+
+        self.served += 1
+        if state is not None:
+            state.hit("calls", 0)
+            state.hit("calls", 60)
+        if ledger is not None:
+            ledger.record_payment(
+                payer=self.payer,
+                agent_id=self.agent_id,
+                amount=PRICE_PER_CALL,
+                nonce=f"{self.nonce}#{self.served}",
+                tokens=reply.tokens,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                route=WS_ROUTE,
+                deposit=deposit_id,  # joins the call to the settlement of the deposit that paid it
+            )
+        await self.send(dict(fields, type="result", id=request_id, payment_amount=PRICE_PER_CALL,
+                             tokens_used=reply.tokens, balance=self.balance))
+
+    async def close(self):
+        """Cancel running requests (refunding them) and keep the balance as credit."""
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.balance and self.payer and state is not None:
+            state.hit(f"credit:{self.payer}", 0, self.balance)
+        self.balance = 0
+
+
+@app.websocket(WS_ROUTE)
+async def ws_inference(websocket: WebSocket):
+    """
+    x402-paid inference channel: one deposit, many multiplexed requests.
+
+    See PaidChannel for the frame protocol.
+    """
+    await websocket.accept()
+    await PaidChannel(websocket).run()
+
+
 # ============================================================================
 # Run
 # ============================================================================
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8402)
+    if WORKERS > 1:
+        # Worker processes re-import the app, so pass it by name
+        uvicorn.run("x402_inference_server:app", host="0.0.0.0", port=8402, workers=WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8402)
@@ -13,15 +13,17 @@ Architecture:
 
 import os
 import json
+import time
 import httpx
-from web3 import Web3
-from eth_account import Account
-from eth_account.messages import encode_defunct
+
+from rpc_pool import make_web3
+from tx_builder import TxBuilder
+from tx_sequencer import TxSequencer
+from spend_governor import SpendGovernor
 
 # ============ CONFIG ============
 
-# Base Mainnet
-BASE_RPC = "https://mainnet.base.org"
+# Base Mainnet (RPC endpoints: BASE_RPC_URLS, see rpc_pool.py)
 CHAIN_ID = 8453
 
 # ERC-8004 Registries (Base)
@@ -37,6 +39,12 @@ USDC_ADDRESS = "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913"
 # FRED's wallet
 FRED_WALLET = "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"
 
+# Header the proxy reads the signed payment from
+PAYMENT_HEADER = "X-PAYMENT"
+
+# How long a signed payment authorization stays valid
+PAYMENT_VALIDITY = 300  # seconds
+
 # ============ ERC-8004 ============
 
 IDENTITY_ABI = [
@@ -49,17 +57,64 @@ IDENTITY_ABI = [
     {"inputs": [{"name": "owner", "type": "address"}, {"name": "index", "type": "uint256"}],
      "name": "tokenOfOwnerByIndex", "outputs": [{"name": "", "type": "uint256"}],
      "stateMutability": "view", "type": "function"},
+    {"inputs": [{"name": "tokenId", "type": "uint256"}],
+     "name": "tokenURI", "outputs": [{"name": "", "type": "string"}],
+     "stateMutability": "view", "type": "function"},
 ]
 
 
+# ============ x402 ============
+
+TRANSFER_WITH_AUTHORIZATION_TYPES = {
+    "EIP712Domain": [
+        {"name": "name", "type": "string"},
+        {"name": "version", "type": "string"},
+        {"name": "chainId", "type": "uint256"},
+        {"name": "verifyingContract", "type": "address"},
+    ],
+    "TransferWithAuthorization": [
+        {"name": "from", "type": "address"},
+        {"name": "to", "type": "address"},
+        {"name": "value", "type": "uint256"},
+        {"name": "validAfter", "type": "uint256"},
+        {"name": "validBefore", "type": "uint256"},
+        {"name": "nonce", "type": "bytes32"},
+    ],
+}
+
+
+def usdc_micros(amount_usd: float) -> int:
+    """USD to USDC base units (6 decimals), rounded: int() truncates $0.000983 to 982"""
+    return round(amount_usd * 1_000_000)
+
+
+def parse_payment_required(requirements: dict) -> tuple[float, str]:
+    """Price (USD) and recipient from a 402 body, x402 `accepts` or flat form"""
+    accepts = (requirements.get("accepts") or [{}])[0]
+    raw = (
+        requirements.get("maxAmountRequired")
+        or accepts.get("maxAmountRequired")
+        or requirements.get("price", 0)
+    )
+    recipient = accepts.get("payTo") or requirements.get("recipient")
+    return float(raw) / 1_000_000, recipient  # USDC decimals
+
+
 class FREDAgent:
     """FRED: Full-stack autonomous trading agent"""
     
     def __init__(self, private_key: str):
-        self.w3 = Web3(Web3.HTTPProvider(BASE_RPC))
+        # web3/eth_account take ~1s to import; load them with the agent, not the module
+        from eth_account import Account
+
+        self.w3 = make_web3()
+        self.tx = TxBuilder(self.w3, CHAIN_ID)
+        self.sequencer = TxSequencer(self.w3, self.tx)
         self.account = Account.from_key(private_key)
         self.address = self.account.address
         self.agent_id = None
+        # Aggregate spend and concurrency limits for every paid call (see spend_governor.py)
+        self.governor = SpendGovernor()
         
         # Connect to registries
         self.identity = self.w3.eth.contract(
@@ -85,22 +140,13 @@ class FREDAgent:
             print(f"Already registered with ID: {self.agent_id}")
             return self.agent_id
         
-        tx = self.identity.functions.register(
-            self.address,
-            registration_uri
-        ).build_transaction({
-            'from': self.address,
-            'nonce': self.w3.eth.get_transaction_count(self.address),
-            'gas': 200000,
-            'gasPrice': self.w3.eth.gas_price,
-            'chainId': CHAIN_ID
+        pending = self.sequencer.submit(self.account, {
+            'to': IDENTITY_REGISTRY,
+            'data': self.identity.encode_abi("register", args=[self.address, registration_uri]),
         })
+        print(f"📝 Registration tx: {pending.tx_hash}")
         
-        signed = self.account.sign_transaction(tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
-        print(f"📝 Registration tx: {tx_hash.hex()}")
-        
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = pending.result()
         print(f"✓ Confirmed in block {receipt['blockNumber']}")
         
         self._load_agent_id()
@@ -112,10 +158,12 @@ class FREDAgent:
         amount_usd: float,
         resource: str
     ) -> dict:
-        """Create x402 payment authorization"""
+        """Create x402 payment authorization (EIP-3009 TransferWithAuthorization)"""
+        from eth_account.messages import encode_typed_data
         
         # Amount in USDC (6 decimals)
-        amount_wei = int(amount_usd * 1_000_000)
+        amount_wei = usdc_micros(amount_usd)
+        now = int(time.time())
         
         # Payment payload per x402 spec
         payment = {
@@ -128,9 +176,10 @@ class FREDAgent:
                     "from": self.address,
                     "to": recipient,
                     "value": str(amount_wei),
-                    "validAfter": 0,
-                    "validBefore": 2**48 - 1,
-                    "nonce": self.w3.eth.get_transaction_count(self.address),
+                    "validAfter": str(now - 60),
+                    "validBefore": str(now + PAYMENT_VALIDITY),
+                    # EIP-3009 nonces are random bytes32, not the account nonce
+                    "nonce": "0x" + os.urandom(32).hex(),
                 },
                 # Include ERC-8004 agent identity
                 "agentRegistry": f"eip155:{CHAIN_ID}:{IDENTITY_REGISTRY}",
@@ -139,10 +188,20 @@ class FREDAgent:
             "resource": resource,
         }
         
-        # Sign the authorization
-        message = json.dumps(payment["payload"]["authorization"], sort_keys=True)
-        signed = self.account.sign_message(encode_defunct(text=message))
-        payment["payload"]["signature"] = signed.signature.hex()
+        # Sign the authorization as EIP-712 typed data over the USDC domain
+        authorization = payment["payload"]["authorization"]
+        signed = self.account.sign_message(encode_typed_data(full_message={
+            "types": TRANSFER_WITH_AUTHORIZATION_TYPES,
+            "primaryType": "TransferWithAuthorization",
+            "domain": {"name": "USD Coin", "version": "2", "chainId": CHAIN_ID, "verifyingContract": USDC_ADDRESS},
+            "message": {
+                **authorization,
+                "value": int(authorization["value"]),
+                "validAfter": int(authorization["validAfter"]),
+                "validBefore": int(authorization["validBefore"]),
+            },
+        }))
+        payment["payload"]["signature"] = "0x" + signed.signature.hex().removeprefix("0x")
         
         return payment
     
@@ -152,42 +211,46 @@ class FREDAgent:
         prompt: str,
         max_price_usd: float = 0.01
     ) -> dict:
-        """Request LLM inference with x402 payment"""
-        
-        # 1. Make initial request to get 402 response
-        response = httpx.post(
-            inference_endpoint,
-            json={"prompt": prompt},
-            timeout=30
-        )
+        """Request LLM inference with x402 payment, within the governor's limits"""
         
-        if response.status_code != 402:
-            return response.json()
-        
-        # 2. Parse payment requirements
-        requirements = response.json()
-        price = float(requirements.get("price", 0)) / 1_000_000  # USDC decimals
-        recipient = requirements.get("recipient")
-        
-        print(f"💳 Payment required: ${price:.4f} USDC to {recipient}")
-        
-        if price > max_price_usd:
-            raise ValueError(f"Price ${price} exceeds max ${max_price_usd}")
-        
-        # 3. Create and attach payment
-        payment = self.create_x402_payment(
-            recipient=recipient,
-            amount_usd=price,
-            resource=inference_endpoint
-        )
-        
-        # 4. Retry with payment header
-        response = httpx.post(
-            inference_endpoint,
-            json={"prompt": prompt},
-            headers={"X-402-Payment": json.dumps(payment)},
-            timeout=30
-        )
+        with self.governor.slot_sync() as call:
+            # 1. Make initial request to get 402 response
+            started = time.monotonic()
+            response = httpx.post(
+                inference_endpoint,
+                json={"prompt": prompt},
+                timeout=30
+            )
+            
+            if response.status_code != 402:
+                call.observe(response.status_code, time.monotonic() - started)
+                return response.json()
+            
+            # 2. Parse payment requirements
+            price, recipient = parse_payment_required(response.json())
+            
+            print(f"💳 Payment required: ${price:.4f} USDC to {recipient}")
+            
+            if price > max_price_usd:
+                raise ValueError(f"Price ${price} exceeds max ${max_price_usd}")
+            
+            # 3. Reserve budget, then create and attach payment
+            call.pay_sync(price)
+            payment = self.create_x402_payment(
+                recipient=recipient,
+                amount_usd=price,
+                resource=inference_endpoint
+            )
+            
+            # 4. Retry with payment header
+            started = time.monotonic()
+            response = httpx.post(
+                inference_endpoint,
+                json={"prompt": prompt},
+                headers={PAYMENT_HEADER: json.dumps(payment)},
+                timeout=30
+            )
+            call.observe(response.status_code, time.monotonic() - started)
         
         if response.status_code == 200:
             print(f"✓ Inference received (paid ${price:.4f})")
@@ -195,6 +258,35 @@ class FREDAgent:
         else:
             raise Exception(f"Payment failed: {response.status_code}")
     
+    def registration_uri(self, agent_id: int = None) -> str:
+        """ERC-8004 registration file URI (tokenURI) of an agent, FRED by default"""
+        return self.identity.functions.tokenURI(agent_id or self.agent_id).call()
+    
+    def inference_router(self, registration_uri: str = None, agent_id: int = None):
+        """Router over the inference endpoints an agent's registration advertises"""
+        from inference_router import InferenceRouter
+        
+        uri = registration_uri or self.registration_uri(agent_id)
+        return InferenceRouter.from_registration(uri, self.create_x402_payment, governor=self.governor)
+    
+    def estimator(self, endpoint: str, **kwargs):
+        """Paid async market estimator for scans, under the agent's spend governor"""
+        from market_pipeline import X402Estimator
+        
+        return X402Estimator(endpoint, self.create_x402_payment, governor=self.governor, **kwargs)
+    
+    def open_inference_channel(
+        self,
+        url: str,
+        deposit_calls: int = 100,
+        max_price_usd: float = 0.01
+    ):
+        """x402 inference over one WebSocket: a deposit, then pipelined calls (use with `async with`)"""
+        from inference_channel import InferenceChannel
+        
+        return InferenceChannel(url, self.create_x402_payment, deposit_calls=deposit_calls,
+                                max_price_usd=max_price_usd, governor=self.governor)
+    
     def get_agent_info(self) -> dict:
         """Get agent info for display"""
         return {
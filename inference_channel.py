@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+x402 Inference Channel for FRED
+
+Client for the proxy's /ws/inference WebSocket. The channel is paid once
+with an x402 deposit covering `deposit_calls` calls; after that every
+request is a frame with a correlation id, so a scan can keep hundreds of
+estimates in flight on one connection and each resolves as soon as the
+proxy answers it, in any order. The deposit is topped up in the
+background when fewer than `low_water_calls` calls are left.
+
+Usage:
+    async with agent.open_inference_channel("ws://localhost:8402/ws/inference") as channel:
+        estimates = await asyncio.gather(*(channel.estimate(q, p) for q, p in markets))
+"""
+
+import json
+import time
+import asyncio
+import itertools
+from typing import Callable, Optional
+
+from fred_x402_8004 import parse_payment_required, usdc_micros
+
+
+class ChannelError(RuntimeError):
+    """The proxy answered a frame with an error (code mirrors HTTP status)."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+class InferenceChannel:
+    """
+    Multiplexed, deposit-paid inference over one WebSocket.
+
+    `sign_payment(recipient, amount_usd, resource) -> dict` is normally
+    FREDAgent.create_x402_payment. With a `governor` (SpendGovernor,
+    FREDAgent.governor) each deposit takes a slot and reserves its amount
+    from the spend budget before signing; a rejected deposit is refunded.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        sign_payment: Callable[[str, float, str], dict],
+        deposit_calls: int = 100,
+        max_price_usd: float = 0.01,
+        low_water_calls: int = 10,
+        governor=None,
+    ):
+        self.url = url
+        self.sign_payment = sign_payment
+        self.governor = governor
+        self.deposit_calls = deposit_calls
+        self.max_price_usd = max_price_usd
+        self.low_water_calls = low_water_calls
+        self.price_per_call = 0       # USDC micros, from the proxy's offer
+        self.recipient: Optional[str] = None
+        self.calls_left = 0           # prepaid calls not yet sent
+        self.deposited_usd = 0.0
+        self._ids = itertools.count(1)
+        self._pending: dict[str, asyncio.Future] = {}
+        self._ws = None
+        self._reader: Optional[asyncio.Task] = None
+        self._top_up: Optional[asyncio.Task] = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self) -> "InferenceChannel":
+        """Connect, check the price and make the first deposit."""
+        from websockets.asyncio.client import connect
+
+        self._ws = await connect(self.url)
+        offer = json.loads(await self._ws.recv())
+        if offer.get("type") != "payment_required":
+            await self._ws.close()
+            raise ChannelError(400, f"Unexpected first frame {offer.get('type')!r}")
+        self.price_per_call = int(offer["price_per_call"])
+        # The proxy caps deposits to fit its settlement backlog; stay within it
+        self.deposit_calls = min(self.deposit_calls, int(offer.get("deposit_calls") or self.deposit_calls))
+        self.low_water_calls = min(self.low_water_calls, self.deposit_calls // 2)
+        _, self.recipient = parse_payment_required(offer)
+        price = self.price_per_call / 1_000_000
+        if self.price_per_call > usdc_micros(self.max_price_usd):  # compare in micros, not floats
+            await self._ws.close()
+            raise ValueError(f"Price ${price} exceeds max ${self.max_price_usd}")
+        print(f"💳 Channel price: ${price:.4f} USDC/call to {self.recipient}")
+
+        self._reader = asyncio.create_task(self._read())
+        await self.deposit()
+        return self
+
+    async def close(self):
+        if self._top_up is not None:
+            self._top_up.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+
+    # -- frames --
+
+    async def _read(self):
+        error: Exception = ConnectionError("Inference channel closed")
+        try:
+            async for message in self._ws:
+                frame = json.loads(message)
+                future = self._pending.pop(frame.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if frame.get("type") == "error":
+                    future.set_exception(ChannelError(frame["code"], frame["error"]))
+                else:
+                    future.set_result(frame)
+        except Exception as e:
+            error = e
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def _send(self, frame: dict) -> asyncio.Future:
+        """Send a frame; returns the future its reply frame resolves."""
+        if self._reader is None or self._reader.done():
+            raise ConnectionError("Inference channel is not open")
+        request_id = str(next(self._ids))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._ws.send(json.dumps(dict(frame, id=request_id)))
+        except BaseException:
+            self._pending.pop(request_id, None)
+            raise
+        return future
+
+    async def _call(self, frame: dict) -> dict:
+        future = await self._send(frame)
+        return await future
+
+    # -- deposits --
+
+    async def deposit(self, calls: Optional[int] = None) -> dict:
+        """Pay for `calls` more calls (default deposit_calls)."""
+        amount_usd = self.price_per_call * (calls or self.deposit_calls) / 1_000_000
+        if self.governor is None:
+            reply = await self._deposit(amount_usd)
+        else:
+            async with self.governor.slot() as call:
+                await call.pay(amount_usd)  # waits for budget
+                started = time.monotonic()
+                try:
+                    reply = await self._deposit(amount_usd)
+                except ChannelError as e:
+                    call.observe(e.code)  # rejected, so not charged: refunded
+                    raise
+                call.observe(200, time.monotonic() - started)
+        self.calls_left += (reply["amount"] + reply["credit"]) // self.price_per_call
+        self.deposited_usd += reply["amount"] / 1_000_000
+        return reply
+
+    async def _deposit(self, amount_usd: float) -> dict:
+        # Signing is CPU-bound; keep it off the loop
+        payment = await asyncio.to_thread(self.sign_payment, self.recipient, amount_usd, self.url)
+        return await self._call({"type": "deposit", "payment": payment})
+
+    async def _reserve(self):
+        """Take one prepaid call, topping the deposit up when running low."""
+        while True:
+            if self.calls_left <= self.low_water_calls and (self._top_up is None or self._top_up.done()):
+                self._top_up = asyncio.create_task(self.deposit())
+            if self.calls_left > 0:
+                self.calls_left -= 1
+                return
+            await asyncio.shield(self._top_up)
+
+    async def request(self, frame: dict) -> dict:
+        """Send one paid request frame and wait for its result frame."""
+        await self._reserve()
+        try:
+            future = await self._send(frame)
+        except BaseException:
+            self.calls_left += 1  # cancelled or failed before reaching the proxy
+            raise
+        try:
+            return await future
+        except Exception:
+            # Error frames are not charged, and the proxy refunds calls cut off by a
+            # disconnect. A call cancelled after it was sent is still served and paid.
+            self.calls_left += 1
+            raise
+
+    # -- calls --
+
+    async def infer(self, prompt: str, system: Optional[str] = None, model: Optional[str] = None,
+                    max_tokens: int = 500) -> dict:
+        """Like POST /inference: {"response", "model", "tokens_used", ...}"""
+        frame = {"type": "inference", "prompt": prompt, "max_tokens": max_tokens}
+        if system:
+            frame["system"] = system
+        if model:
+            frame["model"] = model
+        return await self.request(frame)
+
+    async def estimate(self, question: str, price: Optional[float] = None,
+                       model: Optional[str] = None) -> dict:
+        """Like POST /estimate: {"probability", "confidence"}"""
+        frame = {"type": "estimate", "question": question, "price": price}
+        if model:
+            frame["model"] = model
+        result = await self.request(frame)
+        return {"probability": result["probability"], "confidence": result["confidence"]}
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Inference Endpoint Router for FRED
+
+Resolves an agent's x402 inference proxies from its ERC-8004 registration
+file and sends each paid request to the fastest healthy one.
+
+  - Registration files are fetched through RegistrationCache, which keeps
+    each URL's ETag / Last-Modified and revalidates with a conditional GET
+    (a 304 reuses the cached body). Cache-Control max-age is honoured, and
+    a stale copy is used if the host is down.
+  - Every proxy keeps an EWMA latency and deviation. Its read timeout is
+    latency + 4 * deviation, clamped to [MIN_TIMEOUT, MAX_TIMEOUT], so a
+    stalled proxy is dropped within seconds instead of after a fixed 30s.
+  - A circuit breaker per proxy opens after BREAKER_FAILURES consecutive
+    failures (transport errors, timeouts, 429, 5xx). After a cooldown one
+    trial request is let through; it closes the breaker or re-opens it with
+    a doubled cooldown.
+
+Usage:
+    router = agent.inference_router()        # registration from the agent's tokenURI
+    result = router.request({"prompt": "..."})
+
+    router = InferenceRouter.from_registration("https://.../registration.json", sign_payment)
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import threading
+import urllib.parse
+import contextlib
+from typing import Callable, Optional
+
+import httpx
+
+from fred_x402_8004 import PAYMENT_HEADER, parse_payment_required
+
+# ============ CONFIG ============
+
+CONNECT_TIMEOUT = float(os.getenv("X402_CONNECT_TIMEOUT", "2"))
+MIN_TIMEOUT = float(os.getenv("X402_MIN_TIMEOUT", "2"))
+MAX_TIMEOUT = float(os.getenv("X402_MAX_TIMEOUT", "15"))
+
+# Consecutive failures that open a breaker, and how long it stays open
+BREAKER_FAILURES = 3
+BREAKER_COOLDOWN = 10.0
+MAX_BREAKER_COOLDOWN = 300.0
+
+# Weight of the newest sample in the latency / deviation EWMAs
+EWMA_ALPHA = 0.3
+
+# Ranking guess for proxies that have not answered yet, so they get tried
+UNKNOWN_LATENCY = 1.0
+
+IPFS_GATEWAY = os.getenv("IPFS_GATEWAY", "https://ipfs.io/ipfs/")
+REGISTRATION_CACHE_FILE = os.getenv("FRED_REGISTRATION_CACHE")
+
+
+class ProxyError(Exception):
+    """A proxy failed in a way that counts against its health."""
+
+
+class NoHealthyEndpoint(Exception):
+    """Every inference endpoint failed or has an open breaker."""
+
+
+# ============ REGISTRATION ============
+
+def inference_endpoints(registration: dict, name: str = "inference") -> list[str]:
+    """
+    Inference URLs advertised by a registration file.
+
+    Accepts the {"inference": url or [urls]} form of fred-registration.json
+    and the ERC-8004 list form [{"name": "inference", "endpoint": url}].
+    """
+    endpoints = registration.get("endpoints") or {}
+    if isinstance(endpoints, dict):
+        value = endpoints.get(name) or []
+        urls = [value] if isinstance(value, str) else list(value)
+    else:
+        urls = [e.get("endpoint") for e in endpoints
+                if isinstance(e, dict) and e.get("name", "").lower() == name]
+    seen = []
+    for url in urls:
+        if url and url not in seen:
+            seen.append(url)
+    return seen
+
+
+def _max_age(cache_control: str) -> float:
+    if re.search(r"no-cache|no-store", cache_control):
+        return 0.0
+    match = re.search(r"max-age=(\d+)", cache_control)
+    return float(match.group(1)) if match else 0.0
+
+
+class RegistrationCache:
+    """
+    ETag-aware HTTP cache for registration files.
+
+    Entries ({url: etag, last_modified, expires, body}) are kept in memory
+    and, with a `path`, in a JSON file so validators survive restarts.
+    """
+
+    def __init__(self, path: Optional[str] = REGISTRATION_CACHE_FILE, client: Optional[httpx.Client] = None):
+        self.path = path
+        self.client = client or httpx.Client(timeout=10, follow_redirects=True)
+        self.entries: dict[str, dict] = {}
+        self.hits = 0          # served from cache without a request
+        self.revalidated = 0   # 304 Not Modified
+        self.fetched = 0       # full 200 responses
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def resolve(uri: str) -> str:
+        """HTTP URL for a tokenURI (ipfs:// goes through IPFS_GATEWAY)."""
+        if uri.startswith("ipfs://"):
+            return IPFS_GATEWAY + uri[len("ipfs://"):].removeprefix("ipfs/")
+        return uri
+
+    def get(self, uri: str) -> dict:
+        """The JSON document at `uri`, revalidated only when stale."""
+        if uri.startswith("data:"):
+            meta, _, data = uri[5:].partition(",")
+            raw = base64.b64decode(data) if meta.endswith(";base64") else urllib.parse.unquote(data)
+            return json.loads(raw)
+
+        url = self.resolve(uri)
+        with self._lock:
+            entry = self.entries.get(url)
+            if entry and time.time() < entry["expires"]:
+                self.hits += 1
+                return entry["body"]
+
+            headers = {}
+            if entry and entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry and entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            try:
+                response = self.client.get(url, headers=headers)
+                if response.status_code != 304:
+                    response.raise_for_status()
+            except httpx.HTTPError:
+                if entry:
+                    print(f"⚠️  Using stale registration for {url}")
+                    return entry["body"]
+                raise
+
+            expires = time.time() + _max_age(response.headers.get("Cache-Control", ""))
+            if response.status_code == 304 and entry:
+                self.revalidated += 1
+                entry["expires"] = expires
+            else:
+                self.fetched += 1
+                entry = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "expires": expires,
+                    "body": response.json(),
+                }
+                self.entries[url] = entry
+            self._save()
+            return entry["body"]
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "hits": self.hits,
+                "revalidated": self.revalidated, "fetched": self.fetched}
+
+
+# ============ ENDPOINT HEALTH ============
+
+class ProxyEndpoint:
+    """One inference proxy: latency statistics and a circuit breaker."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = None   # EWMA seconds of paid calls, None until first success
+        self.deviation = 0.0  # EWMA absolute deviation from `latency`
+        self.failures = 0     # consecutive
+        self.opened_at = None
+        self.cooldown = BREAKER_COOLDOWN
+        self.trial = False    # half-open request in flight
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def state(self, now: Optional[float] = None) -> str:
+        if self.opened_at is None:
+            return "closed"
+        now = time.monotonic() if now is None else now
+        return "half_open" if now >= self.opened_at + self.cooldown else "open"
+
+    def acquire(self, now: Optional[float] = None) -> bool:
+        """May a request go here now? A half-open breaker admits one trial."""
+        with self._lock:
+            state = self.state(now)
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def release(self):
+        """The request ended without telling us anything about health."""
+        with self._lock:
+            self.trial = False
+
+    def timeout(self) -> float:
+        if self.latency is None:
+            return MAX_TIMEOUT
+        return min(max(self.latency + 4 * self.deviation, MIN_TIMEOUT), MAX_TIMEOUT)
+
+    def expected_latency(self) -> float:
+        latency = self.latency if self.latency is not None else UNKNOWN_LATENCY
+        return latency * (1 + self.failures)
+
+    def record_success(self, elapsed: float):
+        with self._lock:
+            self.requests += 1
+            self.failures = 0
+            self.opened_at = None
+            self.cooldown = BREAKER_COOLDOWN
+            self.trial = False
+            if self.latency is None:
+                self.latency = elapsed
+                self.deviation = elapsed / 2
+            else:
+                self.deviation = EWMA_ALPHA * abs(elapsed - self.latency) + (1 - EWMA_ALPHA) * self.deviation
+                self.latency = EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.latency
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.failures += 1
+            if self.trial:
+                # The trial failed: back off harder
+                self.cooldown = min(self.cooldown * 2, MAX_BREAKER_COOLDOWN)
+            if self.trial or self.failures >= BREAKER_FAILURES:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "state": self.state(),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "timeout_s": round(self.timeout(), 2),
+            "requests": self.requests,
+            "errors": self.errors,
+            "failures": self.failures,
+        }
+
+
+# ============ ROUTER ============
+
+class InferenceRouter:
+    """
+    Paid x402 inference over several proxies, fastest healthy one first.
+
+    `sign_payment(recipient, amount_usd, resource) -> dict` is normally
+    FREDAgent.create_x402_payment. Requests fail over to the next proxy on
+    errors that count against health; other errors (a price above
+    max_price_usd, a rejected payment, a bad request) are raised as is.
+    A timed-out paid request may still have been served, so failover can
+    cost one extra call in that case. With a SpendGovernor, each request
+    takes one of its slots and every payment is reserved from its budget.
+    """
+
+    def __init__(self, urls: list[str], sign_payment: Callable[[str, float, str], dict],
+                 client: Optional[httpx.Client] = None, governor=None):
+        if not urls:
+            raise ValueError("InferenceRouter needs at least one endpoint")
+        self.endpoints = [ProxyEndpoint(url) for url in urls]
+        self.sign_payment = sign_payment
+        self.client = client or httpx.Client()
+        self.governor = governor
+
+    @classmethod
+    def from_registration(cls, uri: str, sign_payment: Callable[[str, float, str], dict],
+                          cache: Optional[RegistrationCache] = None, **kwargs) -> "InferenceRouter":
+        registration = (cache or RegistrationCache()).get(uri)
+        return cls(inference_endpoints(registration), sign_payment, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+    def ranked(self) -> list[ProxyEndpoint]:
+        """Endpoints by expected latency (penalised per recent failure); open breakers are left out."""
+        now = time.monotonic()
+        usable = [e for e in self.endpoints if e.state(now) != "open"]
+        return sorted(usable, key=lambda e: (e.expected_latency(), e.errors))
+
+    def stats(self) -> list[dict]:
+        return [e.stats() for e in self.endpoints]
+
+    def _post(self, endpoint: ProxyEndpoint, body: dict, headers: Optional[dict] = None,
+              call=None) -> httpx.Response:
+        timeout = httpx.Timeout(endpoint.timeout(), connect=CONNECT_TIMEOUT)
+        start = time.monotonic()
+        try:
+            response = self.client.post(endpoint.url, json=body, headers=headers, timeout=timeout)
+        except httpx.TransportError as e:
+            if call is not None:
+                call.observe(None)
+            raise ProxyError(f"{type(e).__name__}: {e}") from None
+        if call is not None and (headers or response.status_code != 402):
+            call.observe(response.status_code, time.monotonic() - start)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise ProxyError(f"HTTP {response.status_code}")
+        return response
+
+    def _paid(self, endpoint: ProxyEndpoint, body: dict, max_price_usd: float, call=None) -> dict:
+        start = time.monotonic()
+        response = self._post(endpoint, body, call=call)
+        if response.status_code == 402:
+            price, recipient = parse_payment_required(response.json())
+            if price > max_price_usd:
+                raise ValueError(f"Price ${price} exceeds max ${max_price_usd}")
+            if call is not None:
+                call.pay_sync(price)
+            payment = self.sign_payment(recipient, price, endpoint.url)
+            start = time.monotonic()
+            response = self._post(endpoint, body, {PAYMENT_HEADER: json.dumps(payment)}, call=call)
+        if response.status_code != 200:
+            raise RuntimeError(f"Inference failed at {endpoint.url}: {response.status_code}")
+        endpoint.record_success(time.monotonic() - start)
+        return response.json()
+
+    def request(self, body: dict, max_price_usd: float = 0.01) -> dict:
+        """POST `body` to the best proxy, paying via x402; returns its JSON reply."""
+        errors = []
+        with self.governor.slot_sync() if self.governor else contextlib.nullcontext() as call:
+            for endpoint in self.ranked():
+                if not endpoint.acquire():
+                    continue
+                try:
+                    return self._paid(endpoint, body, max_price_usd, call)
+                except ProxyError as e:
+                    endpoint.record_failure()
+                    errors.append(f"{endpoint.url}: {e}")
+                except Exception:
+                    endpoint.release()
+                    raise
+        raise NoHealthyEndpoint("; ".join(errors) or "All inference endpoints have open breakers")
@@ -16,9 +16,10 @@ MOCK_MODE = os.getenv("X402_MOCK_MODE", "false").lower() == "true"
 
 class MockMarket:
     """Mock market for demo purposes."""
-    def __init__(self):
-        self.question = "Will Bitcoin exceed $100,000 by March 2026?"
-        self.outcomes = [type('Outcome', (), {'name': 'Yes', 'price': 0.55})()]
+    def __init__(self, question="Will Bitcoin exceed $100,000 by March 2026?", price=0.55, id=None):
+        self.id = id or question
+        self.question = question
+        self.outcomes = [type('Outcome', (), {'name': 'Yes', 'price': price})()]
 
 
 async def demo_x402_flow():
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Self-Funding Loop Simulator for FRED
+
+Monte Carlo version of the break-even arithmetic in
+tests/test_fred_x402.py::TestSelfFundingLoop. Every simulated path is a
+wallet that, each day:
+
+  + earns LP fees on $FRED volume        (volume ~ lognormal, 0.8% fee)
+  + wins or loses on its trades          (hit rate ~ beta per path,
+                                          stake = capped Kelly on edge)
+  - pays for inference                   (calls ~ Poisson, PRICE_PER_CALL)
+  - pays gas for claims / unwraps        (gas ~ lognormal)
+
+Paths are NumPy arrays and days are vector steps, so 10,000 paths x 365
+days (3.65M trading days) run in about a second. A path that hits zero is
+insolvent from then on.
+
+Usage:
+    python loop_simulator.py --paths 10000 --days 365
+    python loop_simulator.py --price-sweep 0.001,0.005,0.01,0.02
+"""
+
+import argparse
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from sizing import kelly_fraction
+
+
+class LoopParams(NamedTuple):
+    """Distribution parameters for one simulated wallet-day."""
+    start_balance_usd: float = 50.0
+    # $FRED LP fee revenue
+    volume_median_usd: float = 100.0
+    volume_sigma: float = 1.0             # lognormal shape
+    lp_fee_rate: float = 0.008
+    # Trading
+    trades_per_day: float = 3.0
+    hit_rate_mean: float = 0.51           # true skill, drawn once per path
+    hit_rate_strength: float = 200.0      # beta concentration (higher = surer)
+    edge_mean: float = 0.05               # estimated edge driving stake size
+    edge_sd: float = 0.03
+    max_position_pct: float = 0.05
+    max_stake_usd: float = 25.0           # market depth limits stake size
+    # Costs
+    inferences_per_trade: float = 10.0
+    price_per_call_usd: float = 0.005
+    gas_median_usd: float = 0.02
+    gas_sigma: float = 0.5
+
+
+class SimulationResult:
+    """Final balances and insolvency days for every path."""
+
+    def __init__(self, params: LoopParams, balances: np.ndarray, insolvent_day: np.ndarray, days: int):
+        self.params = params
+        self.balances = balances
+        self.insolvent_day = insolvent_day  # -1 = survived
+        self.days = days
+
+    @property
+    def paths(self) -> int:
+        return self.balances.size
+
+    @property
+    def insolvency_rate(self) -> float:
+        return float((self.insolvent_day >= 0).mean())
+
+    def report(self) -> dict:
+        pct = [5, 25, 50, 75, 95]
+        broke = self.insolvent_day[self.insolvent_day >= 0]
+        return {
+            "paths": self.paths,
+            "days": self.days,
+            "price_per_call_usd": self.params.price_per_call_usd,
+            "balance_pct": dict(zip(pct, np.percentile(self.balances, pct).round(2).tolist())),
+            "balance_mean": round(float(self.balances.mean()), 2),
+            "insolvency_rate": round(self.insolvency_rate, 4),
+            "insolvency_day_pct": (
+                dict(zip(pct, np.percentile(broke, pct).round(1).tolist())) if broke.size else None
+            ),
+        }
+
+
+def simulate(
+    params: LoopParams = LoopParams(),
+    paths: int = 10_000,
+    days: int = 365,
+    seed: Optional[int] = 0,
+) -> SimulationResult:
+    """Run `paths` wallets for `days` days. Same seed = same random draws."""
+    rng = np.random.default_rng(seed)
+    p = params
+
+    balance = np.full(paths, p.start_balance_usd, dtype=float)
+    insolvent_day = np.full(paths, -1, dtype=np.int64)
+    alive = np.ones(paths, dtype=bool)
+
+    a = p.hit_rate_mean * p.hit_rate_strength
+    hit_rate = rng.beta(a, p.hit_rate_strength - a, paths)
+
+    for day in range(days):
+        volume = rng.lognormal(np.log(p.volume_median_usd), p.volume_sigma, paths)
+        trades = rng.poisson(p.trades_per_day, paths)
+        edge = np.clip(rng.normal(p.edge_mean, p.edge_sd, paths), 0.0, None)
+        calls = rng.poisson(trades * p.inferences_per_trade)
+        gas = rng.lognormal(np.log(p.gas_median_usd), p.gas_sigma, paths)
+
+        # Even-odds trades (price 0.5): stake = capped Kelly on the estimated edge
+        stake = np.minimum(kelly_fraction(0.5 + edge, 0.5), p.max_position_pct) * np.maximum(balance, 0)
+        stake = np.minimum(stake, p.max_stake_usd)
+        wins = rng.binomial(trades, hit_rate)
+        pnl = stake * (2 * wins - trades)
+
+        net = volume * p.lp_fee_rate + pnl - calls * p.price_per_call_usd - gas
+        balance = np.where(alive, balance + net, balance)
+
+        broke = alive & (balance <= 0)
+        insolvent_day[broke] = day
+        balance[broke] = 0.0
+        alive &= ~broke
+
+    return SimulationResult(params, balance, insolvent_day, days)
+
+
+def price_sweep(prices, params: LoopParams = LoopParams(), **kwargs) -> list[dict]:
+    """Evaluate several PRICE_PER_CALL values on the same random draws."""
+    return [simulate(params._replace(price_per_call_usd=price), **kwargs).report() for price in prices]
+
+
+def print_report(report: dict):
+    b = report["balance_pct"]
+    print(f"💰 ${report['price_per_call_usd']:.4f}/call, {report['paths']:,} paths x {report['days']} days")
+    print(f"   balance p5/p50/p95: ${b[5]:,.2f} / ${b[50]:,.2f} / ${b[95]:,.2f} (mean ${report['balance_mean']:,.2f})")
+    print(f"   insolvent: {report['insolvency_rate']:.2%}", end="")
+    if report["insolvency_day_pct"]:
+        d = report["insolvency_day_pct"]
+        print(f"  (day p5/p50/p95: {d[5]:.0f} / {d[50]:.0f} / {d[95]:.0f})")
+    else:
+        print()
+
+
+if __name__ == "__main__":
+    import time
+
+    parser = argparse.ArgumentParser(description="Monte Carlo the FRED self-funding loop")
+    parser.add_argument("--paths", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--price-sweep", help="comma-separated USD prices per inference call")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.price_sweep:
+        prices = [float(x) for x in args.price_sweep.split(",")]
+        reports = price_sweep(prices, paths=args.paths, days=args.days, seed=args.seed)
+    else:
+        reports = [simulate(paths=args.paths, days=args.days, seed=args.seed).report()]
+    elapsed = time.perf_counter() - start
+
+    for report in reports:
+        print_report(report)
+    simulated = args.paths * args.days * len(reports)
+    print(f"\n⏱  {simulated:,} wallet-days in {elapsed:.2f}s")
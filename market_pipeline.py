@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Market Scoring Pipeline for FRED
+
+Async version of the loop demoed in integration_test.py, run over every
+market in a scan instead of markets[0]:
+
+    fetch ──► estimate (x402 paid) ──► edge ──► order
+
+Stages are connected by bounded asyncio queues. Each stage has its own
+concurrency limit and an optional USD spend budget, so one scan can score
+hundreds of markets in parallel without over-paying for inference.
+
+Usage:
+    estimator = X402Estimator(url, agent.create_x402_payment)
+    pipeline = fred_pipeline(fetch_page, estimator, place_order)
+    result = await pipeline.run(range(pages))
+
+    python market_pipeline.py --markets 500   # offline, mock markets
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import inspect
+import logging
+import argparse
+from typing import Any, Callable, Optional
+
+import httpx
+
+from sizing import MIN_EDGE, MAX_POSITION_PCT, size_positions
+from estimate_store import EstimateStore, cached_estimator, market_id
+
+# The estimate prompt and reply parser are the proxy's (fred-integration/estimates.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fred-integration"))
+from estimates import ESTIMATE_PROMPT, estimate_prompt, parse_probability  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# ============ CONFIG ============
+
+PRICE_PER_CALL_USD = 0.005
+
+_DONE = object()
+
+
+# ============ ENGINE ============
+
+class NotCharged(RuntimeError):
+    """A paid call failed before its payment was sent, or the proxy refused it."""
+
+
+class StageStats:
+    """Counters for one stage of a run."""
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0       # fn returned None (filtered out)
+        self.errors = 0
+        self.over_budget = 0   # skipped because the budget ran out
+        self.spent_usd = 0.0
+        self.busy_s = 0.0
+
+    def as_dict(self) -> dict:
+        return {k: round(v, 6) if isinstance(v, float) else v for k, v in vars(self).items()}
+
+
+class Stage:
+    """
+    One pipeline step.
+
+    `fn` is an async callable taking an item and returning the next item,
+    or None to drop it. An async generator function fans out: every value
+    it yields goes downstream. `cost_usd` may be a callable(item) -> USD for
+    stages where only some items are paid for. A call that raises NotCharged
+    gets its budget back; any other error after the reservation counts as
+    spent, since the payment may have gone through.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable,
+        concurrency: int = 1,
+        queue_size: int = 100,
+        budget_usd: Optional[float] = None,
+        cost_usd: float | Callable[[Any], float] = 0.0,
+    ):
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.budget_usd = budget_usd
+        self.cost_usd = cost_usd
+
+
+class PipelineResult:
+    def __init__(self, outputs: list, stats: dict[str, StageStats], elapsed: float):
+        self.outputs = outputs
+        self.stats = stats
+        self.elapsed = elapsed
+
+    @property
+    def spent_usd(self) -> float:
+        return sum(s.spent_usd for s in self.stats.values())
+
+    def report(self) -> dict:
+        return {
+            "outputs": len(self.outputs),
+            "elapsed_s": round(self.elapsed, 3),
+            "spent_usd": round(self.spent_usd, 6),
+            "stages": {name: s.as_dict() for name, s in self.stats.items()},
+        }
+
+
+class Pipeline:
+    """Stages joined by bounded queues, each with its own worker pool."""
+
+    def __init__(self, stages: list[Stage]):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+
+    async def run(self, source) -> PipelineResult:
+        """Feed `source` (iterable or async iterable) through every stage."""
+        start = time.monotonic()
+        queues = [asyncio.Queue(maxsize=s.queue_size) for s in self.stages]
+        stats = {s.name: StageStats() for s in self.stages}
+        outputs = []
+
+        async def feed():
+            if hasattr(source, "__aiter__"):
+                async for item in source:
+                    await queues[0].put(item)
+            else:
+                for item in source:
+                    await queues[0].put(item)
+            await queues[0].put(_DONE)
+
+        async def emit(index: int, item: Any):
+            if index + 1 < len(self.stages):
+                await queues[index + 1].put(item)
+            else:
+                outputs.append(item)
+
+        async def worker(index: int, budget: dict):
+            stage, inbox, stat = self.stages[index], queues[index], stats[self.stages[index].name]
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    await inbox.put(_DONE)  # let sibling workers see it too
+                    return
+
+                cost = stage.cost_usd(item) if callable(stage.cost_usd) else stage.cost_usd
+                if stage.budget_usd is not None:
+                    if budget["reserved"] + cost > stage.budget_usd + 1e-12:
+                        stat.over_budget += 1
+                        continue
+                budget["reserved"] += cost
+
+                began = time.monotonic()
+                try:
+                    if inspect.isasyncgenfunction(stage.fn):
+                        async for out in stage.fn(item):
+                            await emit(index, out)
+                        result = True
+                    else:
+                        result = await stage.fn(item)
+                        if result is not None:
+                            await emit(index, result)
+                except NotCharged as e:
+                    budget["reserved"] -= cost
+                    stat.errors += 1
+                    logger.warning(f"{stage.name} failed: {e}")
+                    continue
+                except Exception as e:
+                    # e.g. a paid 200 whose reply did not parse: the payment stands
+                    stat.errors += 1
+                    stat.spent_usd += cost
+                    logger.warning(f"{stage.name} failed: {e}")
+                    continue
+                finally:
+                    stat.busy_s += time.monotonic() - began
+
+                stat.processed += 1
+                stat.spent_usd += cost
+                if result is None:
+                    stat.dropped += 1
+
+        async def run_stage(index: int):
+            budget = {"reserved": 0.0}
+            await asyncio.gather(*(worker(index, budget) for _ in range(self.stages[index].concurrency)))
+            if index + 1 < len(self.stages):
+                await queues[index + 1].put(_DONE)
+
+        await asyncio.gather(feed(), *(run_stage(i) for i in range(len(self.stages))))
+        return PipelineResult(outputs, stats, time.monotonic() - start)
+
+
+# ============ FRED STAGES ============
+
+def market_price(market) -> Optional[float]:
+    """YES price of a market object (scanner or MockMarket shape)."""
+    outcomes = getattr(market, "outcomes", None) or []
+    return float(outcomes[0].price) if outcomes else None
+
+
+class X402Estimator:
+    """
+    Async paid probability estimator against an x402 inference proxy.
+
+    `sign_payment(recipient, amount_usd, resource) -> dict` is normally
+    FREDAgent.create_x402_payment. With structured=True the endpoint is the
+    proxy's /estimate route, which returns typed fields instead of text;
+    otherwise `prompt` (a template with {question} and {price_line}) is
+    sent to /inference and the reply is parsed like /estimate does. `system` is a long fixed instruction prefix sent separately from the
+    per-market prompt so the provider can cache it. With a `governor`
+    (SpendGovernor, FREDAgent.governor) calls wait for a concurrency slot
+    and reserve their price from its spend budget before signing.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        sign_payment: Callable[[str, float, str], dict],
+        client: Optional[httpx.AsyncClient] = None,
+        max_price_usd: float = 0.01,
+        prompt: str = ESTIMATE_PROMPT,
+        structured: bool = False,
+        system: Optional[str] = None,
+        governor=None,
+    ):
+        self.endpoint = endpoint
+        self.sign_payment = sign_payment
+        self.client = client or httpx.AsyncClient(timeout=30)
+        self.max_price_usd = max_price_usd
+        self.prompt = prompt
+        self.structured = structured
+        self.system = system  # fixed instructions, prompt-cached by the proxy's provider
+        self.governor = governor
+
+    async def __call__(self, market) -> dict:
+        if self.governor is None:
+            return await self._estimate(market)
+        async with self.governor.slot() as call:
+            return await self._estimate(market, call)
+
+    async def _estimate(self, market, call=None) -> dict:
+        from fred_x402_8004 import PAYMENT_HEADER, parse_payment_required
+
+        if self.structured:
+            body = {"question": market.question, "price": market_price(market)}
+        else:
+            body = {"prompt": estimate_prompt(market.question, market_price(market), self.prompt)}
+            if self.system:
+                body["system"] = self.system
+        started = time.monotonic()
+        try:
+            response = await self.client.post(self.endpoint, json=body)
+        except httpx.TransportError as e:
+            if call is not None:
+                call.observe(None)
+            raise NotCharged(f"Proxy unreachable: {e!r}") from e
+
+        if response.status_code == 402:
+            price, recipient = parse_payment_required(response.json())
+            if price > self.max_price_usd:
+                raise NotCharged(f"Price ${price} exceeds max ${self.max_price_usd}")
+            if call is not None:
+                await call.pay(price)
+            # Signing is CPU-bound; keep it off the loop
+            payment = await asyncio.to_thread(self.sign_payment, recipient, price, self.endpoint)
+            started = time.monotonic()
+            response = await self.client.post(
+                self.endpoint, json=body, headers={PAYMENT_HEADER: json.dumps(payment)}
+            )
+
+        if call is not None:
+            call.observe(response.status_code, time.monotonic() - started)
+        if response.status_code != 200:
+            raise NotCharged(f"Inference failed: {response.status_code}")
+        if self.structured:
+            data = response.json()
+            return {"probability": data["probability"], "confidence": data["confidence"]}
+        return parse_probability(response.json()["response"])
+
+
+class ChannelEstimator:
+    """
+    Estimator over an open InferenceChannel (FREDAgent.open_inference_channel):
+    one deposit and one connection for the whole scan instead of a signed
+    payment and an HTTP round trip per market.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def __call__(self, market) -> dict:
+        from inference_channel import ChannelError
+
+        try:
+            return await self.channel.estimate(market.question, market_price(market))
+        except ChannelError as e:
+            raise NotCharged(str(e)) from e  # the proxy credits a failed call back to the deposit
+
+
+def fred_pipeline(
+    fetch_page: Callable,
+    estimate: Callable,
+    place_order: Callable,
+    bankroll_usd: float = 100.0,
+    min_edge: float = MIN_EDGE,
+    max_position_pct: float = MAX_POSITION_PCT,
+    fetch_concurrency: int = 4,
+    estimate_concurrency: int = 32,
+    order_concurrency: int = 4,
+    estimate_budget_usd: Optional[float] = 1.0,
+    price_per_call_usd: float = PRICE_PER_CALL_USD,
+    store: Optional[EstimateStore] = None,
+) -> Pipeline:
+    """
+    FRED's scan loop as a pipeline.
+
+    fetch_page(page) -> iterable of markets (awaitable)
+    estimate(market) -> {"probability", "confidence"} (awaitable, paid)
+    place_order(decision) -> order result (awaitable)
+
+    With a `store`, markets whose price has not moved reuse their last
+    estimate and are neither paid for nor counted against the budget.
+    """
+    estimate_cost = price_per_call_usd
+    if store is not None:
+        estimate = cached_estimator(store, estimate, market_price)
+
+        def estimate_cost(market):
+            fresh = store.is_fresh(market_id(market), market_price(market))
+            return 0.0 if fresh else price_per_call_usd
+
+    async def fetch(page):
+        for market in await fetch_page(page):
+            if market_price(market) is not None:
+                yield market
+
+    async def score(market):
+        estimate_ = await estimate(market)
+        return {"market": market, "price": market_price(market), **estimate_}
+
+    async def edge(scored):
+        # Per-market path; scan-wide exposure caps need sizing over the whole batch
+        s = size_positions(
+            scored["probability"], scored["price"], scored["confidence"],
+            bankroll_usd=bankroll_usd, min_edge=min_edge,
+            max_position_pct=max_position_pct, max_total_pct=None,
+        )
+        if not s.trade:
+            return None
+        return dict(scored, edge=float(s.edge), side="YES" if s.side > 0 else "NO",
+                    size_usd=round(float(s.size_usd), 2))
+
+    async def order(decision):
+        decision["order"] = await place_order(decision)
+        return decision
+
+    return Pipeline([
+        Stage("fetch", fetch, concurrency=fetch_concurrency),
+        Stage("estimate", score, concurrency=estimate_concurrency,
+              budget_usd=estimate_budget_usd, cost_usd=estimate_cost),
+        Stage("edge", edge, concurrency=1),
+        Stage("order", order, concurrency=order_concurrency),
+    ])
+
+
+# ============ OFFLINE DEMO ============
+
+async def _demo(n_markets: int, page_size: int, budget: float):
+    from integration_test import MockMarket
+
+    rng = random.Random(42)
+    markets = [MockMarket(f"Mock market #{i}?", round(rng.uniform(0.05, 0.95), 2), id=str(i))
+               for i in range(n_markets)]
+
+    async def fetch_page(page):
+        await asyncio.sleep(0.05)
+        return markets[page * page_size:(page + 1) * page_size]
+
+    async def mock_estimate(market):
+        await asyncio.sleep(0.2)  # proxy + LLM latency
+        return {"probability": min(max(market_price(market) + rng.gauss(0, 0.1), 0.01), 0.99),
+                "confidence": 0.75}
+
+    async def paper_order(decision):
+        return {"status": "paper", "side": decision["side"], "size_usd": decision["size_usd"]}
+
+    pipeline = fred_pipeline(fetch_page, mock_estimate, paper_order, estimate_budget_usd=budget)
+    pages = range((n_markets + page_size - 1) // page_size)
+    result = await pipeline.run(pages)
+
+    print(f"📊 Scored {n_markets} markets in {result.elapsed:.2f}s, "
+          f"spent ${result.spent_usd:.3f} on inference")
+    print(f"📈 {len(result.outputs)} trades")
+    for name, stat in result.stats.items():
+        print(f"   {name:9} {stat.as_dict()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the FRED scoring pipeline on mock markets")
+    parser.add_argument("--markets", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--budget", type=float, default=1.0, help="USD inference budget")
+    args = parser.parse_args()
+    asyncio.run(_demo(args.markets, args.page_size, args.budget))
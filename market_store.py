@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Columnar Market Store for FRED
+
+Struct-of-arrays for the markets, outcome prices and cached estimates of
+a scan. Holding 100k markets as MockMarket-style objects costs one
+instance per market and per outcome; here the numeric state lives in a
+few contiguous NumPy columns:
+
+  - price, probability, confidence, estimate_price, estimated_at:
+    float64 per market, NaN when unknown
+  - outcome prices and names: flat arrays; market i owns outcomes
+    outcome_offsets[i]:outcome_offsets[i + 1]
+
+Lookup by market id is a dict of row numbers. store[row] and
+store.get(id) return __slots__ views shaped like a scanner market (id,
+question, outcomes[k].name / .price), so estimators take them unchanged.
+columns(start, stop) returns NumPy views, not copies, so scoring
+(stale_mask) and sizing (size) read a slice of the scan in place.
+Column views stay valid until the store grows past its capacity.
+
+Usage:
+    store = MarketStore.from_markets(markets)
+    await refresh_estimates(store, estimator)
+    s = store.size(bankroll_usd=500)
+    [store[row] for row in np.flatnonzero(s.trade)]
+"""
+
+import time
+import asyncio
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from sizing import Sizing, size_positions
+from estimate_store import REESTIMATE_MAX_AGE, REESTIMATE_PRICE_MOVE, EstimateStore, market_id
+
+# ============ CONFIG ============
+
+INITIAL_CAPACITY = 1024
+
+
+class Columns(NamedTuple):
+    """Per-market column views over a row range."""
+    price: np.ndarray           # YES (first outcome) price
+    probability: np.ndarray
+    confidence: np.ndarray
+    estimate_price: np.ndarray  # price when the estimate was paid for
+    estimated_at: np.ndarray
+
+
+# ============ VIEWS ============
+
+class OutcomeView:
+    """One outcome of a stored market."""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "MarketStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def name(self) -> str:
+        return self.store.outcome_names[self.index]
+
+    @property
+    def price(self) -> float:
+        return float(self.store._outcome_price[self.index])
+
+
+class MarketView:
+    """One stored market, read through to the columns."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "MarketStore", row: int):
+        self.store = store
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.store.ids[self.row]
+
+    @property
+    def question(self) -> str:
+        return self.store.questions[self.row]
+
+    @property
+    def outcomes(self) -> list[OutcomeView]:
+        start, stop = self.store._offsets[self.row], self.store._offsets[self.row + 1]
+        return [OutcomeView(self.store, i) for i in range(start, stop)]
+
+    @property
+    def price(self) -> Optional[float]:
+        price = float(self.store._columns["price"][self.row])
+        return None if np.isnan(price) else price
+
+    @property
+    def estimate(self) -> Optional[dict]:
+        probability = float(self.store._columns["probability"][self.row])
+        if np.isnan(probability):
+            return None
+        return {"probability": probability, "confidence": float(self.store._columns["confidence"][self.row])}
+
+    def __repr__(self) -> str:
+        return f"MarketView({self.id!r}, price={self.price})"
+
+
+# ============ STORE ============
+
+class MarketStore:
+    """Markets, outcome prices and estimates as columns, indexed by market id."""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY, outcome_capacity: Optional[int] = None):
+        capacity = max(capacity, 1)
+        self.ids: list[str] = []
+        self.questions: list[str] = []
+        self.outcome_names: list[str] = []
+        self._index: dict[str, int] = {}
+        self._columns = {name: np.full(capacity, np.nan) for name in Columns._fields}
+        self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._outcome_price = np.empty(max(outcome_capacity or 2 * capacity, 1))
+        self._outcomes = 0
+
+    @classmethod
+    def from_markets(cls, markets: Iterable) -> "MarketStore":
+        """Build from scanner-shaped objects (id, question, outcomes[].name/.price)."""
+        markets = list(markets)
+        store = cls(len(markets), sum(len(getattr(m, "outcomes", None) or []) for m in markets))
+        for market in markets:
+            store.add_market(market)
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, row: int) -> MarketView:
+        if not -len(self) <= row < len(self):
+            raise IndexError(row)
+        return MarketView(self, row % len(self))
+
+    def __iter__(self):
+        return (MarketView(self, row) for row in range(len(self)))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the numeric columns (capacity included)."""
+        return (sum(c.nbytes for c in self._columns.values())
+                + self._offsets.nbytes + self._outcome_price.nbytes)
+
+    # -- rows --
+
+    def row(self, key: str) -> int:
+        return self._index[key]
+
+    def get(self, key: str) -> Optional[MarketView]:
+        row = self._index.get(key)
+        return None if row is None else MarketView(self, row)
+
+    def rows(self, keys: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._index[k] for k in keys), dtype=np.int64)
+
+    def _reserve(self, markets: int, outcomes: int):
+        n, capacity = len(self) + markets, len(self._columns["price"])
+        if n > capacity:
+            capacity = max(n, 2 * capacity)
+            for name, column in self._columns.items():
+                grown = np.full(capacity, np.nan)
+                grown[:len(self)] = column[:len(self)]
+                self._columns[name] = grown
+            offsets = np.zeros(capacity + 1, dtype=np.int64)
+            offsets[:len(self) + 1] = self._offsets[:len(self) + 1]
+            self._offsets = offsets
+        if self._outcomes + outcomes > len(self._outcome_price):
+            grown = np.empty(max(self._outcomes + outcomes, 2 * len(self._outcome_price)))
+            grown[:self._outcomes] = self._outcome_price[:self._outcomes]
+            self._outcome_price = grown
+
+    def add(self, key: str, question: str, names: list[str], prices: list[float]) -> int:
+        """
+        Add a market, or refresh its outcome prices if the id is known.
+        Returns its row.
+        """
+        if len(names) != len(prices):
+            raise ValueError("names and prices differ in length")
+        row = self._index.get(key)
+        if row is not None:
+            start, stop = self._offsets[row], self._offsets[row + 1]
+            if stop - start != len(prices):
+                raise ValueError(f"market {key!r} changed outcome count")
+            self._outcome_price[start:stop] = prices
+            self._columns["price"][row] = prices[0] if prices else np.nan
+            return row
+
+        self._reserve(1, len(prices))
+        row = len(self)
+        start = self._outcomes
+        self._outcome_price[start:start + len(prices)] = prices
+        self._outcomes += len(prices)
+        self._offsets[row + 1] = self._outcomes
+        self._columns["price"][row] = prices[0] if prices else np.nan
+        self.outcome_names.extend(names)
+        self.ids.append(key)
+        self.questions.append(question)
+        self._index[key] = row
+        return row
+
+    def add_market(self, market) -> int:
+        outcomes = getattr(market, "outcomes", None) or []
+        return self.add(market_id(market), market.question,
+                        [str(o.name) for o in outcomes], [float(o.price) for o in outcomes])
+
+    def update_prices(self, keys: Iterable[str], prices) -> np.ndarray:
+        """
+        Set YES prices for many known markets at once; returns their rows.
+        Markets without outcomes have no YES price and are left unpriced.
+        """
+        rows = self.rows(keys)
+        prices = np.broadcast_to(np.asarray(prices, dtype=float), rows.shape)
+        # A zero-outcome row's offset is the next market's first outcome
+        priced = self._offsets[rows] < self._offsets[rows + 1]
+        rows_, prices_ = rows[priced], prices[priced]
+        self._columns["price"][rows_] = prices_
+        self._outcome_price[self._offsets[rows_]] = prices_
+        return rows
+
+    # -- columns --
+
+    def columns(self, start: int = 0, stop: Optional[int] = None) -> Columns:
+        """Views (no copy) of rows [start, stop)."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        return Columns(*(self._columns[name][start:stop] for name in Columns._fields))
+
+    def outcome_prices(self, row: int) -> np.ndarray:
+        return self._outcome_price[self._offsets[row]:self._offsets[row + 1]]
+
+    def stale_mask(self, now: Optional[float] = None, price_move: float = REESTIMATE_PRICE_MOVE,
+                   max_age: float = REESTIMATE_MAX_AGE, start: int = 0,
+                   stop: Optional[int] = None) -> np.ndarray:
+        """
+        Rows in [start, stop) that need a paid estimate: priced markets with
+        no estimate, a price move >= price_move, or an estimate >= max_age old.
+        Same rules as EstimateStore.is_fresh.
+        """
+        c = self.columns(start, stop)
+        now = time.time() if now is None else now
+        with np.errstate(invalid="ignore"):
+            stale = (np.isnan(c.estimated_at)
+                     | (np.abs(c.price - c.estimate_price) >= price_move)
+                     | (now - c.estimated_at >= max_age))
+        return stale & ~np.isnan(c.price)
+
+    def record_estimates(self, rows, probability, confidence=1.0, now: Optional[float] = None):
+        """Store paid estimates for `rows`, stamped with their current price."""
+        rows = np.asarray(rows, dtype=np.int64)
+        self._columns["probability"][rows] = probability
+        self._columns["confidence"][rows] = confidence
+        self._columns["estimate_price"][rows] = self._columns["price"][rows]
+        self._columns["estimated_at"][rows] = time.time() if now is None else now
+
+    def size(self, start: int = 0, stop: Optional[int] = None, **kwargs) -> Sizing:
+        """
+        size_positions() over rows [start, stop). Markets without an
+        estimate have NaN probability and never trade. kwargs go to
+        size_positions (bankroll_usd, min_edge, max_total_pct, ...).
+        """
+        c = self.columns(start, stop)
+        with np.errstate(invalid="ignore"):
+            return size_positions(c.probability, c.price, c.confidence, **kwargs)
+
+    # -- EstimateStore interop --
+
+    def load_estimates(self, estimates: EstimateStore) -> int:
+        """Copy cached estimates for known markets in; returns how many."""
+        loaded = 0
+        for key, row in self._index.items():
+            e = estimates.get(key)
+            if e is not None:
+                for name, value in (("probability", e.probability), ("confidence", e.confidence),
+                                    ("estimate_price", e.price), ("estimated_at", e.estimated_at)):
+                    self._columns[name][row] = value
+                loaded += 1
+        return loaded
+
+    def save_estimates(self, estimates: EstimateStore) -> int:
+        """Write every estimated market back to an EstimateStore; returns how many."""
+        c = self.columns()
+        rows = np.flatnonzero(~np.isnan(c.estimated_at))
+        for row in rows:
+            estimates.put(self.ids[row], float(c.probability[row]), float(c.confidence[row]),
+                          float(c.estimate_price[row]), now=float(c.estimated_at[row]))
+        return len(rows)
+
+
+async def refresh_estimates(store: MarketStore, estimate: Callable, concurrency: int = 32,
+                            now: Optional[float] = None, **staleness) -> dict:
+    """
+    Pay for estimates of stale rows only, writing results into the columns.
+
+    `estimate(market) -> {"probability", "confidence"}` is any pipeline
+    estimator (X402Estimator, ChannelEstimator). staleness kwargs go to
+    stale_mask. Failed rows keep their previous estimate.
+    """
+    rows = np.flatnonzero(store.stale_mask(now, **staleness))
+    limit = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def one(row: int):
+        nonlocal failed
+        async with limit:
+            try:
+                result = await estimate(store[row])
+            except Exception:
+                failed += 1
+                return
+        store.record_estimates([row], result["probability"], result.get("confidence", 1.0))
+
+    await asyncio.gather(*(one(int(row)) for row in rows))
+    return {"stale": len(rows), "estimated": len(rows) - failed, "failed": failed}
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+RPC Endpoint Pool for FRED
+
+Multi-endpoint JSON-RPC provider for Base with health scoring,
+automatic failover and hedged reads.
+
+  - Every endpoint keeps an EWMA latency and a failure streak; requests go
+    to the best-scoring endpoint, failing ones sit out a cooldown.
+  - Read-only calls are hedged: if the primary has not answered within
+    RPC_HEDGE_DELAY_MS, a duplicate goes to the next endpoint and the first
+    answer wins.
+  - Writes (eth_sendRawTransaction) are never duplicated up front; they fail
+    over to the next endpoint only on transport errors.
+
+Usage:
+    export BASE_RPC_URLS="https://mainnet.base.org,https://base.llamarpc.com"
+
+    from rpc_pool import make_web3
+    w3 = make_web3()
+"""
+
+import os
+import time
+import math
+import threading
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING, Any, Optional
+
+import httpx
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+# ============ CONFIG ============
+
+BASE_RPC = "https://mainnet.base.org"
+
+RPC_URLS = [
+    url.strip()
+    for url in os.getenv("BASE_RPC_URLS", os.getenv("BASE_RPC_URL", BASE_RPC)).split(",")
+    if url.strip()
+]
+
+HEDGE_DELAY = float(os.getenv("RPC_HEDGE_DELAY_MS", "250")) / 1000
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "10"))
+
+# Failed endpoints sit out for COOLDOWN * 2**(streak-1) seconds, capped
+COOLDOWN = 2.0
+MAX_COOLDOWN = 60.0
+
+# Weight of the newest sample in the latency EWMA
+EWMA_ALPHA = 0.3
+
+# Calls that never change chain state and are safe to duplicate
+READ_METHODS = {
+    "eth_blockNumber",
+    "eth_call",
+    "eth_chainId",
+    "eth_estimateGas",
+    "eth_feeHistory",
+    "eth_gasPrice",
+    "eth_getBalance",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getCode",
+    "eth_getLogs",
+    "eth_getStorageAt",
+    "eth_getTransactionByHash",
+    "eth_getTransactionCount",
+    "eth_getTransactionReceipt",
+    "eth_maxPriorityFeePerGas",
+    "net_version",
+    "web3_clientVersion",
+}
+
+# JSON-RPC error codes that mean "this endpoint is unhappy", not "bad call"
+ENDPOINT_ERROR_CODES = {-32005, -32603, 429}
+
+
+class RPCError(Exception):
+    """JSON-RPC error returned by a node."""
+
+    def __init__(self, error: dict):
+        self.code = error.get("code")
+        self.error = error
+        super().__init__(f"RPC error {self.code}: {error.get('message')}")
+
+
+class EndpointUnavailable(Exception):
+    """Every endpoint in the pool failed the request."""
+
+
+# ============ ENDPOINT HEALTH ============
+
+class Endpoint:
+    """One RPC URL and its health statistics."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = None  # EWMA seconds, None until first success
+        self.streak = 0      # consecutive failures
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def score(self, now: Optional[float] = None) -> float:
+        """Lower is better. Cooling-down endpoints score infinity."""
+        now = time.monotonic() if now is None else now
+        if now < self.cooldown_until:
+            return math.inf
+        # Unknown endpoints get a neutral guess so they are tried early on
+        latency = self.latency if self.latency is not None else 0.1
+        return latency * (1 + self.streak)
+
+    def record_success(self, elapsed: float):
+        with self._lock:
+            self.requests += 1
+            self.streak = 0
+            self.cooldown_until = 0.0
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency = EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.latency
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.streak += 1
+            backoff = min(COOLDOWN * 2 ** (self.streak - 1), MAX_COOLDOWN)
+            self.cooldown_until = time.monotonic() + backoff
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "streak": self.streak,
+            "cooling_down": time.monotonic() < self.cooldown_until,
+        }
+
+
+# ============ POOL ============
+
+class RPCPool:
+    """Health-scored pool of JSON-RPC endpoints."""
+
+    def __init__(
+        self,
+        urls: Optional[list[str]] = None,
+        hedge_delay: float = HEDGE_DELAY,
+        timeout: float = RPC_TIMEOUT,
+    ):
+        urls = urls or RPC_URLS
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.hedge_delay = hedge_delay
+        self.client = httpx.Client(timeout=timeout)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(4, 2 * len(self.endpoints)),
+            thread_name_prefix="rpc-pool",
+        )
+        self._ids = itertools.count(1)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.client.close()
+
+    def ranked(self) -> list[Endpoint]:
+        """Endpoints best-first. Cooling-down endpoints go last, not away."""
+        now = time.monotonic()
+        return sorted(self.endpoints, key=lambda e: (e.score(now), e.errors))
+
+    def stats(self) -> list[dict]:
+        return [e.stats() for e in self.endpoints]
+
+    # -- transport --
+
+    def _post(self, endpoint: Endpoint, payload: Any) -> Any:
+        """POST one payload to one endpoint, updating its health."""
+        start = time.monotonic()
+        try:
+            response = self.client.post(endpoint.url, json=payload)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError):
+            endpoint.record_failure()
+            raise
+
+        errors = data if isinstance(data, list) else [data]
+        for item in errors:
+            error = item.get("error") if isinstance(item, dict) else None
+            if error and error.get("code") in ENDPOINT_ERROR_CODES:
+                endpoint.record_failure()
+                raise EndpointUnavailable(f"{endpoint.url}: {error.get('message')}")
+
+        endpoint.record_success(time.monotonic() - start)
+        return data
+
+    def _failover(self, payload: Any, endpoints: list[Endpoint]) -> Any:
+        last_error = None
+        for endpoint in endpoints:
+            try:
+                return self._post(endpoint, payload)
+            except (httpx.HTTPError, ValueError, EndpointUnavailable) as e:
+                last_error = e
+        raise EndpointUnavailable(f"All RPC endpoints failed: {last_error}")
+
+    def _hedged(self, payload: Any) -> Any:
+        """Send to the best endpoint; duplicate to the next one if it is slow."""
+        ranked = self.ranked()
+        if len(ranked) == 1:
+            return self._failover(payload, ranked)
+
+        pending = {self._executor.submit(self._post, ranked[0], payload)}
+        spare = iter(ranked[1:])
+        hedged = False
+        deadline = self.hedge_delay
+
+        while pending:
+            done, pending = wait(pending, timeout=deadline, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+
+            # Timed out or a request failed: bring in the next endpoint
+            if not done or not pending:
+                endpoint = next(spare, None)
+                if endpoint is not None:
+                    pending.add(self._executor.submit(self._post, endpoint, payload))
+                    hedged = True
+            # After the hedge is out, just wait for whoever answers first
+            deadline = None if hedged else self.hedge_delay
+
+        raise EndpointUnavailable("All RPC endpoints failed")
+
+    # -- public API --
+
+    def request(self, method: str, params: Optional[list] = None) -> dict:
+        """Send one JSON-RPC request; returns the raw response object."""
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "params": params or [],
+            "id": next(self._ids),
+        }
+        if method in READ_METHODS:
+            return self._hedged(payload)
+        return self._failover(payload, self.ranked())
+
+    def call(self, method: str, *params) -> Any:
+        """Send one request and return its result, raising RPCError on error."""
+        response = self.request(method, list(params))
+        if "error" in response:
+            raise RPCError(response["error"])
+        return response.get("result")
+
+    def batch(self, calls: list[tuple[str, list]]) -> list[dict]:
+        """
+        Send many requests in one JSON-RPC batch.
+
+        Returns the raw response objects in the order of `calls`.
+        """
+        if not calls:
+            return []
+        first_id = next(self._ids)
+        ids = [first_id] + [next(self._ids) for _ in calls[1:]]
+        payload = [
+            {"jsonrpc": "2.0", "method": method, "params": params or [], "id": rid}
+            for rid, (method, params) in zip(ids, calls)
+        ]
+        if all(method in READ_METHODS for method, _ in calls):
+            data = self._hedged(payload)
+        else:
+            data = self._failover(payload, self.ranked())
+
+        if not isinstance(data, list):
+            # A node rejecting the whole batch answers with a single error
+            raise RPCError(data.get("error", {"message": "invalid batch response"}))
+        by_id = {item.get("id"): item for item in data}
+        return [
+            by_id.get(rid, {"error": {"code": -32603, "message": "missing batch response"}})
+            for rid in ids
+        ]
+
+
+# ============ WEB3 ============
+
+# web3 takes about a second to import, so the provider class is only built
+# on first use (make_web3() or rpc_pool.PooledProvider).
+
+@functools.cache
+def _pooled_provider_class():
+    from web3.providers.base import JSONBaseProvider
+
+    class PooledProvider(JSONBaseProvider):
+        """web3.py provider backed by an RPCPool."""
+
+        def __init__(self, pool: Optional[RPCPool] = None, **kwargs):
+            super().__init__(**kwargs)
+            self.pool = pool or RPCPool()
+
+        def make_request(self, method, params):
+            return self.pool.request(method, list(params or []))
+
+        def make_batch_request(self, requests):
+            return self.pool.batch([(method, list(params or [])) for method, params in requests])
+
+        def is_connected(self, show_traceback: bool = False) -> bool:
+            try:
+                return "result" in self.pool.request("web3_clientVersion")
+            except EndpointUnavailable:
+                if show_traceback:
+                    raise
+                return False
+
+    return PooledProvider
+
+
+def __getattr__(name):
+    if name == "PooledProvider":
+        return _pooled_provider_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_default_pool = None
+
+
+def default_pool() -> RPCPool:
+    """Process-wide pool built from BASE_RPC_URLS."""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = RPCPool()
+    return _default_pool
+
+
+def make_web3(urls: Optional[list[str]] = None) -> "Web3":
+    """Web3 instance on a pooled provider (shared pool unless urls given)."""
+    from web3 import Web3
+
+    pool = RPCPool(urls) if urls else default_pool()
+    return Web3(_pooled_provider_class()(pool))
+
+
+if __name__ == "__main__":
+    pool = default_pool()
+    print(f"Block: {int(pool.call('eth_blockNumber'), 16)}")
+    for s in pool.stats():
+        print(f"  {s['url']}: {s['latency_ms']} ms, {s['errors']}/{s['requests']} errors")
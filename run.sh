@@ -1,6 +1,6 @@
 #!/bin/bash
 # x402 FRED Quick Start
-# Usage: ./run.sh [demo|server|test]
+# Usage: ./run.sh [demo|server|serve|test|sweep]
 
 set -e
 
@@ -34,15 +34,26 @@ case "${1:-demo}" in
         cd fred-integration
         uvicorn x402_inference_server:app --host 0.0.0.0 --port 8402 --reload
         ;;
+    serve)
+        echo -e "\n${GREEN}Starting x402 inference server on :8402 (${X402_WORKERS:-4} workers)...${NC}\n"
+        cd fred-integration
+        X402_WORKERS=${X402_WORKERS:-4} uvicorn x402_inference_server:app --host 0.0.0.0 --port 8402 --workers ${X402_WORKERS:-4}
+        ;;
     test)
         echo -e "\n${GREEN}Running integration test...${NC}\n"
         python integration_test.py
         ;;
+    sweep)
+        echo -e "\n${GREEN}Starting treasury sweeper...${NC}\n"
+        python treasury_sweeper.py "${@:2}"
+        ;;
     *)
-        echo "Usage: ./run.sh [demo|server|test]"
+        echo "Usage: ./run.sh [demo|server|serve|test|sweep]"
         echo "  demo   - Run the x402 payment demo"
-        echo "  server - Start the inference server"
+        echo "  server - Start the inference server (dev, auto-reload)"
+        echo "  serve  - Start the inference server with X402_WORKERS workers"
         echo "  test   - Run full integration test"
+        echo "  sweep  - Run the treasury sweeper (--dry-run, --once)"
         exit 1
         ;;
 esac
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Position Sizing for FRED
+
+Vectorized edge, Kelly / Ralph Vince optimal-f fractions, caps and
+drawdown constraints. Every function takes NumPy arrays (or scalars), so
+a whole scan of thousands of markets is sized in one pass.
+
+For a binary market bought at price c with estimated probability p, the
+payoff is +(1-c)/c per dollar on a win and -1 on a loss, so Vince's
+optimal f (fraction of the largest loss) and the Kelly fraction coincide:
+
+    YES:  f = (p - c) / (1 - c)
+    NO:   f = (c - p) / c
+
+optimal_f() covers the general case from a history of trade results.
+
+Usage:
+    s = size_positions(probs, prices, confidence, bankroll_usd=500)
+    s.size_usd[s.trade]
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# ============ CONFIG ============
+
+MIN_EDGE = 0.05
+MAX_POSITION_PCT = 0.05   # per market
+MAX_TOTAL_PCT = 0.50      # across the scan
+KELLY_MULTIPLIER = 1.0    # 0.5 = half Kelly
+MAX_DRAWDOWN = 0.25       # stop sizing at 25% below peak equity
+
+# Keep prices off 0/1 so fractions stay finite
+PRICE_EPS = 1e-6
+
+
+class Sizing(NamedTuple):
+    """Per-market sizing arrays, all the same shape as the inputs."""
+    edge: np.ndarray        # p - c
+    side: np.ndarray        # +1 YES, -1 NO, 0 no trade
+    fraction: np.ndarray    # bankroll fraction after caps
+    size_usd: np.ndarray
+    trade: np.ndarray       # bool mask
+
+
+def edge(probability, price) -> np.ndarray:
+    """Estimated probability minus market price."""
+    return np.asarray(probability, dtype=float) - np.asarray(price, dtype=float)
+
+
+def kelly_fraction(probability, price) -> np.ndarray:
+    """
+    Unconstrained Kelly / optimal-f fraction for the favourable side.
+
+    Always >= 0; the side is the sign of edge().
+    """
+    p = np.asarray(probability, dtype=float)
+    c = np.clip(np.asarray(price, dtype=float), PRICE_EPS, 1 - PRICE_EPS)
+    e = p - c
+    return np.where(e > 0, e / (1 - c), -e / c)
+
+
+def drawdown_scale(drawdown: float, max_drawdown: float = MAX_DRAWDOWN) -> float:
+    """Linear de-risking: full size at peak equity, zero at max_drawdown."""
+    if max_drawdown <= 0:
+        return 1.0
+    return float(np.clip(1.0 - drawdown / max_drawdown, 0.0, 1.0))
+
+
+def size_positions(
+    probability,
+    price,
+    confidence=1.0,
+    bankroll_usd: float = 100.0,
+    min_edge: float = MIN_EDGE,
+    kelly_multiplier: float = KELLY_MULTIPLIER,
+    max_position_pct: float = MAX_POSITION_PCT,
+    max_total_pct: Optional[float] = MAX_TOTAL_PCT,
+    drawdown: float = 0.0,
+    max_drawdown: float = MAX_DRAWDOWN,
+) -> Sizing:
+    """
+    Size every market in one pass.
+
+    Fractions are Kelly x multiplier x confidence, capped per market,
+    scaled down with the current drawdown, then scaled so the scan's total
+    exposure stays under max_total_pct.
+    """
+    p = np.asarray(probability, dtype=float)
+    c = np.asarray(price, dtype=float)
+    e = p - c
+
+    trade = np.abs(e) >= min_edge
+    side = np.where(trade, np.sign(e), 0.0)
+
+    fraction = kelly_fraction(p, c) * kelly_multiplier * np.asarray(confidence, dtype=float)
+    fraction = np.where(trade, np.minimum(fraction, max_position_pct), 0.0)
+    fraction *= drawdown_scale(drawdown, max_drawdown)
+
+    if max_total_pct is not None:
+        total = fraction.sum()
+        if total > max_total_pct:
+            fraction *= max_total_pct / total
+
+    trade = trade & (fraction > 0)
+    return Sizing(e, side, fraction, fraction * bankroll_usd, trade)
+
+
+# ============ OPTIMAL F FROM HISTORY ============
+
+def optimal_f(trades, resolution: int = 1000) -> tuple[float, float]:
+    """
+    Ralph Vince optimal f for a history of per-trade P&L.
+
+    Maximizes TWR(f) = prod(1 + f * trade / |largest loss|) over a grid of
+    f in (0, 1], evaluated for all f at once. Returns (f, geometric mean
+    per trade). Histories without a loss return (1.0, nan).
+    """
+    trades = np.asarray(trades, dtype=float)
+    worst = trades.min(initial=0.0)
+    if worst >= 0:
+        return 1.0, float("nan")
+
+    f = np.linspace(1.0 / resolution, 1.0, resolution)[:, None]
+    hpr = 1.0 + f * (trades[None, :] / -worst)
+    with np.errstate(divide="ignore"):
+        log_twr = np.where((hpr > 0).all(axis=1), np.log(np.maximum(hpr, 1e-300)).sum(axis=1), -np.inf)
+    best = int(np.argmax(log_twr))
+    return float(f[best, 0]), float(np.exp(log_twr[best] / trades.size))
+
+
+def r_multiple(entry, exit_price, stop_loss) -> np.ndarray:
+    """Reward in units of initial risk (entry - stop)."""
+    entry = np.asarray(entry, dtype=float)
+    return (np.asarray(exit_price, dtype=float) - entry) / (entry - np.asarray(stop_loss, dtype=float))
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    n = 100_000
+    prices = rng.uniform(0.02, 0.98, n)
+    probs = np.clip(prices + rng.normal(0, 0.08, n), 0.01, 0.99)
+    conf = rng.uniform(0.5, 1.0, n)
+
+    start = time.perf_counter()
+    s = size_positions(probs, prices, conf, bankroll_usd=1000)
+    elapsed = time.perf_counter() - start
+    print(f"Sized {n:,} markets in {elapsed * 1000:.1f} ms "
+          f"({elapsed / n * 1e6:.3f} µs/market), {int(s.trade.sum()):,} trades")
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Spend-Rate Governor for FRED's Paid Inference
+
+max_price_usd caps what one call may cost; the governor caps how fast
+the agent spends and how many paid calls it has in flight:
+
+  - SpendBucket is a USDC token bucket: SPEND_BUDGET_USD per SPEND_WINDOW
+    seconds, refilled continuously. A call reserves its price before the
+    payment is signed, so spend never runs ahead of the budget. A paid call
+    that comes back with an error status was not charged by the proxy and
+    its reservation is refunded. One that ends in a transport error may
+    have been served, so it stays spent.
+  - The concurrency limit is AIMD: +1/limit per good response (about +1
+    per round of calls), times BACKOFF on 429, 5xx, a rejected payment
+    (402 on the paid retry), a transport error, or a response slower than
+    LATENCY_TOLERANCE times the best latency seen. At most one decrease
+    per observed latency, so a burst of errors from one overload counts
+    once.
+
+Callers over the limit wait in FIFO order; stats() reports the limits,
+the budget left, and how many calls are queued for a slot or for budget.
+
+Usage:
+    governor = SpendGovernor(budget_usd=1.0, window=60)
+    async with governor.slot() as call:
+        response = await client.post(url, json=body)          # unpaid probe
+        price, recipient = parse_payment_required(response.json())
+        await call.pay(price)                                   # waits for budget
+        response = await client.post(url, json=body, headers=...)
+        call.observe(response.status_code, elapsed)
+
+    with governor.slot_sync() as call: ...                      # blocking callers
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+
+# ============ CONFIG ============
+
+SPEND_BUDGET_USD = float(os.getenv("FRED_SPEND_BUDGET_USD", "1.0"))
+SPEND_WINDOW = float(os.getenv("FRED_SPEND_WINDOW", "60"))  # seconds
+
+INITIAL_CONCURRENCY = int(os.getenv("FRED_INITIAL_CONCURRENCY", "4"))
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.getenv("FRED_MAX_CONCURRENCY", "64"))
+
+# Multiplicative decrease, and the latency (vs the best seen) that triggers it
+BACKOFF = 0.5
+LATENCY_TOLERANCE = 2.0
+
+# Weight of the newest sample in the latency EWMA, and how fast the best-latency
+# baseline may drift up per sample when the proxy gets slower for good
+EWMA_ALPHA = 0.3
+BASELINE_DRIFT = 1.01
+
+# Statuses that mean "slow down"; a 402 only counts on the paid retry
+THROTTLE_STATUSES = frozenset({402, 429})
+
+
+# ============ BUDGET ============
+
+class SpendBucket:
+    """USDC token bucket: `capacity` per `window` seconds, refilled continuously."""
+
+    def __init__(self, capacity: float, window: float, clock: Callable[[], float] = time.monotonic):
+        if capacity <= 0 or window <= 0:
+            raise ValueError("budget and window must be positive")
+        self.capacity = capacity
+        self.window = window
+        self.rate = capacity / window
+        self.tokens = capacity
+        self.clock = clock
+        self._updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount: float) -> float:
+        """Take `amount` if available and return 0, else seconds until it will be."""
+        if amount > self.capacity:
+            raise ValueError(f"${amount} exceeds the whole budget of ${self.capacity} per {self.window}s")
+        self._refill()
+        if self.tokens + 1e-12 >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+# ============ GOVERNOR ============
+
+class GovernedCall:
+    """One admitted call: its budget reservation and observed outcome."""
+
+    def __init__(self, governor: "SpendGovernor"):
+        self.governor = governor
+        self.reserved = 0.0
+
+    async def pay(self, amount_usd: float):
+        """Reserve `amount_usd` of budget, waiting for the bucket to refill if needed."""
+        while True:
+            wait = self.governor._reserve(amount_usd)
+            if not wait:
+                break
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.governor._budget_waited()
+        self.reserved += amount_usd
+
+    def pay_sync(self, amount_usd: float):
+        while True:
+            wait = self.governor._reserve(amount_usd)
+            if not wait:
+                break
+            try:
+                time.sleep(wait)
+            finally:
+                self.governor._budget_waited()
+        self.reserved += amount_usd
+
+    def observe(self, status: Optional[int], latency: Optional[float] = None):
+        """
+        Record a response (status None = transport error). Settles any
+        reservation: spent on 200 or a transport error, refunded otherwise.
+        """
+        ok = status is not None and 200 <= status < 300
+        refund = status is not None and not ok
+        self.governor._settle(self.reserved, refund)
+        self.reserved = 0.0
+        self.governor._observe(ok, status, latency)
+
+
+class SpendGovernor:
+    """USDC spend budget plus AIMD concurrency limit for paid inference calls."""
+
+    def __init__(self, budget_usd: float = SPEND_BUDGET_USD, window: float = SPEND_WINDOW,
+                 initial_limit: int = INITIAL_CONCURRENCY, min_limit: int = MIN_CONCURRENCY,
+                 max_limit: int = MAX_CONCURRENCY, latency_tolerance: float = LATENCY_TOLERANCE,
+                 backoff: float = BACKOFF, clock: Callable[[], float] = time.monotonic):
+        self.budget = SpendBucket(budget_usd, window, clock)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.clock = clock
+        self.latency = None   # EWMA seconds of good responses
+        self.baseline = None  # best latency seen (drifts up slowly)
+        self.in_flight = 0
+        self.waiting_budget = 0
+        self.requests = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.spent_usd = 0.0
+        self.refunded_usd = 0.0
+        self._last_decrease = float("-inf")
+        self._waiters: deque = deque()  # wake-up callbacks, FIFO
+        self._lock = threading.Lock()
+
+    @property
+    def concurrency(self) -> int:
+        return int(self.limit)
+
+    # -- slots --
+
+    def _admit_locked(self) -> bool:
+        if not self._waiters and self.in_flight < self.concurrency:
+            self.in_flight += 1
+            return True
+        return False
+
+    def _wake_locked(self):
+        # Hand freed slots straight to the oldest waiters
+        while self._waiters and self.in_flight < self.concurrency:
+            self.in_flight += 1
+            self._waiters.popleft()()
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_locked()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._admit_locked():
+                return
+            future = loop.create_future()
+
+            def wake():
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+            self._waiters.append(wake)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if wake in self._waiters:
+                    self._waiters.remove(wake)
+                    raise
+            self._release()  # the slot was handed over as we were cancelled
+            raise
+
+    def acquire_sync(self):
+        with self._lock:
+            if self._admit_locked():
+                return
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+
+    def slot(self) -> "_AsyncSlot":
+        """`async with governor.slot() as call:` one paid call under the limits."""
+        return _AsyncSlot(self)
+
+    def slot_sync(self) -> "_SyncSlot":
+        return _SyncSlot(self)
+
+    # -- budget --
+
+    def _reserve(self, amount: float) -> float:
+        with self._lock:
+            wait = self.budget.take(amount)
+            if wait:
+                self.waiting_budget += 1
+            return wait
+
+    def _budget_waited(self):
+        with self._lock:
+            self.waiting_budget -= 1
+
+    def _settle(self, amount: float, refund: bool):
+        if not amount:
+            return
+        with self._lock:
+            if refund:
+                self.budget.give_back(amount)
+                self.refunded_usd += amount
+            else:
+                self.spent_usd += amount
+
+    # -- AIMD --
+
+    def _observe(self, ok: bool, status: Optional[int], latency: Optional[float]):
+        with self._lock:
+            self.requests += 1
+            slow = False
+            if ok and latency is not None:
+                self.latency = latency if self.latency is None else (
+                    EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency)
+                self.baseline = latency if self.baseline is None else min(latency, self.baseline * BASELINE_DRIFT)
+                slow = latency > self.latency_tolerance * self.baseline
+            throttle = status is None or status in THROTTLE_STATUSES or status >= 500
+            if throttle:
+                self.throttled += 1
+            if throttle or slow:
+                now = self.clock()
+                # One decrease per round trip: a burst of errors from one overload counts once
+                if now - self._last_decrease >= (self.latency or 0.0):
+                    self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                    self._last_decrease = now
+                    self.decreases += 1
+            elif ok:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+                self._wake_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency_limit": self.concurrency,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "waiting_budget": self.waiting_budget,
+                "budget_usd": self.budget.capacity,
+                "window_s": self.budget.window,
+                "available_usd": round(self.budget.available(), 6),
+                "spent_usd": round(self.spent_usd, 6),
+                "refunded_usd": round(self.refunded_usd, 6),
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "baseline_ms": round(self.baseline * 1000, 1) if self.baseline is not None else None,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "decreases": self.decreases,
+            }
+
+
+def _finish(call: GovernedCall, exc: Optional[BaseException]):
+    if isinstance(exc, httpx.TransportError):
+        call.observe(None)  # reservation kept: the proxy may have served it
+    else:
+        # Left over after an error that is not the proxy's (bad price, parse error):
+        # nothing was sent with the payment, or its outcome is unknown; keep it spent
+        call.governor._settle(call.reserved, refund=False)
+        call.reserved = 0.0
+
+
+class _AsyncSlot:
+    def __init__(self, governor: SpendGovernor):
+        self.governor = governor
+
+    async def __aenter__(self) -> GovernedCall:
+        await self.governor.acquire()
+        self.call = GovernedCall(self.governor)
+        return self.call
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            _finish(self.call, exc)
+        finally:
+            self.governor._release()
+
+
+class _SyncSlot:
+    def __init__(self, governor: SpendGovernor):
+        self.governor = governor
+
+    def __enter__(self) -> GovernedCall:
+        self.governor.acquire_sync()
+        self.call = GovernedCall(self.governor)
+        return self.call
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            _finish(self.call, exc)
+        finally:
+            self.governor._release()
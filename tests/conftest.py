@@ -0,0 +1,47 @@
+"""
+Shared fixtures. The proxy lives in fred-integration/ (not a package), so
+its directory is put on sys.path the same way run.sh serves it from there.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "fred-integration"))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    The proxy module with a temporary ledger, a stub LLM, a verifier that
+    accepts any X-PAYMENT header and a settler that records batches in
+    server.settled_batches instead of calling the facilitator.
+    """
+    import x402_inference_server as server
+
+    async def stub_llm(prompt, model, max_tokens, **kwargs):
+        return server.LLMReply('{"probability": 0.62, "confidence": 0.75}', 42)
+
+    async def accept_any(header):
+        return server.PRICE_PER_CALL if header else None
+
+    async def stub_settle(batch):
+        server.settled_batches.append([item["id"] for item in batch])
+        return [True] * len(batch)
+
+    monkeypatch.setattr(server, "settled_batches", [], raising=False)
+    monkeypatch.setattr(server, "make_settler", lambda: stub_settle)
+    monkeypatch.setattr(server, "LEDGER_DIR", str(tmp_path / "ledger"))
+    monkeypatch.setattr(server, "call_llm", stub_llm)
+    monkeypatch.setattr(server, "verify_payment_header", accept_any)
+    return server
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as client:
+        yield client
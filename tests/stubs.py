@@ -0,0 +1,236 @@
+"""
+Local stand-ins for the network services FRED talks to.
+
+StubRPC is a tiny threaded JSON-RPC server: answers come from a dict of
+method -> value (or callable(params) -> value), with optional latency and
+HTTP status so tests can simulate slow or failing endpoints.
+
+StubAnthropic mimics the Messages API's prompt-cache accounting.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubRPC:
+    """Threaded JSON-RPC stub bound to 127.0.0.1 on a free port."""
+
+    def __init__(self, results=None, delay=0.0, status=200):
+        self.results = dict(results or {})
+        self.delay = delay
+        self.status = status
+        self.calls = []
+        self.posts = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                stub.record(payload)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.status != 200:
+                    self.send_response(stub.status)
+                    self.end_headers()
+                    return
+                if isinstance(payload, list):
+                    body = [stub.answer(item) for item in payload]
+                else:
+                    body = stub.answer(payload)
+                data = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    def record(self, payload):
+        with self._lock:
+            self.posts += 1
+            for request in payload if isinstance(payload, list) else [payload]:
+                self.calls.append((request["method"], request.get("params", [])))
+
+    def answer(self, request):
+        method = request["method"]
+        if method not in self.results:
+            return {"jsonrpc": "2.0", "id": request["id"],
+                    "error": {"code": -32601, "message": f"method not found: {method}"}}
+        value = self.results[method]
+        if callable(value):
+            value = value(request.get("params", []))
+        return {"jsonrpc": "2.0", "id": request["id"], "result": value}
+
+    def count(self, method):
+        with self._lock:
+            return sum(1 for m, _ in self.calls if m == method)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class StubChain(StubRPC):
+    """
+    Minimal dev chain on top of StubRPC.
+
+    Raw transactions are accepted into a mempool and only included when the
+    test calls mine(); hashes in `stalled` stay pending.
+    """
+
+    def __init__(self, nonce=0, **kwargs):
+        self.block = 1
+        self.mempool = []
+        self.receipts = {}
+        self.stalled = set()
+        super().__init__({
+            "eth_chainId": "0x2105",
+            "eth_blockNumber": lambda params: hex(self.block),
+            "eth_getTransactionCount": hex(nonce),
+            "eth_estimateGas": "0x7530",
+            "eth_feeHistory": {
+                "oldestBlock": "0x1",
+                "baseFeePerGas": ["0x3b9aca00", "0x3b9aca00"],
+                "gasUsedRatio": [0.5],
+                "reward": [["0x5f5e100"]],
+            },
+            "eth_sendRawTransaction": self._send,
+            "eth_getTransactionReceipt": lambda params: self.receipts.get(params[0]),
+        }, **kwargs)
+
+    def _send(self, params):
+        from eth_utils import keccak
+        tx_hash = "0x" + keccak(hexstr=params[0]).hex()
+        self.mempool.append(tx_hash)
+        return tx_hash
+
+    def mine(self):
+        """Include every non-stalled mempool transaction in a new block."""
+        self.block += 1
+        for tx_hash in list(self.mempool):
+            if tx_hash in self.stalled:
+                continue
+            self.mempool.remove(tx_hash)
+            self.receipts[tx_hash] = {
+                "transactionHash": tx_hash,
+                "blockNumber": hex(self.block),
+                "status": "0x1",
+                "gasUsed": "0x5208",
+            }
+
+
+class StubProxy:
+    """
+    ASGI stand-in for the x402 inference proxy (use with httpx.ASGITransport).
+
+    Unpaid requests get the proxy's 402 body; paid ones get `reply(prompt)`
+    as the inference text after `delay` seconds.
+    """
+
+    def __init__(self, reply=None, price=5000, delay=0.0,
+                 recipient="0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"):
+        self.reply = reply or (lambda prompt: '{"probability": 0.7, "confidence": 0.8}')
+        self.price = price
+        self.delay = delay
+        self.recipient = recipient
+        self.unpaid = 0
+        self.paid = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        import asyncio
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        headers = dict(scope["headers"])
+
+        if b"x-payment" not in headers:
+            self.unpaid += 1
+            status, payload = 402, {
+                "x402Version": 1,
+                "accepts": [{"scheme": "exact", "network": "eip155:8453",
+                             "maxAmountRequired": str(self.price), "payTo": self.recipient}],
+                "maxAmountRequired": str(self.price),
+                "resource": scope["path"],
+            }
+        else:
+            self.paid += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delay)
+            finally:
+                self.in_flight -= 1
+            request = json.loads(body or b"{}")
+            status, payload = 200, {
+                "response": self.reply(request.get("prompt", "")),
+                "model": request.get("model", "stub"),
+                "payment_amount": self.price,
+                "tokens_used": 42,
+            }
+
+        data = json.dumps(payload).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": data})
+
+
+class StubAnthropic:
+    """
+    AsyncAnthropic stand-in with prompt-cache accounting.
+
+    Tokens are whitespace-separated words. A system block marked with
+    cache_control is written to the cache on first use
+    (cache_creation_input_tokens) and read from it afterwards
+    (cache_read_input_tokens); uncached input counts as input_tokens.
+    """
+
+    def __init__(self, reply='{"probability": 0.62, "confidence": 0.75}'):
+        from types import SimpleNamespace
+
+        self.reply = reply
+        self.cached = set()
+        self.requests = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    async def _create(self, model, max_tokens, messages, system=None, **kwargs):
+        from types import SimpleNamespace
+
+        self.requests.append({"model": model, "max_tokens": max_tokens, "messages": messages, "system": system})
+        usage = {"input_tokens": 0, "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0}
+        for block in system or []:
+            words = len(block["text"].split())
+            if "cache_control" not in block:
+                usage["input_tokens"] += words
+            elif block["text"] in self.cached:
+                usage["cache_read_input_tokens"] += words
+            else:
+                self.cached.add(block["text"])
+                usage["cache_creation_input_tokens"] += words
+        usage["input_tokens"] += sum(len(m["content"].split()) for m in messages)
+        return SimpleNamespace(
+            content=[SimpleNamespace(text=self.reply)],
+            usage=SimpleNamespace(output_tokens=len(self.reply.split()), **usage),
+        )
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Tests for the structured /estimate route on the proxy
+"""
+
+import json
+import asyncio
+
+import httpx
+import pytest
+
+from integration_test import MockMarket
+from estimates import parse_probability
+from market_pipeline import X402Estimator
+
+
+def payment(nonce):
+    return json.dumps({"payload": {"authorization": {"from": "0xDDD", "nonce": nonce, "value": "5000"}}})
+
+
+class TestParseProbability:
+    """Validation of the model's reply, shared by the proxy and X402Estimator"""
+
+    @pytest.mark.parametrize("text", [
+        '{"probability": 0.62, "confidence": 0.75}',
+        ' {"probability":0.62,"confidence":0.75}\n',
+        'Sure: {"probability": "0.62", "confidence": 0.75} done',
+    ])
+    def test_accepts(self, text):
+        assert parse_probability(text) == {"probability": 0.62, "confidence": 0.75}
+
+    @pytest.mark.parametrize("text", [
+        "I think about 60%",
+        '{"probability": 1.4, "confidence": 0.5}',
+        '{"probability": 0.6}',
+        '[0.6, 0.5]',
+    ])
+    def test_rejects(self, text):
+        with pytest.raises(ValueError):
+            parse_probability(text)
+
+
+class TestEstimateRoute:
+    """Compact prompt, small token cap, typed reply"""
+
+    def test_typed_reply_with_small_cap(self, server, client, monkeypatch):
+        calls = []
+
+        async def stub_llm(prompt, model, max_tokens, **kwargs):
+            calls.append((prompt, max_tokens))
+            return server.LLMReply('{"probability": 0.7, "confidence": 0.9}', 12)
+
+        monkeypatch.setattr(server, "call_llm", stub_llm)
+        r = client.post("/estimate", json={"question": "Will it rain?", "price": 0.55},
+                        headers={"X-PAYMENT": payment(1)})
+        assert r.status_code == 200
+        assert r.json() == {"probability": 0.7, "confidence": 0.9, "model": "claude-3-5-sonnet-20241022",
+                            "payment_amount": 5000, "tokens_used": 12}
+        [(prompt, max_tokens)] = calls
+        assert max_tokens == server.ESTIMATE_MAX_TOKENS
+        assert "Will it rain?" in prompt and "0.550" in prompt
+        assert len(prompt) < 200
+
+    def test_unpaid_is_402_for_this_route(self, client):
+        r = client.post("/estimate", json={"question": "q"})
+        assert r.status_code == 402
+        assert r.json()["resource"].endswith("/estimate")
+
+    def test_invalid_reply_is_502_and_not_charged(self, server, client, monkeypatch):
+        async def chatty_llm(prompt, model, max_tokens, **kwargs):
+            return server.LLMReply("It depends on the weather.", 9)
+
+        monkeypatch.setattr(server, "call_llm", chatty_llm)
+        r = client.post("/estimate", json={"question": "q"}, headers={"X-PAYMENT": payment(2)})
+        assert r.status_code == 502
+        assert "0xddd:2" not in server.settlement.queue.pending
+        assert server.state.claim_nonce("0xddd:2")  # released
+
+    def test_price_is_validated(self, client):
+        r = client.post("/estimate", json={"question": "q", "price": 3}, headers={"X-PAYMENT": payment(3)})
+        assert r.status_code == 422
+
+
+class TestStructuredEstimator:
+    """X402Estimator(structured=True) reads typed fields"""
+
+    def test_round_trip(self, server):
+        def sign(recipient, amount_usd, resource):
+            return json.loads(payment(4))
+
+        async def run():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport) as client:
+                estimator = X402Estimator("http://proxy/estimate", sign, client=client, structured=True)
+                return await estimator(MockMarket(question="Will it rain?", price=0.4))
+
+        assert asyncio.run(run()) == {"probability": 0.62, "confidence": 0.75}
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental re-estimation: only markets whose price moved are paid for
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from integration_test import MockMarket
+from estimate_store import EstimateStore, cached_estimator
+from market_pipeline import X402Estimator, fred_pipeline, market_price
+from tests.stubs import StubProxy
+
+
+def signer(recipient, amount_usd, resource):
+    return {"payload": {}}
+
+
+class TestStaleness:
+    """Price moves and age decide what is re-estimated"""
+
+    def test_price_move_threshold(self):
+        store = EstimateStore(price_move=0.02, max_age=3600)
+        store.put("m", 0.7, 0.8, price=0.55, now=0)
+        assert store.is_fresh("m", 0.56, now=10)
+        assert not store.is_fresh("m", 0.58, now=10)
+
+    def test_age_out(self):
+        store = EstimateStore(price_move=0.02, max_age=60)
+        store.put("m", 0.7, 0.8, price=0.55, now=0)
+        assert store.is_fresh("m", 0.55, now=59)
+        assert not store.is_fresh("m", 0.55, now=61)
+        assert store.prune(now=61) == 1
+
+    def test_partition(self):
+        store = EstimateStore()
+        markets = [MockMarket(f"m{i}", 0.5, id=str(i)) for i in range(4)]
+        for m in markets[:2]:
+            store.put(m.id, 0.6, 0.7, price=0.5)
+        stale, fresh = store.partition(markets, [0.5, 0.9, 0.5, 0.5])
+        assert [m.id for m in fresh] == ["0"]
+        assert [m.id for m in stale] == ["1", "2", "3"]
+
+    def test_save_and_load(self, tmp_path):
+        path = str(tmp_path / "estimates.json")
+        store = EstimateStore(path=path)
+        store.put("m", 0.7, 0.8, price=0.55, now=123.0)
+        store.save()
+        loaded = EstimateStore.load(path)
+        assert loaded.get("m").probability == 0.7
+        assert loaded.get("m").estimated_at == 123.0
+
+
+class TestCachedScans:
+    """Repeat scans only pay for markets that moved"""
+
+    def test_second_scan_pays_for_churn_only(self):
+        proxy = StubProxy()
+        store = EstimateStore(price_move=0.02)
+        markets = [MockMarket(f"Market {i}?", 0.50, id=str(i)) for i in range(100)]
+
+        async def scan():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=proxy),
+                                         base_url="http://proxy") as client:
+                estimator = X402Estimator("http://proxy/inference", signer, client=client)
+
+                async def fetch_page(page):
+                    return markets
+
+                async def place_order(decision):
+                    return None
+
+                return await fred_pipeline(fetch_page, estimator, place_order,
+                                           store=store, estimate_budget_usd=None).run([0])
+
+        first = asyncio.run(scan())
+        assert proxy.paid == 100
+
+        for m in markets[:10]:
+            m.outcomes[0].price = 0.60
+        second = asyncio.run(scan())
+        assert proxy.paid == 110
+        assert second.stats["estimate"].spent_usd == pytest.approx(first.stats["estimate"].spent_usd / 10)
+        assert len(second.outputs) == len(first.outputs)
+
+    def test_concurrent_requests_share_one_call(self):
+        calls = 0
+
+        async def estimate(market):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"probability": 0.6, "confidence": 0.9}
+
+        cached = cached_estimator(EstimateStore(), estimate, market_price)
+        market = MockMarket("same?", 0.5, id="x")
+
+        async def main():
+            return await asyncio.gather(*(cached(market) for _ in range(5)))
+
+        results = asyncio.run(main())
+        assert calls == 1
+        assert all(r["probability"] == 0.6 for r in results)
+
+    def test_cancelled_caller_hands_over_to_waiter(self):
+        calls = 0
+
+        async def estimate(market):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"probability": 0.6, "confidence": 0.9}
+
+        cached = cached_estimator(EstimateStore(), estimate, market_price)
+        market = MockMarket("same?", 0.5, id="x")
+
+        async def main():
+            first = asyncio.create_task(cached(market))
+            await asyncio.sleep(0)
+            second = asyncio.create_task(cached(market))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await asyncio.wait_for(second, timeout=1)
+
+        assert asyncio.run(main())["probability"] == 0.6
+        assert calls == 2
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Tests for the registration-driven inference router
+"""
+
+import json
+import base64
+
+import httpx
+import pytest
+
+import inference_router
+from inference_router import (
+    InferenceRouter, NoHealthyEndpoint, ProxyEndpoint, RegistrationCache, inference_endpoints,
+)
+
+REGISTRATION = {"name": "FRED", "endpoints": {"inference": ["http://a/inference", "http://b/inference"],
+                                              "status": "http://a/status"}}
+
+
+def sign(recipient, amount_usd, resource):
+    return {"payload": {"authorization": {"to": recipient, "value": str(int(amount_usd * 1_000_000))}},
+            "resource": resource}
+
+
+class Proxies:
+    """MockTransport handler: per-host behaviour of x402 proxies."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour  # host -> "ok" | "down" | "slow" | status code
+        self.calls = []
+        self.timeouts = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.calls.append(host)
+        self.timeouts.append(request.extensions["timeout"]["read"])
+        mode = self.behaviour.get(host, "ok")
+        if mode == "down":
+            raise httpx.ConnectError("refused", request=request)
+        if mode == "slow":
+            raise httpx.ReadTimeout("timed out", request=request)
+        if isinstance(mode, int):
+            return httpx.Response(mode)
+        if "X-PAYMENT" not in request.headers:
+            return httpx.Response(402, json={"accepts": [{"maxAmountRequired": "5000", "payTo": "0xFRED"}]})
+        return httpx.Response(200, json={"response": f"from {host}"})
+
+
+def router(proxies, urls=("http://a/inference", "http://b/inference")):
+    return InferenceRouter(list(urls), sign, client=httpx.Client(transport=httpx.MockTransport(proxies)))
+
+
+class TestRegistration:
+    """Endpoint discovery and the ETag cache"""
+
+    def test_endpoint_forms(self):
+        assert inference_endpoints(REGISTRATION) == ["http://a/inference", "http://b/inference"]
+        assert inference_endpoints({"endpoints": {"inference": "http://a"}}) == ["http://a"]
+        assert inference_endpoints({"endpoints": [
+            {"name": "A2A", "endpoint": "http://x"},
+            {"name": "inference", "endpoint": "http://a"},
+            {"name": "inference", "endpoint": "http://a"},
+        ]}) == ["http://a"]
+
+    def test_repo_registration_file(self):
+        with open("fred-registration.json") as f:
+            assert inference_endpoints(json.load(f)) == ["https://fred.openclaw.ai/api/inference"]
+
+    def test_conditional_get(self, tmp_path):
+        seen = []
+
+        def handler(request):
+            seen.append(request.headers.get("If-None-Match"))
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, json=REGISTRATION, headers={"ETag": '"v1"'})
+
+        path = str(tmp_path / "registrations.json")
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        cache = RegistrationCache(path, client=client)
+        assert cache.get("https://host/reg.json") == REGISTRATION
+        assert cache.get("https://host/reg.json") == REGISTRATION
+        assert seen == [None, '"v1"']
+        assert (cache.fetched, cache.revalidated) == (1, 1)
+
+        # Validators survive a restart
+        reloaded = RegistrationCache(path, client=client)
+        assert reloaded.get("https://host/reg.json") == REGISTRATION
+        assert reloaded.revalidated == 1
+
+    def test_max_age_and_stale_fallback(self):
+        responses = [httpx.Response(200, json=REGISTRATION, headers={"Cache-Control": "max-age=60"})]
+
+        def handler(request):
+            if not responses:
+                raise httpx.ConnectError("down", request=request)
+            return responses.pop()
+
+        cache = RegistrationCache(None, client=httpx.Client(transport=httpx.MockTransport(handler)))
+        cache.get("https://host/reg.json")
+        assert cache.get("https://host/reg.json") == REGISTRATION
+        assert cache.hits == 1
+
+        cache.entries["https://host/reg.json"]["expires"] = 0
+        assert cache.get("https://host/reg.json") == REGISTRATION
+
+    def test_data_and_ipfs_uris(self):
+        encoded = base64.b64encode(json.dumps(REGISTRATION).encode()).decode()
+        assert RegistrationCache(None).get(f"data:application/json;base64,{encoded}") == REGISTRATION
+        assert RegistrationCache.resolve("ipfs://Qm123") == inference_router.IPFS_GATEWAY + "Qm123"
+
+    def test_router_from_registration(self):
+        def handler(request):
+            return httpx.Response(200, json=REGISTRATION)
+
+        cache = RegistrationCache(None, client=httpx.Client(transport=httpx.MockTransport(handler)))
+        r = InferenceRouter.from_registration("https://host/reg.json", sign, cache=cache)
+        assert [e.url for e in r.endpoints] == ["http://a/inference", "http://b/inference"]
+
+
+class TestCircuitBreaker:
+    """Breaker states and adaptive timeouts"""
+
+    def test_opens_after_consecutive_failures(self):
+        endpoint = ProxyEndpoint("http://a")
+        for _ in range(inference_router.BREAKER_FAILURES):
+            assert endpoint.acquire()
+            endpoint.record_failure()
+        assert endpoint.state() == "open"
+        assert not endpoint.acquire()
+
+    def test_half_open_admits_one_trial(self):
+        endpoint = ProxyEndpoint("http://a")
+        for _ in range(inference_router.BREAKER_FAILURES):
+            endpoint.record_failure()
+        later = endpoint.opened_at + endpoint.cooldown
+        assert endpoint.state(later) == "half_open"
+        assert endpoint.acquire(later)
+        assert not endpoint.acquire(later)
+
+        # A failed trial re-opens with a longer cooldown
+        endpoint.record_failure()
+        assert endpoint.state() == "open"
+        assert endpoint.cooldown == 2 * inference_router.BREAKER_COOLDOWN
+
+        endpoint.acquire(endpoint.opened_at + endpoint.cooldown)
+        endpoint.record_success(0.5)
+        assert endpoint.state() == "closed"
+        assert endpoint.cooldown == inference_router.BREAKER_COOLDOWN
+
+    def test_timeout_tracks_latency(self):
+        endpoint = ProxyEndpoint("http://a")
+        assert endpoint.timeout() == inference_router.MAX_TIMEOUT
+        for _ in range(20):
+            endpoint.record_success(0.4)
+        assert endpoint.timeout() == inference_router.MIN_TIMEOUT
+        for _ in range(20):
+            endpoint.record_success(3.0)
+        assert inference_router.MIN_TIMEOUT < endpoint.timeout() <= inference_router.MAX_TIMEOUT
+
+
+class TestRouting:
+    """Fastest healthy proxy first, fail over on health errors only"""
+
+    def test_pays_fastest_proxy(self):
+        proxies = Proxies()
+        r = router(proxies)
+        r.endpoints[0].record_success(2.0)
+        r.endpoints[1].record_success(0.5)
+        assert r.request({"prompt": "hi"}) == {"response": "from b"}
+        assert proxies.calls == ["b", "b"]
+
+    def test_fails_over_and_opens_breaker(self):
+        proxies = Proxies(a="slow")
+        r = router(proxies)
+        r.endpoints[0].record_success(0.001)
+        r.endpoints[1].record_success(1.0)
+        for _ in range(inference_router.BREAKER_FAILURES):
+            assert r.request({"prompt": "hi"}) == {"response": "from b"}
+        assert r.endpoints[0].state() == "open"
+
+        # The open proxy is not tried again
+        proxies.calls.clear()
+        r.request({"prompt": "hi"})
+        assert "a" not in proxies.calls
+
+    def test_uses_adaptive_timeout(self):
+        proxies = Proxies()
+        r = router(proxies, urls=["http://a/inference"])
+        for _ in range(20):
+            r.endpoints[0].record_success(0.2)
+        r.request({"prompt": "hi"})
+        assert proxies.timeouts[-1] == inference_router.MIN_TIMEOUT
+
+    def test_5xx_and_429_count_against_health(self):
+        proxies = Proxies(a=503, b=429)
+        r = router(proxies)
+        with pytest.raises(NoHealthyEndpoint):
+            r.request({"prompt": "hi"})
+        assert [e.failures for e in r.endpoints] == [1, 1]
+
+    def test_client_errors_do_not_fail_over(self):
+        proxies = Proxies(a=422)
+        r = router(proxies, urls=["http://a/inference", "http://b/inference"])
+        r.endpoints[1].record_success(5.0)
+        with pytest.raises(RuntimeError, match="422"):
+            r.request({"prompt": "hi"})
+        assert proxies.calls == ["a"]
+        assert r.endpoints[0].failures == 0
+
+    def test_price_cap(self):
+        r = router(Proxies(), urls=["http://a/inference"])
+        with pytest.raises(ValueError, match="exceeds max"):
+            r.request({"prompt": "hi"}, max_price_usd=0.001)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for the Monte Carlo self-funding loop simulator
+"""
+
+import pytest
+
+from loop_simulator import LoopParams, price_sweep, simulate
+
+
+# Revenue and costs only: no trading P&L, no randomness in volume or gas
+NO_TRADING = LoopParams(
+    start_balance_usd=10.0,
+    volume_sigma=0.0,
+    max_position_pct=0.0,
+    gas_median_usd=0.01,
+    gas_sigma=0.0,
+)
+
+
+class TestEconomics:
+    """Simulated means match the scalar break-even model"""
+
+    def test_mean_daily_net(self):
+        result = simulate(NO_TRADING, paths=2000, days=30, seed=1)
+        p = NO_TRADING
+        daily = (p.volume_median_usd * p.lp_fee_rate
+                 - p.trades_per_day * p.inferences_per_trade * p.price_per_call_usd
+                 - p.gas_median_usd)
+        assert result.balances.mean() == pytest.approx(p.start_balance_usd + 30 * daily, rel=0.01)
+
+    def test_below_break_even_goes_insolvent(self):
+        """$6.25 volume at 0.8% only covers 10 calls; 30 calls a day cannot survive"""
+        params = NO_TRADING._replace(volume_median_usd=6.25, start_balance_usd=1.0)
+        result = simulate(params, paths=1000, days=60, seed=2)
+        assert result.insolvency_rate == 1.0
+        assert result.report()["insolvency_day_pct"][50] < 20
+
+    def test_insolvency_is_absorbing(self):
+        params = NO_TRADING._replace(volume_median_usd=0.01, start_balance_usd=0.5)
+        result = simulate(params, paths=100, days=50, seed=3)
+        assert (result.balances == 0).all()
+
+
+class TestPricing:
+    """Price sweeps reuse the same random draws"""
+
+    def test_higher_price_never_helps(self):
+        reports = price_sweep([0.001, 0.005, 0.05], paths=2000, days=90, seed=4)
+        medians = [r["balance_pct"][50] for r in reports]
+        assert medians[0] >= medians[1] >= medians[2]
+        assert reports[0]["insolvency_rate"] <= reports[2]["insolvency_rate"]
+
+    def test_deterministic_with_seed(self):
+        a = simulate(paths=500, days=20, seed=7).report()
+        b = simulate(paths=500, days=20, seed=7).report()
+        assert a == b
+
+    def test_million_wallet_days(self):
+        result = simulate(paths=10_000, days=100, seed=5)
+        assert result.balances.shape == (10_000,)
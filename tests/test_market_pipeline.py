@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for the concurrent market-scoring pipeline, offline with mock
+markets and a stub x402 proxy
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from integration_test import MockMarket
+from market_pipeline import NotCharged, Pipeline, Stage, X402Estimator, fred_pipeline
+from tests.stubs import StubProxy
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def markets(n, price=0.55):
+    return [MockMarket(f"Market {i}?", price, id=str(i)) for i in range(n)]
+
+
+def signer(recipient, amount_usd, resource):
+    return {"payload": {"authorization": {"to": recipient, "value": str(int(amount_usd * 1e6))}}}
+
+
+class TestEngine:
+    """Bounded stages, concurrency and budgets"""
+
+    def test_items_flow_through_all_stages(self):
+        async def double(x):
+            return x * 2
+
+        async def keep_even(x):
+            return x if x % 4 == 0 else None
+
+        result = run(Pipeline([Stage("a", double), Stage("b", keep_even)]).run(range(10)))
+        assert sorted(result.outputs) == [0, 4, 8, 12, 16]
+        assert result.stats["b"].dropped == 5
+
+    def test_concurrency_limit(self):
+        active, peak = 0, 0
+
+        async def slow(x):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return x
+
+        run(Pipeline([Stage("slow", slow, concurrency=5, queue_size=2)]).run(range(50)))
+        assert peak == 5
+
+    def test_budget_caps_spend(self):
+        async def paid(x):
+            return x
+
+        stage = Stage("paid", paid, concurrency=8, budget_usd=0.05, cost_usd=0.005)
+        result = run(Pipeline([stage]).run(range(30)))
+        assert len(result.outputs) == 10
+        assert result.stats["paid"].over_budget == 20
+        assert result.spent_usd == pytest.approx(0.05)
+
+    def test_failures_are_not_charged(self):
+        async def flaky(x):
+            if x % 2:
+                raise NotCharged("proxy down")
+            return x
+
+        stage = Stage("paid", flaky, budget_usd=1.0, cost_usd=0.005)
+        result = run(Pipeline([stage]).run(range(10)))
+        assert result.stats["paid"].errors == 5
+        assert result.spent_usd == pytest.approx(0.025)
+
+    def test_failure_after_payment_stays_charged(self):
+        async def unparseable(x):
+            raise ValueError("No JSON estimate in reply")
+
+        stage = Stage("paid", unparseable, budget_usd=0.01, cost_usd=0.005)
+        result = run(Pipeline([stage]).run(range(4)))
+        assert result.stats["paid"].errors == 2
+        assert result.stats["paid"].over_budget == 2
+        assert result.spent_usd == pytest.approx(0.01)
+
+    def test_async_generator_fans_out(self):
+        async def pages(page):
+            for i in range(3):
+                yield page * 10 + i
+
+        result = run(Pipeline([Stage("fetch", pages, concurrency=2)]).run([0, 1]))
+        assert sorted(result.outputs) == [0, 1, 2, 10, 11, 12]
+
+
+class TestFredPipeline:
+    """The FRED scan scores every market through a stub proxy"""
+
+    def test_scores_hundreds_in_parallel(self):
+        proxy = StubProxy(delay=0.05)
+        scan = markets(300)
+
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=proxy),
+                                         base_url="http://proxy") as client:
+                estimator = X402Estimator("http://proxy/inference", signer, client=client)
+
+                async def fetch_page(page):
+                    return scan[page * 100:(page + 1) * 100]
+
+                async def place_order(decision):
+                    return {"status": "paper"}
+
+                pipeline = fred_pipeline(fetch_page, estimator, place_order,
+                                         estimate_concurrency=64, estimate_budget_usd=None)
+                return await pipeline.run(range(3))
+
+        result = run(main())
+        assert proxy.paid == 300
+        assert proxy.max_in_flight > 1
+        # 0.70 estimate vs 0.55 price: every market is a YES trade
+        assert len(result.outputs) == 300
+        decision = result.outputs[0]
+        assert decision["side"] == "YES"
+        assert decision["edge"] == pytest.approx(0.15)
+        assert decision["size_usd"] == 5.0  # capped at 5% of $100
+
+    def test_estimate_budget(self):
+        proxy = StubProxy()
+
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=proxy),
+                                         base_url="http://proxy") as client:
+                estimator = X402Estimator("http://proxy/inference", signer, client=client)
+
+                async def fetch_page(page):
+                    return markets(50)
+
+                async def place_order(decision):
+                    return None
+
+                return await fred_pipeline(fetch_page, estimator, place_order,
+                                           estimate_budget_usd=0.1).run([0])
+
+        result = run(main())
+        assert proxy.paid == 20
+        assert result.stats["estimate"].over_budget == 30
+
+    def test_estimator_refunds_only_unpaid_failures(self):
+        replies = {"status": 503, "text": "ok"}
+
+        def handler(request):
+            if "X-PAYMENT" not in request.headers:
+                return httpx.Response(402, json={"accepts": [{"maxAmountRequired": "5000", "payTo": "0xFRED"}]})
+            if replies["status"] != 200:
+                return httpx.Response(replies["status"])
+            return httpx.Response(200, json={"response": replies["text"]})
+
+        estimator = X402Estimator("http://proxy/inference", signer,
+                                  client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        with pytest.raises(NotCharged):
+            run(estimator(markets(1)[0]))
+        replies.update(status=200, text="It depends.")
+        with pytest.raises(ValueError) as e:
+            run(estimator(markets(1)[0]))
+        assert not isinstance(e.value, NotCharged)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar market store
+"""
+
+import asyncio
+import warnings
+
+import numpy as np
+import pytest
+
+from integration_test import MockMarket
+from estimate_store import EstimateStore
+from market_pipeline import market_price
+from market_store import MarketStore, MarketView, refresh_estimates
+from sizing import size_positions
+
+
+def markets(n, price=0.5):
+    return [MockMarket(question=f"Market {i}?", price=price, id=f"m{i}") for i in range(n)]
+
+
+class TestLayout:
+    """Columns, views and id lookup"""
+
+    def test_views_look_like_markets(self):
+        store = MarketStore.from_markets(markets(3, price=0.4))
+        view = store.get("m1")
+        assert isinstance(view, MarketView)
+        assert (view.id, view.question, view.price) == ("m1", "Market 1?", 0.4)
+        assert [(o.name, o.price) for o in view.outcomes] == [("Yes", 0.4)]
+        assert market_price(view) == 0.4
+        assert store.get("missing") is None
+        assert store[-1].id == "m2"
+
+    def test_views_have_no_dict(self):
+        view = MarketStore.from_markets(markets(1))[0]
+        assert not hasattr(view, "__dict__")
+        assert not hasattr(view.outcomes[0], "__dict__")
+
+    def test_multi_outcome_markets(self):
+        store = MarketStore()
+        store.add("a", "A?", ["Yes", "No"], [0.3, 0.7])
+        store.add("b", "B?", [], [])
+        store.add("c", "C?", ["X", "Y", "Z"], [0.2, 0.5, 0.3])
+        assert store.outcome_prices(store.row("c")).tolist() == [0.2, 0.5, 0.3]
+        assert store.get("b").price is None
+        assert [o.name for o in store.get("a").outcomes] == ["Yes", "No"]
+
+    def test_re_adding_refreshes_prices(self):
+        store = MarketStore()
+        row = store.add("a", "A?", ["Yes", "No"], [0.3, 0.7])
+        assert store.add("a", "A?", ["Yes", "No"], [0.35, 0.65]) == row
+        assert len(store) == 1 and store.get("a").price == 0.35
+        with pytest.raises(ValueError):
+            store.add("a", "A?", ["Yes"], [0.4])
+
+    def test_grows_past_capacity(self):
+        store = MarketStore(capacity=2)
+        for i in range(100):
+            store.add(f"m{i}", f"{i}?", ["Yes", "No"], [i / 100, 1 - i / 100])
+        assert len(store) == 100
+        assert store.get("m73").price == pytest.approx(0.73)
+        assert store.outcome_prices(99).tolist() == pytest.approx([0.99, 0.01])
+
+    def test_columns_are_views(self):
+        store = MarketStore.from_markets(markets(10))
+        c = store.columns(2, 5)
+        assert len(c.price) == 3
+        assert np.shares_memory(c.price, store.columns().price)
+        c.price[0] = 0.9
+        assert store[2].price == 0.9
+
+    def test_update_prices(self):
+        store = MarketStore.from_markets(markets(4))
+        store.update_prices(["m3", "m0"], [0.1, 0.8])
+        assert store.columns().price.tolist() == [0.8, 0.5, 0.5, 0.1]
+        assert store.get("m3").outcomes[0].price == 0.1
+
+    def test_update_prices_skips_markets_without_outcomes(self):
+        store = MarketStore()
+        store.add("a", "A?", ["Yes", "No"], [0.3, 0.7])
+        store.add("b", "B?", [], [])
+        store.add("c", "C?", ["Yes", "No"], [0.2, 0.8])
+        store.update_prices(["b", "a"], [0.9, 0.4])
+        assert store.get("b").price is None
+        assert store.outcome_prices(store.row("c")).tolist() == [0.2, 0.8]  # not overwritten
+        assert store.get("a").price == 0.4
+
+
+class TestScoring:
+    """Staleness and sizing over column slices"""
+
+    def test_stale_mask_matches_estimate_store(self):
+        store = MarketStore.from_markets(markets(4, price=0.5))
+        store.record_estimates([0, 1, 2], 0.6, 0.8, now=1000)
+        store.update_prices(["m1"], [0.6])
+        mask = store.stale_mask(now=1000 + 60, price_move=0.02, max_age=3600)
+        assert mask.tolist() == [False, True, False, True]
+        assert store.stale_mask(now=1000 + 3600, max_age=3600)[:3].tolist() == [True, True, True]
+
+        reference = EstimateStore(price_move=0.02, max_age=3600)
+        for view in store:
+            if view.estimate:
+                reference.put(view.id, 0.6, 0.8, 0.5, now=1000)
+        assert [not reference.is_fresh(v.id, v.price, now=1060) for v in store] == mask.tolist()
+
+    def test_size_matches_size_positions(self):
+        store = MarketStore.from_markets(markets(6, price=0.5))
+        store.record_estimates([0, 2, 4], [0.7, 0.52, 0.2], [1.0, 1.0, 0.5])
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            s = store.size(bankroll_usd=1000)
+        assert np.flatnonzero(s.trade).tolist() == [0, 4]
+
+        expected = size_positions([0.7, 0.52, 0.2], [0.5, 0.5, 0.5], [1.0, 1.0, 0.5], bankroll_usd=1000)
+        assert s.size_usd[[0, 2, 4]] == pytest.approx(expected.size_usd)
+
+    def test_size_a_slice(self):
+        store = MarketStore.from_markets(markets(6, price=0.5))
+        store.record_estimates(range(6), 0.7)
+        assert len(store.size(2, 4, bankroll_usd=100).size_usd) == 2
+
+    def test_estimate_store_round_trip(self):
+        store = MarketStore.from_markets(markets(3))
+        store.record_estimates([1], 0.66, 0.9, now=500)
+        estimates = EstimateStore()
+        assert store.save_estimates(estimates) == 1
+
+        other = MarketStore.from_markets(markets(3))
+        assert other.load_estimates(estimates) == 1
+        assert other.get("m1").estimate == {"probability": 0.66, "confidence": 0.9}
+        assert other.get("m0").estimate is None
+
+
+class TestRefresh:
+    """Only stale rows are paid for"""
+
+    def test_refreshes_stale_rows(self):
+        store = MarketStore.from_markets(markets(5))
+        store.record_estimates([0, 1], 0.5, now=10**10)
+        asked = []
+
+        async def estimate(market):
+            asked.append(market.id)
+            if market.id == "m4":
+                raise RuntimeError("proxy down")
+            return {"probability": 0.7, "confidence": 0.6}
+
+        report = asyncio.run(refresh_estimates(store, estimate, now=10**10))
+        assert sorted(asked) == ["m2", "m3", "m4"]
+        assert report == {"stale": 3, "estimated": 2, "failed": 1}
+        assert store.get("m3").estimate == {"probability": 0.7, "confidence": 0.6}
+        assert store.get("m4").estimate is None
+
+    def test_compact_for_large_scans(self):
+        store = MarketStore(100_000, 100_000)
+        for i in range(100_000):
+            store.add(f"m{i}", f"Market {i}?", ["Yes"], [0.5])
+        # 5 float64 columns + offsets + one outcome price per market
+        assert store.nbytes <= 100_000 * 7 * 8 + 8
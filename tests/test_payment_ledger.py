@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Tests for the append-only payment ledger and the endpoints that read it
+"""
+
+import json
+import time
+import threading
+
+from payment_ledger import PaymentLedger
+
+
+def pay(ledger, payer="0xAAA", amount=5000, ts=1_000_000.0, nonce=1, tokens=100):
+    ledger.append({"type": "payment", "ts": ts, "payer": payer, "agent_id": 1147,
+                   "amount": amount, "nonce": str(nonce), "tokens": tokens, "latency_ms": 12.0})
+
+
+class TestLedger:
+    """Append-only segments, batched fsync, compact index"""
+
+    def test_aggregates(self, tmp_path):
+        ledger = PaymentLedger(str(tmp_path))
+        for i in range(10):
+            pay(ledger, payer="0xAAA" if i < 7 else "0xBBB", ts=960_000 + i * 60, nonce=i)
+        assert ledger.totals()["count"] == 10
+        assert ledger.payer("0xaaa")["amount"] == 35000
+        assert ledger.top_payers(1)[0]["payer"] == "0xaaa"
+        # Minute-aligned window: minutes 2..4
+        assert ledger.revenue(960_000 + 120, 960_000 + 300)["count"] == 3
+
+    def test_batched_fsync(self, tmp_path, monkeypatch):
+        syncs = []
+        monkeypatch.setattr("payment_ledger.os.fsync", lambda fd: syncs.append(fd))
+        ledger = PaymentLedger(str(tmp_path), segment_bytes=1000)
+        for i in range(120):
+            pay(ledger, nonce=i)
+        assert syncs == []  # appends never fsync or rotate inline
+        assert len(list(tmp_path.glob("ledger-*.jsonl"))) == 1
+        ledger.sync()
+        ledger.sync()
+        assert len(syncs) == 2  # one group commit, plus the index written on rotation
+
+    def test_append_does_not_wait_for_fsync(self, tmp_path, monkeypatch):
+        in_fsync, release = threading.Event(), threading.Event()
+
+        def slow_fsync(fd):
+            in_fsync.set()
+            release.wait(5)
+
+        ledger = PaymentLedger(str(tmp_path), segment_bytes=1000)
+        for i in range(20):
+            pay(ledger, nonce=i)  # past segment_bytes: the sync also rotates and checkpoints
+        monkeypatch.setattr("payment_ledger.os.fsync", slow_fsync)
+        syncing = threading.Thread(target=ledger.sync)
+        syncing.start()
+        assert in_fsync.wait(5)
+        started = time.monotonic()
+        pay(ledger, nonce=20)
+        assert ledger.totals()["count"] == 21
+        assert time.monotonic() - started < 0.5
+        release.set()
+        syncing.join()
+        monkeypatch.undo()
+        ledger.close()
+        assert sum(1 for _ in PaymentLedger(str(tmp_path)).records()) == 21
+
+    def test_rotation(self, tmp_path):
+        ledger = PaymentLedger(str(tmp_path), segment_bytes=1000)
+        for i in range(50):
+            pay(ledger, nonce=i)
+            if i % 5 == 4:
+                ledger.sync()
+        ledger.close()
+        segments = sorted(p.name for p in tmp_path.glob("ledger-*.jsonl"))
+        assert len(segments) > 1
+        assert sum(1 for _ in PaymentLedger(str(tmp_path)).records()) == 50
+
+    def test_reopen_replays_only_after_checkpoint(self, tmp_path):
+        ledger = PaymentLedger(str(tmp_path))
+        for i in range(5):
+            pay(ledger, nonce=i)
+        ledger.checkpoint()
+        for i in range(5, 8):
+            pay(ledger, nonce=i)
+        ledger.sync()  # crash without close: index is 3 records behind
+
+        reopened = PaymentLedger(str(tmp_path))
+        assert reopened.totals()["count"] == 8
+        assert reopened.revenue()["amount"] == 40000
+
+    def test_settled_ids_expire(self, tmp_path):
+        ledger = PaymentLedger(str(tmp_path), settled_retention=3600)
+        ledger.append({"type": "settlement", "ts": time.time() - 7200, "ids": ["0xaaa:1"]})
+        ledger.append({"type": "settlement", "ids": ["0xaaa:2"]})
+        assert ledger.is_settled("0xaaa:1")
+        ledger.checkpoint()
+        assert not ledger.is_settled("0xaaa:1")
+        ledger.close()
+        with open(tmp_path / "index.json") as f:
+            assert list(json.load(f)["settled"]) == ["0xaaa:2"]
+        assert PaymentLedger(str(tmp_path)).is_settled("0xaaa:2")
+
+    def test_torn_line_is_skipped(self, tmp_path):
+        ledger = PaymentLedger(str(tmp_path))
+        pay(ledger)
+        ledger.close()
+        with open(tmp_path / "ledger-000001.jsonl", "ab") as f:
+            f.write(b'{"type":"payment","ts":')
+        assert PaymentLedger(str(tmp_path)).totals()["count"] == 1
+
+
+class TestEndpoints:
+    """/inference records payments; /pricing and /revenue read the index"""
+
+    def payment(self, nonce):
+        return json.dumps({"payload": {"agentId": 1147, "authorization": {
+            "from": "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237", "nonce": nonce, "value": "5000"}}})
+
+    def test_paid_calls_are_recorded(self, server, client):
+        for nonce in range(3):
+            r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(nonce)})
+            assert r.status_code == 200
+        client.post("/inference", json={"prompt": "hi"})  # unpaid 402, not recorded
+
+        assert client.get("/pricing").json()["calls_served"] == 3
+        [record] = [r for r in server.ledger.records() if r["nonce"] == "2"]
+        assert record["agent_id"] == 1147
+        assert record["tokens"] == 42
+        assert record["latency_ms"] >= 0
+
+    def test_revenue_requires_admin(self, server, client, monkeypatch):
+        assert client.get("/revenue").status_code == 404
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "s3cret")
+        assert client.get("/revenue").status_code == 401
+        assert client.get("/revenue", headers={"Authorization": "Bearer s3crex"}).status_code == 401
+        assert client.get("/revenue", headers={"Authorization": "Bearer s3crét".encode("latin-1")}).status_code == 401
+
+        client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(9)})
+        r = client.get("/revenue", params={"payer": "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"},
+                       headers={"Authorization": "Bearer s3cret"})
+        assert r.status_code == 200
+        body = r.json()
+        assert body["window"]["amount_usdc"] == 0.005
+        assert body["payer"]["count"] == 1
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Tests for pre-rendered 402 bodies and the proxy's JSON codec
+"""
+
+import sys
+import json
+import importlib
+
+import json_codec
+from fred_x402_8004 import parse_payment_required
+
+
+def reference_body(server, price, resource):
+    return server.PaymentRequired(
+        accepts=[server.payment_requirements(price)],
+        maxAmountRequired=str(price),
+        resource=resource,
+    ).model_dump_json()
+
+
+class TestPaymentRequiredCache:
+    """Spliced bodies match what the pydantic model would render"""
+
+    def test_matches_model(self, server):
+        cache = server.PaymentRequiredCache()
+        for resource in ("http://proxy/inference", 'http://x/"quoted"\\path', "http://ü/π?q=1&r=\n"):
+            body = cache.body("/inference", 5000, resource)
+            assert json.loads(body) == json.loads(reference_body(server, 5000, resource))
+
+    def test_one_template_per_route_and_price(self, server):
+        cache = server.PaymentRequiredCache()
+        cheap = json.loads(cache.body("/inference", 1000, "r"))
+        dear = json.loads(cache.body("/inference", 9000, "r"))
+        assert (cheap["maxAmountRequired"], dear["maxAmountRequired"]) == ("1000", "9000")
+        assert len(cache._templates) == 2
+
+    def test_unpaid_request(self, client):
+        r = client.post("/inference", json={"prompt": "hi"})
+        assert r.status_code == 402
+        assert r.json()["resource"] == "http://testserver/inference"
+        assert parse_payment_required(r.json())[0] == 0.005
+
+
+class TestCodec:
+    """orjson and the stdlib fallback agree"""
+
+    def test_fallback(self, monkeypatch):
+        obj = {"a": [1, 2.5, None, True], "ü": "π\"\n"}
+        fast = json_codec.dumps(obj)
+        monkeypatch.setitem(sys.modules, "orjson", None)
+        fallback = importlib.reload(json_codec)
+        try:
+            assert fallback.BACKEND == "json"
+            assert fallback.loads(fallback.dumps(obj)) == obj == fallback.loads(fast)
+        finally:
+            monkeypatch.undo()
+            importlib.reload(json_codec)
+
+    def test_responses_use_codec(self, client):
+        assert client.get("/health").content == json_codec.dumps({"status": "ok", "x402_enabled": True})
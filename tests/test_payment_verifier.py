@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Tests for in-process EIP-3009 payment verification
+"""
+
+import json
+import base64
+import asyncio
+
+import pytest
+from eth_account import Account
+
+import x402_inference_server
+from fred_x402_8004 import FREDAgent, USDC_ADDRESS, parse_payment_required
+from payment_verifier import PaymentVerifier, VerificationError
+
+RECIPIENT = "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"
+REAL_VERIFY = x402_inference_server.verify_payment_header
+
+
+def agent(key=None):
+    """FREDAgent that can sign payments without touching the chain."""
+    fred = FREDAgent.__new__(FREDAgent)
+    fred.account = Account.from_key(key) if key else Account.create()
+    fred.address = fred.account.address
+    fred.agent_id = 1147
+    return fred
+
+
+def header(amount_usd=0.005, recipient=RECIPIENT, fred=None, **changes):
+    payment = (fred or agent()).create_x402_payment(recipient, amount_usd, "http://proxy/inference")
+    payment["payload"]["authorization"].update(changes)
+    return json.dumps(payment)
+
+
+def junk_signature(h):
+    """A 65-byte signature whose v byte no curve point matches."""
+    payment = json.loads(h)
+    payment["payload"]["signature"] = "0x" + "11" * 64 + "ff"
+    return json.dumps(payment)
+
+
+@pytest.fixture
+def verifier():
+    v = PaymentVerifier(RECIPIENT, USDC_ADDRESS, 5000, workers=0)
+    yield v
+    v.close()
+
+
+class TestVerify:
+    """Fields, time window and recovered signer"""
+
+    def test_agent_payment_verifies(self, verifier):
+        fred = agent()
+        payment = verifier.verify(header(fred=fred))
+        assert payment.payer == fred.address
+        assert payment.amount == 5000
+        assert payment.agent_id == 1147
+
+    def test_odd_price_survives_usd_round_trip(self):
+        # 983 micros is 982.9999... once converted to USD and back
+        price, _ = parse_payment_required({"maxAmountRequired": "983"})
+        verifier = PaymentVerifier(RECIPIENT, USDC_ADDRESS, 983, workers=0)
+        assert verifier.verify(header(price)).amount == 983
+
+    def test_base64_header(self, verifier):
+        assert verifier.verify(base64.b64encode(header().encode()).decode()).amount == 5000
+
+    @pytest.mark.parametrize("kwargs, reason", [
+        ({"amount_usd": 0.001}, "below price"),
+        ({"recipient": "0x000000000000000000000000000000000000dEaD"}, "pays"),
+        ({"validBefore": "1"}, "expired"),
+        ({"validAfter": str(2**40)}, "not yet valid"),
+    ])
+    def test_rejects(self, verifier, kwargs, reason):
+        with pytest.raises(VerificationError, match=reason):
+            verifier.verify(header(**kwargs))
+
+    def test_tampered_field_breaks_signature(self, verifier):
+        """Raising the value after signing recovers a different signer"""
+        with pytest.raises(VerificationError, match="signed by"):
+            verifier.verify(header(value="9000"))
+
+    def test_malformed(self, verifier):
+        for bad in ("not json", json.dumps({"payload": {}}), header(nonce="0x01")):
+            with pytest.raises(VerificationError):
+                verifier.verify(bad)
+
+    @pytest.mark.parametrize("bad", [
+        json.dumps({"payload": [1, 2]}),
+        json.dumps({"payload": {"authorization": "0xabc"}}),
+        header(**{"from": "not-an-address"}),
+        header(to=123),
+        junk_signature(header()),
+    ], ids=["payload", "authorization", "from", "to", "signature"])
+    def test_malformed_shapes_are_verification_errors(self, verifier, bad):
+        """Nothing a client sends may escape as another exception type (a 500)"""
+        with pytest.raises(VerificationError):
+            verifier.verify(bad)
+        with pytest.raises(VerificationError):
+            asyncio.run(verifier.averify(bad))
+
+
+class TestCache:
+    """Recovered signers are cached by digest and signature"""
+
+    def test_repeat_is_a_cache_hit(self, verifier):
+        h = header()
+        verifier.verify(h)
+        verifier.verify(h)
+        assert verifier.stats() == {"cache_size": 1, "hits": 1, "misses": 1}
+
+    def test_cached_signature_with_other_fields_is_rejected(self, verifier):
+        """The cache key covers the signed fields, not just the signature"""
+        h = header()
+        verifier.verify(h)
+        payment = json.loads(h)
+        payment["payload"]["authorization"]["value"] = "9000"
+        with pytest.raises(VerificationError, match="signed by"):
+            verifier.verify(json.dumps(payment))
+        assert verifier.misses == 2
+
+    def test_lru_bound(self):
+        v = PaymentVerifier(RECIPIENT, USDC_ADDRESS, 5000, workers=0, cache_size=2)
+        for _ in range(3):
+            v.verify(header())
+        assert v.stats()["cache_size"] == 2
+
+
+class TestBatch:
+    """verify_many keeps order and reports per-header errors"""
+
+    def test_batch_on_process_pool(self):
+        v = PaymentVerifier(RECIPIENT, USDC_ADDRESS, 5000, workers=2)
+        try:
+            headers = [header() for _ in range(6)] + [header(amount_usd=0.001), header(value="9000")]
+            results = v.verify_many(headers)
+        finally:
+            v.close()
+        assert all(r.amount == 5000 for r in results[:6])
+        assert isinstance(results[6], VerificationError)
+        assert isinstance(results[7], VerificationError)
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_bad_signature_does_not_abort_batch(self, workers):
+        v = PaymentVerifier(RECIPIENT, USDC_ADDRESS, 5000, workers=workers)
+        try:
+            results = v.verify_many([header(), junk_signature(header()), header()])
+        finally:
+            v.close()
+        assert results[0].amount == results[2].amount == 5000
+        assert isinstance(results[1], VerificationError)
+
+    def test_averify(self, verifier):
+        assert asyncio.run(verifier.averify(header())).amount == 5000
+
+
+class TestProxy:
+    """The proxy accepts signed payments and rejects anything else"""
+
+    @pytest.fixture
+    def real_verify(self, server, client, monkeypatch):
+        monkeypatch.setattr(server, "verify_payment_header", REAL_VERIFY)
+        server.verifier.workers = 0  # recover inline, no process pool
+
+    def test_signed_payment_accepted(self, real_verify, server, client):
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": header()})
+        assert r.status_code == 200
+        assert r.json()["payment_amount"] == 5000
+
+    def test_unsigned_header_is_402(self, real_verify, client):
+        payment = json.dumps({"payload": {"authorization": {"from": RECIPIENT, "nonce": 1, "value": "5000"}}})
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": payment})
+        assert r.status_code == 402
+
+    def test_junk_signature_is_402(self, real_verify, client):
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": junk_signature(header())})
+        assert r.status_code == 402
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for the proxy's profiling hooks and admin profiling endpoints
+"""
+
+import time
+import asyncio
+
+import pytest
+
+from profiling import LoopLagMonitor, RequestTimings, SlowRequestLog, mark
+
+ADMIN = {"Authorization": "Bearer s3cret"}
+
+
+@pytest.fixture
+def profiled(server, monkeypatch):
+    """Profiling on, every request counted as slow, fast lag sampling."""
+    monkeypatch.setattr(server, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(server.profiler, "enabled", True)
+    monkeypatch.setattr(server.profiler, "slow", SlowRequestLog(threshold_ms=0))
+    monkeypatch.setattr(server.profiler, "loop_lag", LoopLagMonitor(interval=0.01))
+    return server
+
+
+class TestOffByDefault:
+    """Nothing is collected or exposed unless X402_PROFILE is set"""
+
+    def test_disabled(self, server, client, monkeypatch):
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "s3cret")
+        observed = server.profiler.slow.observed
+        client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": "paid"})
+        assert server.profiler.slow.observed == observed
+        assert client.get("/admin/diagnostics", headers=ADMIN).status_code == 404
+        assert client.get("/admin/profile", headers=ADMIN).status_code == 404
+
+    def test_mark_outside_a_request(self):
+        mark("anything")  # no current request: no-op
+
+
+class TestPhaseTimings:
+    """Slow requests are kept with per-phase timings"""
+
+    def test_phases_of_a_paid_call(self, profiled, client, monkeypatch):
+        async def slow_llm(prompt, model, max_tokens, **kwargs):
+            await asyncio.sleep(0.1)
+            return profiled.LLMReply("ok", 1)
+
+        monkeypatch.setattr(profiled, "call_llm", slow_llm)
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": "paid"})
+        assert r.status_code == 200
+
+        [entry] = profiled.profiler.slow.requests
+        assert (entry["method"], entry["path"], entry["status"]) == ("POST", "/inference", 200)
+        assert list(entry["phases"]) == ["validate", "verify", "admission", "provider", "record", "respond"]
+        assert entry["phases"]["provider"] >= 100
+        assert entry["total_ms"] == pytest.approx(sum(entry["phases"].values()), abs=0.1)
+
+    def test_unpaid_and_failed_requests(self, profiled, client):
+        assert client.post("/inference", json={"prompt": "hi"}).status_code == 402
+        assert client.post("/inference", json={}).status_code == 422
+        statuses = [e["status"] for e in profiled.profiler.slow.requests]
+        assert statuses == [402, 422]
+
+    def test_threshold(self):
+        log = SlowRequestLog(threshold_ms=50)
+        fast = RequestTimings()
+        fast.mark("respond")
+        log.observe("GET", "/health", 200, fast)
+        assert (log.observed, log.slow) == (1, 0)
+
+
+class TestLoopLag:
+    """A blocked event loop shows up as lag"""
+
+    def test_detects_stall(self):
+        monitor = LoopLagMonitor(interval=0.01, stall_ms=50)
+
+        async def run():
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.05)
+            time.sleep(0.1)  # block the loop
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(run())
+        assert monitor.stalls >= 1
+        assert monitor.stats()["max_ms"] >= 50
+
+    def test_diagnostics(self, profiled, client):
+        time.sleep(0.05)
+        r = client.get("/admin/diagnostics", headers=ADMIN)
+        assert r.status_code == 200
+        assert r.json()["enabled"] is True
+        assert r.json()["loop_lag"]["samples"] > 0
+        assert "signer_cache" in r.json()
+
+
+class TestProfileEndpoint:
+    """Admin-only, time-boxed CPU and memory profiles"""
+
+    def test_requires_admin(self, profiled, client):
+        assert client.get("/admin/profile").status_code == 401
+
+    def test_cpu_profile(self, profiled, client):
+        r = client.get("/admin/profile", params={"mode": "cpu", "seconds": 0.2}, headers=ADMIN)
+        assert r.status_code == 200
+        body = r.json()
+        assert body["mode"] == "cpu" and body["samples"] > 0
+        assert body["top"] and sum(body["stacks"].values()) == body["samples"]
+
+    def test_memory_profile(self, profiled, client):
+        r = client.get("/admin/profile", params={"mode": "memory", "seconds": 0.1}, headers=ADMIN)
+        assert r.status_code == 200
+        assert r.json()["mode"] == "memory"
+        assert isinstance(r.json()["top"], list)
+
+    def test_bad_mode(self, profiled, client):
+        assert client.get("/admin/profile", params={"mode": "gpu"}, headers=ADMIN).status_code == 422
+
+    def test_duration_is_capped(self, profiled, client, monkeypatch):
+        import profiling
+
+        monkeypatch.setattr(profiling, "PROFILE_MAX_SECONDS", 0.1)
+        started = time.monotonic()
+        r = client.get("/admin/profile", params={"seconds": 60}, headers=ADMIN)
+        assert r.json()["seconds"] == 0.1
+        assert time.monotonic() - started < 5
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for provider prompt caching of fixed instruction prefixes
+"""
+
+import json
+
+import pytest
+
+import x402_inference_server
+from tests.stubs import StubAnthropic
+
+REAL_CALL_LLM = x402_inference_server.call_llm
+
+INSTRUCTIONS = " ".join(["Estimate carefully, using base rates and recent news."] * 40)
+
+
+def payment(nonce):
+    return json.dumps({"payload": {"authorization": {"from": "0xEEE", "nonce": nonce, "value": "5000"}}})
+
+
+@pytest.fixture
+def anthropic_stub(server, monkeypatch):
+    stub = StubAnthropic()
+    monkeypatch.setattr(server, "call_llm", REAL_CALL_LLM)
+    monkeypatch.setattr(server, "LLM_PROVIDER", "anthropic")
+    monkeypatch.setattr(server, "_llm_client", stub)
+    return stub
+
+
+class TestPromptCache:
+    """The system part is marked for caching and cache reads are reported"""
+
+    def test_second_call_reads_prefix_from_cache(self, anthropic_stub, client):
+        body = {"prompt": "Market: Will it rain? Price 0.55", "system": INSTRUCTIONS}
+        first = client.post("/inference", json=body, headers={"X-PAYMENT": payment(1)}).json()
+        second = client.post("/inference", json=body, headers={"X-PAYMENT": payment(2)}).json()
+
+        prefix = len(INSTRUCTIONS.split())
+        assert first["cache_read_tokens"] == 0
+        assert second["cache_read_tokens"] == prefix
+        assert first["tokens_used"] == second["tokens_used"]  # same work, cheaper input
+
+        system = anthropic_stub.requests[0]["system"]
+        assert system == [{"type": "text", "text": INSTRUCTIONS, "cache_control": {"type": "ephemeral"}}]
+        assert anthropic_stub.requests[0]["messages"][0]["content"] == body["prompt"]
+
+    def test_no_system_part(self, anthropic_stub, client):
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": payment(3)}).json()
+        assert r["cache_read_tokens"] == 0
+        assert anthropic_stub.requests[0]["system"] is None
+
+    def test_openai_cached_tokens(self, server, monkeypatch):
+        from types import SimpleNamespace
+        import asyncio
+
+        async def create(model, max_tokens, messages):
+            assert messages[0] == {"role": "system", "content": "rules"}
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+                usage=SimpleNamespace(total_tokens=1500, prompt_tokens_details=SimpleNamespace(cached_tokens=1024)),
+            )
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(server, "LLM_PROVIDER", "openai")
+        monkeypatch.setattr(server, "_llm_client", client)
+        reply = asyncio.run(REAL_CALL_LLM("q", "gpt-4o", 10, system="rules"))
+        assert reply == server.LLMReply("ok", 1500, 1024)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-endpoint RPC pool, against local stub JSON-RPC servers
+"""
+
+import time
+
+import pytest
+
+from rpc_pool import RPCPool, RPCError, EndpointUnavailable, make_web3
+from tests.stubs import StubRPC
+
+
+BLOCK = {"eth_blockNumber": "0x10", "eth_chainId": "0x2105"}
+
+
+class TestFailover:
+    """Unhealthy endpoints are skipped"""
+
+    def test_fails_over_on_http_error(self):
+        with StubRPC(BLOCK, status=503) as bad, StubRPC(BLOCK) as good:
+            pool = RPCPool([bad.url, good.url], hedge_delay=5)
+            assert pool.call("eth_blockNumber") == "0x10"
+            assert pool.endpoints[0].streak == 1
+
+    def test_failed_endpoint_is_ranked_last(self):
+        with StubRPC(BLOCK, status=429) as bad, StubRPC(BLOCK) as good:
+            pool = RPCPool([bad.url, good.url], hedge_delay=5)
+            pool.call("eth_blockNumber")
+            assert pool.ranked()[0].url == good.url
+
+            # The cooling-down endpoint is not asked again
+            pool.call("eth_blockNumber")
+            assert bad.count("eth_blockNumber") == 1
+
+    def test_all_endpoints_down(self):
+        with StubRPC(BLOCK, status=500) as a, StubRPC(BLOCK, status=500) as b:
+            pool = RPCPool([a.url, b.url], hedge_delay=5)
+            with pytest.raises(EndpointUnavailable):
+                pool.call("eth_blockNumber")
+
+    def test_rpc_error_is_an_answer(self):
+        """A node error like a revert is not a reason to fail over"""
+        with StubRPC({}) as a, StubRPC({}) as b:
+            pool = RPCPool([a.url, b.url], hedge_delay=5)
+            with pytest.raises(RPCError):
+                pool.call("eth_call", {}, "latest")
+            assert a.count("eth_call") + b.count("eth_call") == 1
+
+
+class TestHedgedReads:
+    """Slow reads are duplicated to a second endpoint"""
+
+    def test_hedge_wins_over_slow_primary(self):
+        with StubRPC(BLOCK, delay=1.0) as slow, StubRPC(BLOCK) as fast:
+            pool = RPCPool([slow.url, fast.url], hedge_delay=0.05)
+            start = time.monotonic()
+            assert pool.call("eth_blockNumber") == "0x10"
+            assert time.monotonic() - start < 0.8
+            assert fast.count("eth_blockNumber") == 1
+
+    def test_fast_primary_is_not_hedged(self):
+        with StubRPC(BLOCK) as a, StubRPC(BLOCK) as b:
+            pool = RPCPool([a.url, b.url], hedge_delay=1.0)
+            pool.call("eth_blockNumber")
+            assert a.count("eth_blockNumber") + b.count("eth_blockNumber") == 1
+
+    def test_writes_are_not_hedged(self):
+        sent = {"eth_sendRawTransaction": "0xabc"}
+        with StubRPC(sent, delay=0.3) as a, StubRPC(sent, delay=0.3) as b:
+            pool = RPCPool([a.url, b.url], hedge_delay=0.01)
+            assert pool.call("eth_sendRawTransaction", "0x00") == "0xabc"
+            time.sleep(0.35)
+            assert a.count("eth_sendRawTransaction") + b.count("eth_sendRawTransaction") == 1
+
+
+class TestBatchAndWeb3:
+    """Batches and the web3 provider go through the pool"""
+
+    def test_batch_preserves_order(self):
+        balances = {"eth_getBalance": lambda params: hex(int(params[0][-1], 16))}
+        with StubRPC(balances) as node:
+            pool = RPCPool([node.url])
+            results = pool.batch([("eth_getBalance", [f"0x{i}", "latest"]) for i in range(5)])
+            assert [int(r["result"], 16) for r in results] == [0, 1, 2, 3, 4]
+
+    def test_make_web3(self):
+        with StubRPC(BLOCK, status=503) as bad, StubRPC(BLOCK) as good:
+            w3 = make_web3([bad.url, good.url])
+            assert w3.eth.block_number == 16
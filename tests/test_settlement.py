@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Tests for deferred, batched settlement of verified x402 payments
+"""
+
+import json
+import time
+import asyncio
+import threading
+
+import settlement
+from payment_ledger import PaymentLedger
+from settlement import SettlementQueue, SettlementWorker
+
+
+class Settler:
+    """Records batches; fails the ids listed in `failing`."""
+
+    def __init__(self, failing=()):
+        self.batches = []
+        self.failing = set(failing)
+
+    async def __call__(self, batch):
+        self.batches.append([item["id"] for item in batch])
+        return [item["id"] not in self.failing for item in batch]
+
+
+def fill(worker, n, amount=5000):
+    for i in range(n):
+        worker.submit(f"0xaaa:{i}", f"header-{i}", amount)
+
+
+class TestQueue:
+    """Journal-backed queue survives restarts"""
+
+    def test_replay_keeps_only_unsettled(self, tmp_path):
+        queue = SettlementQueue(str(tmp_path))
+        for i in range(5):
+            queue.add(f"0xaaa:{i}", "h", 5000)
+        queue.done(["0xaaa:0", "0xaaa:1"])
+        queue.retry("0xaaa:2", now=100.0)
+        queue.close()
+
+        reopened = SettlementQueue(str(tmp_path))
+        assert list(reopened.pending) == ["0xaaa:2", "0xaaa:3", "0xaaa:4"]
+        assert reopened.pending["0xaaa:2"]["attempts"] == 1
+        assert reopened.exposure == 15000
+
+    def test_compaction(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settlement, "COMPACT_AFTER", 10)
+        queue = SettlementQueue(str(tmp_path))
+        for i in range(12):
+            queue.add(f"0xaaa:{i}", "h", 1)
+            if i < 11:
+                queue.done([f"0xaaa:{i}"])
+        queue.sync()  # compaction happens on the (threaded) sync, never in done()
+        queue.close()
+        lines = (tmp_path / settlement.QUEUE_FILE).read_text().splitlines()
+        assert len(lines) < 10
+        assert list(SettlementQueue(str(tmp_path)).pending) == ["0xaaa:11"]
+
+    def test_appends_are_group_committed(self, tmp_path, monkeypatch):
+        fsyncs = []
+        monkeypatch.setattr(settlement.os, "fsync", fsyncs.append)
+        queue = SettlementQueue(str(tmp_path))
+        for i in range(3):
+            queue.add(f"0xaaa:{i}", "h", 5000)
+        assert fsyncs == []  # request path: written, not fsynced
+        assert len(SettlementQueue(str(tmp_path)).pending) == 3
+        queue.sync()
+        queue.sync()  # nothing new since the last one
+        assert len(fsyncs) == 1
+        queue.close()
+
+    def test_add_does_not_wait_for_fsync(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settlement, "COMPACT_AFTER", 3)
+        in_fsync, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow_fsync(fd):
+            calls.append(fd)
+            if len(calls) == 2:  # the compacted journal's fsync
+                in_fsync.set()
+                release.wait(5)
+
+        queue = SettlementQueue(str(tmp_path))
+        for i in range(3):
+            queue.add(f"0xaaa:{i}", "h", 5000)
+        queue.done(["0xaaa:0"])
+        monkeypatch.setattr(settlement.os, "fsync", slow_fsync)
+        syncing = threading.Thread(target=queue.sync)
+        syncing.start()
+        assert in_fsync.wait(5)
+        started = time.monotonic()
+        queue.add("0xaaa:3", "h", 5000)
+        assert time.monotonic() - started < 0.5
+        queue.done(["0xaaa:1"])
+        release.set()
+        syncing.join()
+        monkeypatch.undo()
+        queue.close()
+        # Written mid-compaction, both survive the journal rewrite
+        assert list(SettlementQueue(str(tmp_path)).pending) == ["0xaaa:2", "0xaaa:3"]
+
+    def test_exposure_cap(self, tmp_path):
+        queue = SettlementQueue(str(tmp_path), max_unsettled=10000)
+        queue.add("0xaaa:1", "h", 5000)
+        assert queue.can_accept(5000)
+        queue.add("0xaaa:2", "h", 5000)
+        assert not queue.can_accept(1)
+
+    def test_reservations_count_against_the_cap(self, tmp_path):
+        queue = SettlementQueue(str(tmp_path), max_unsettled=10000)
+        assert queue.reserve(5000) and queue.reserve(5000)
+        assert not queue.reserve(1)
+        queue.release(5000)
+        queue.add("0xaaa:1", "h", 5000)
+        assert queue.exposure == 10000 and not queue.can_accept(1)
+
+
+class TestWorker:
+    """Batches by size or window, retries with backoff, marks the ledger"""
+
+    def test_waits_for_batch_or_window(self, tmp_path):
+        settler = Settler()
+        worker = SettlementWorker(SettlementQueue(str(tmp_path)), settler, batch_size=3, window=3600)
+        fill(worker, 2)
+        assert asyncio.run(worker.flush()) == 0
+        fill(worker, 4)
+        assert asyncio.run(worker.flush()) == 3
+        assert settler.batches == [["0xaaa:0", "0xaaa:1", "0xaaa:2"]]
+
+        worker.window = 0
+        assert asyncio.run(worker.flush()) == 1
+
+    def test_settled_ids_reach_the_ledger(self, tmp_path):
+        ledger = PaymentLedger(str(tmp_path))
+        worker = SettlementWorker(SettlementQueue(str(tmp_path)), Settler(), ledger, batch_size=2)
+        fill(worker, 2)
+        asyncio.run(worker.flush())
+        assert ledger.is_settled("0xaaa:1")
+        [record] = [r for r in ledger.records() if r["type"] == "settlement"]
+        assert record["amount"] == 10000
+
+    def test_batch_outcome_is_synced(self, tmp_path, monkeypatch):
+        queue = SettlementQueue(str(tmp_path))
+        worker = SettlementWorker(queue, Settler(), batch_size=2)
+        fill(worker, 2)
+        synced = []
+        monkeypatch.setattr(queue, "sync", lambda: synced.append(len(queue.pending)))
+        asyncio.run(worker.flush())
+        assert synced == [0]
+
+    def test_retry_then_give_up(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settlement, "SETTLE_MAX_ATTEMPTS", 2)
+        ledger = PaymentLedger(str(tmp_path))
+        queue = SettlementQueue(str(tmp_path))
+        worker = SettlementWorker(queue, Settler(failing={"0xaaa:1"}), ledger, batch_size=2)
+        fill(worker, 2)
+
+        asyncio.run(worker.flush())
+        assert list(queue.pending) == ["0xaaa:1"]
+        assert queue.pending["0xaaa:1"]["next_try"] > 0  # backing off
+
+        queue.pending["0xaaa:1"]["next_try"] = 0
+        asyncio.run(worker.flush(force=True))
+        assert not queue.pending
+        assert worker.status()["failed"] == 1
+        assert any(r["type"] == "settlement_failed" for r in ledger.records())
+
+
+class TestProxy:
+    """The request path only verifies and queues"""
+
+    def payment(self, nonce):
+        return json.dumps({"payload": {"authorization": {"from": "0xBBB", "nonce": nonce, "value": "5000"}}})
+
+    def test_paid_call_is_queued_not_settled(self, server, client):
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(1)})
+        assert r.status_code == 200
+        assert "0xbbb:1" in server.settlement.queue.pending
+        assert server.settled_batches == []
+
+    def test_reused_authorization_is_rejected(self, server, client):
+        client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(1)})
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(1)})
+        assert r.status_code == 402
+
+    def test_exposure_cap_sheds_load(self, server, client):
+        server.settlement.queue.max_unsettled = server.PRICE_PER_CALL
+        assert client.post("/inference", json={"prompt": "hi"},
+                           headers={"X-PAYMENT": self.payment(1)}).status_code == 200
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(2)})
+        assert r.status_code == 503
+        assert r.headers["Retry-After"] == "5"
+
+    def test_shutdown_waits_for_inflight_batch(self, server, caplog):
+        from fastapi.testclient import TestClient
+
+        class SlowSettler:
+            """Reports a cancelled batch as failed, as an HTTP client would."""
+
+            async def __call__(self, batch):
+                try:
+                    await asyncio.sleep(0.05)
+                except asyncio.CancelledError:
+                    pass
+                return [False] * len(batch)
+
+        server.make_settler = SlowSettler
+        with TestClient(server.app) as client:
+            client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(1)})
+            server.settlement.kick()
+            time.sleep(0.01)  # the batch is now awaiting the settler
+        assert "Settlement batch failed" not in caplog.text
+
+    def test_concurrent_requests_cannot_overshoot_cap(self, server, monkeypatch):
+        import httpx
+
+        async def slow_llm(prompt, model, max_tokens, **kwargs):
+            await asyncio.sleep(0.05)
+            return server.LLMReply("ok", 1)
+
+        monkeypatch.setattr(server, "call_llm", slow_llm)
+
+        async def run():
+            async with server.lifespan(server.app):
+                server.settlement.queue.max_unsettled = 2 * server.PRICE_PER_CALL
+                async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app),
+                                             base_url="http://proxy") as client:
+                    responses = await asyncio.gather(*(
+                        client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(i)})
+                        for i in range(6)))
+                    queue = server.settlement.queue
+                    return [r.status_code for r in responses], queue.exposure, queue.reserved
+
+        codes, exposure, reserved = asyncio.run(run())
+        assert sorted(codes) == [200, 200, 503, 503, 503, 503]
+        assert exposure == 2 * server.PRICE_PER_CALL and reserved == 0
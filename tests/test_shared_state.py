@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Tests for state shared between proxy worker processes
+"""
+
+import json
+import os
+import multiprocessing
+
+from payment_ledger import PaymentLedger
+from payment_verifier import CLOCK_SKEW
+from shared_state import SharedState, WorkerSlot, worker_directories
+
+
+def claim_all(directory, ids, results):
+    state = SharedState(directory)
+    results.put(sum(state.claim_nonce(pid) for pid in ids))
+    state.close()
+
+
+class TestSharedState:
+    """Nonce claims and counters through SQLite WAL"""
+
+    def test_each_nonce_accepted_once_across_processes(self, tmp_path):
+        ids = [f"0xaaa:{i}" for i in range(200)]
+        SharedState(str(tmp_path)).close()  # create the schema once
+        results = multiprocessing.get_context("fork").Queue()
+        workers = [multiprocessing.get_context("fork").Process(target=claim_all, args=(str(tmp_path), ids, results))
+                   for _ in range(4)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        assert sum(results.get() for _ in workers) == 200
+
+    def test_release_and_prune(self, tmp_path):
+        state = SharedState(str(tmp_path))
+        assert state.claim_nonce("a", expires=100.0)
+        assert not state.claim_nonce("a")
+        state.release_nonce("a")
+        assert state.claim_nonce("a", expires=100.0)
+        state.prune(now=200.0)
+        assert state.claim_nonce("a")
+
+    def test_nonce_outlives_verifier_clock_skew(self, tmp_path):
+        state = SharedState(str(tmp_path))
+        valid_before = 1000.0
+        assert state.claim_nonce("a", expires=valid_before)
+        # The verifier accepts the authorization until valid_before + CLOCK_SKEW
+        for now in (valid_before + 1, valid_before + CLOCK_SKEW):
+            state.prune(now=now)
+            assert not state.claim_nonce("a", expires=valid_before)
+
+    def test_windowed_counters(self, tmp_path):
+        state = SharedState(str(tmp_path))
+        for minute in range(5):
+            for _ in range(minute + 1):
+                state.hit("calls", 60, now=60_000 + minute * 60)
+        assert state.hit("calls", 0) == 1
+        assert state.count("calls", 60) == 15
+        assert state.count("calls", 60, start=60_000 + 180) == 9
+        state.prune(now=60_000 + 4 * 60, keep_windows=2)
+        assert state.count("calls", 60) == 12
+        assert state.count("calls", 0) == 1
+
+
+class TestWorkerSlot:
+    """Slots are exclusive and reused after release"""
+
+    def test_slots(self, tmp_path):
+        first, second = WorkerSlot(str(tmp_path)), WorkerSlot(str(tmp_path))
+        assert (first.slot, second.slot) == (0, 1)
+        assert first.directory == str(tmp_path)
+        assert worker_directories(str(tmp_path)) == [str(tmp_path), str(tmp_path / "worker-1")]
+        first.release()
+        assert WorkerSlot(str(tmp_path)).slot == 0
+
+
+class TestProxy:
+    """Workers share replay protection, rate limits and counts"""
+
+    def payment(self, nonce):
+        return json.dumps({"payload": {"authorization": {"from": "0xCCC", "nonce": nonce, "value": "5000"}}})
+
+    def test_nonce_claimed_by_another_worker(self, server, client):
+        SharedState(server.LEDGER_DIR).claim_nonce("0xccc:7")
+        r = client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(7)})
+        assert r.status_code == 402
+
+        client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(8)})
+        assert not SharedState(server.LEDGER_DIR).claim_nonce("0xccc:8")
+
+    def test_failed_call_releases_nonce(self, server, client, monkeypatch):
+        async def broken_llm(prompt, model, max_tokens, **kwargs):
+            raise RuntimeError("provider down")
+
+        monkeypatch.setattr(server, "call_llm", broken_llm)
+        assert client.post("/inference", json={"prompt": "hi"},
+                           headers={"X-PAYMENT": self.payment(1)}).status_code == 500
+        assert SharedState(server.LEDGER_DIR).claim_nonce("0xccc:1")
+        assert server.settlement.queue.exposure == 0  # its cap reservation is released too
+
+    def test_rate_limit(self, server, client, monkeypatch):
+        monkeypatch.setattr(server, "RATE_LIMIT", 2)
+        codes = [client.post("/inference", json={"prompt": "hi"},
+                             headers={"X-PAYMENT": self.payment(n)}).status_code for n in range(3)]
+        assert codes == [200, 200, 429]
+
+    def test_revenue_merges_worker_ledgers(self, server, client, monkeypatch):
+        monkeypatch.setattr(server, "ADMIN_TOKEN", "s3cret")
+        other = PaymentLedger(os.path.join(server.LEDGER_DIR, "worker-1"))
+        other.record_payment("0xCCC", 1147, 5000, "99", tokens=10, latency_ms=1.0)
+        other.close()
+        client.post("/inference", json={"prompt": "hi"}, headers={"X-PAYMENT": self.payment(1)})
+
+        body = client.get("/revenue", params={"payer": "0xccc"}, headers={"Authorization": "Bearer s3cret"}).json()
+        assert body["workers"] == 2
+        assert body["totals"]["count"] == 2
+        assert body["payer"]["amount"] == 10000
+        assert client.get("/pricing").json()["calls_served"] == 1
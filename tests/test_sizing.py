@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for vectorized edge / optimal-f position sizing
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from sizing import (
+    drawdown_scale,
+    edge,
+    kelly_fraction,
+    optimal_f,
+    r_multiple,
+    size_positions,
+)
+
+
+class TestFractions:
+    """Kelly / optimal-f for binary markets"""
+
+    def test_edge(self):
+        assert edge(0.70, 0.55) == pytest.approx(0.15)
+
+    def test_yes_and_no_sides(self):
+        f = kelly_fraction([0.70, 0.40], [0.50, 0.50])
+        assert f == pytest.approx([0.4, 0.2])
+
+    def test_matches_scalar_loop(self):
+        rng = np.random.default_rng(1)
+        p, c = rng.uniform(0.01, 0.99, 500), rng.uniform(0.01, 0.99, 500)
+        expected = [(pi - ci) / (1 - ci) if pi > ci else (ci - pi) / ci for pi, ci in zip(p, c)]
+        assert kelly_fraction(p, c) == pytest.approx(expected)
+
+    def test_optimal_f_equals_kelly_for_binary_bet(self):
+        """Vince's f on an even-money 60/40 history is the Kelly 0.2"""
+        trades = np.array([1.0] * 60 + [-1.0] * 40)
+        f, _ = optimal_f(trades)
+        assert f == pytest.approx(0.2, abs=1e-3)
+
+    def test_r_multiple(self):
+        assert r_multiple(0.50, 0.65, 0.45) == pytest.approx(3.0)
+
+
+class TestCaps:
+    """Per-market caps, scan exposure and drawdown"""
+
+    def test_position_cap_and_min_edge(self):
+        s = size_positions([0.70, 0.57, 0.30], [0.55, 0.55, 0.55], bankroll_usd=100)
+        assert s.trade.tolist() == [True, False, True]
+        assert s.side.tolist() == [1, 0, -1]
+        assert s.size_usd == pytest.approx([5.0, 0.0, 5.0])
+
+    def test_total_exposure_cap(self):
+        s = size_positions(np.full(100, 0.9), np.full(100, 0.5), max_total_pct=0.5)
+        assert s.fraction.sum() == pytest.approx(0.5)
+
+    def test_drawdown_scales_down(self):
+        assert drawdown_scale(0.0) == 1.0
+        assert drawdown_scale(0.125, 0.25) == 0.5
+        assert drawdown_scale(0.3, 0.25) == 0.0
+        s = size_positions([0.9], [0.5], drawdown=0.3, max_drawdown=0.25)
+        assert not s.trade.any()
+
+    def test_scan_of_100k_markets(self):
+        rng = np.random.default_rng(0)
+        prices = rng.uniform(0.02, 0.98, 100_000)
+        probs = np.clip(prices + rng.normal(0, 0.08, prices.size), 0.01, 0.99)
+        start = time.perf_counter()
+        s = size_positions(probs, prices)
+        assert time.perf_counter() - start < 0.5
+        assert s.size_usd.shape == prices.shape
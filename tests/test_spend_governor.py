@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Tests for the spend-rate governor (USDC token bucket + AIMD concurrency)
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from inference_router import InferenceRouter
+from market_pipeline import X402Estimator
+from spend_governor import SpendBucket, SpendGovernor
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def sign(recipient, amount_usd, resource):
+    return {"payload": {"authorization": {"to": recipient, "value": str(int(amount_usd * 1_000_000))}}}
+
+
+class Market:
+    question = "Will it rain?"
+    outcomes = [type("Outcome", (), {"name": "Yes", "price": 0.4})()]
+
+
+def proxy(paid_status=200, delay=0.0, seen=None):
+    """MockTransport handler: 402 without payment, `paid_status` with one."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if "X-PAYMENT" not in request.headers:
+            return httpx.Response(402, json={"accepts": [{"maxAmountRequired": "5000", "payTo": "0xFRED"}]})
+        if seen is not None:
+            seen["active"] += 1
+            seen["peak"] = max(seen["peak"], seen["active"])
+        await asyncio.sleep(delay)
+        if seen is not None:
+            seen["active"] -= 1
+        if paid_status != 200:
+            return httpx.Response(paid_status)
+        return httpx.Response(200, json={"probability": 0.6, "confidence": 0.8})
+    return handler
+
+
+class TestSpendBucket:
+    """Budget per window, refilled continuously"""
+
+    def test_take_and_refill(self):
+        clock = Clock()
+        bucket = SpendBucket(1.0, 10, clock)
+        assert bucket.take(0.6) == 0
+        assert bucket.take(0.6) == pytest.approx(2.0)  # $0.2 short at $0.1/s
+        clock.now += 2
+        assert bucket.take(0.6) == 0
+        clock.now += 100
+        assert bucket.available() == 1.0  # never above capacity
+
+    def test_refund_and_oversized(self):
+        bucket = SpendBucket(1.0, 10, Clock())
+        bucket.take(1.0)
+        bucket.give_back(0.25)
+        assert bucket.available() == pytest.approx(0.25)
+        with pytest.raises(ValueError):
+            bucket.take(2.0)
+
+
+class TestAIMD:
+    """Additive increase on good responses, multiplicative decrease on trouble"""
+
+    def test_additive_increase(self):
+        governor = SpendGovernor(initial_limit=4, max_limit=6)
+        for _ in range(5):  # about +1 per `limit` good responses
+            governor._observe(True, 200, 0.1)
+        assert governor.concurrency == 5
+        for _ in range(100):
+            governor._observe(True, 200, 0.1)
+        assert governor.concurrency == 6
+
+    @pytest.mark.parametrize("status", [429, 503, 402, None])
+    def test_backoff_signals(self, status):
+        governor = SpendGovernor(initial_limit=8)
+        governor._observe(False, status, None)
+        assert governor.concurrency == 4
+        assert governor.stats()["throttled"] == 1
+
+    def test_one_decrease_per_round_trip(self):
+        clock = Clock()
+        governor = SpendGovernor(initial_limit=16, clock=clock)
+        governor._observe(True, 200, 1.0)
+        for _ in range(5):
+            governor._observe(False, 503, None)
+        assert governor.concurrency == 8
+        clock.now += 1.0
+        governor._observe(False, 503, None)
+        assert governor.concurrency == 4
+        clock.now += 1.0
+        governor._observe(False, 400, None)  # client error: not a congestion signal
+        assert governor.concurrency == 4
+
+    def test_latency_rise_backs_off(self):
+        governor = SpendGovernor(initial_limit=8)
+        governor._observe(True, 200, 0.1)
+        governor._observe(True, 200, 0.5)
+        assert governor.concurrency == 4
+        assert governor.stats()["baseline_ms"] == 101.0  # best seen, drifting up 1% per sample
+
+
+class TestGovernedCalls:
+    """Slots, budget reservations and refunds"""
+
+    def test_queue_depth_and_fifo(self):
+        governor = SpendGovernor(initial_limit=1, max_limit=1)
+        order = []
+
+        async def run():
+            async def one(i):
+                async with governor.slot():
+                    order.append(i)
+                    await asyncio.sleep(0.01)
+
+            tasks = [asyncio.create_task(one(i)) for i in range(4)]
+            await asyncio.sleep(0.005)
+            stats = governor.stats()
+            await asyncio.gather(*tasks)
+            return stats
+
+        stats = asyncio.run(run())
+        assert (stats["in_flight"], stats["queued"]) == (1, 3)
+        assert order == [0, 1, 2, 3]
+        assert governor.stats()["in_flight"] == 0
+
+    def test_cancelled_waiter_leaves_queue(self):
+        governor = SpendGovernor(initial_limit=1, max_limit=1)
+
+        async def run():
+            await governor.acquire()
+            waiter = asyncio.create_task(governor.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            governor._release()
+
+        asyncio.run(run())
+        assert governor.stats()["queued"] == 0 and governor.in_flight == 0
+
+    def test_failed_paid_call_is_refunded(self):
+        governor = SpendGovernor(budget_usd=1.0)
+        with governor.slot_sync() as call:
+            call.pay_sync(0.25)
+            call.observe(503, 0.1)
+        with governor.slot_sync() as call:
+            call.pay_sync(0.25)
+            call.observe(200, 0.1)
+        stats = governor.stats()
+        assert stats["spent_usd"] == 0.25 and stats["refunded_usd"] == 0.25
+        assert stats["available_usd"] == pytest.approx(0.75, abs=1e-3)
+
+    def test_transport_error_stays_spent(self):
+        governor = SpendGovernor(budget_usd=1.0)
+        with pytest.raises(httpx.ReadTimeout):
+            with governor.slot_sync() as call:
+                call.pay_sync(0.25)
+                raise httpx.ReadTimeout("timed out")
+        assert governor.stats()["spent_usd"] == 0.25
+        assert governor.stats()["throttled"] == 1
+
+
+class TestIntegration:
+    """Estimator and router under a governor"""
+
+    def test_scan_never_overshoots_budget(self):
+        # $0.02 per 60s: four $0.005 calls, then the bucket refills ~1 call per 15s
+        governor = SpendGovernor(budget_usd=0.02, window=60, initial_limit=8)
+        estimator = X402Estimator("http://proxy/estimate", sign, structured=True, governor=governor,
+                                  client=httpx.AsyncClient(transport=httpx.MockTransport(proxy())))
+
+        async def run():
+            tasks = [asyncio.create_task(estimator(Market())) for _ in range(6)]
+            await asyncio.sleep(0.2)
+            stats = governor.stats()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            return stats, [t for t in tasks if not t.cancelled()]
+
+        stats, finished = asyncio.run(run())
+        assert len(finished) == 4
+        assert stats["spent_usd"] == pytest.approx(0.02)
+        assert stats["waiting_budget"] == 2
+        assert governor.stats()["waiting_budget"] == 0
+
+    def test_concurrency_adapts_to_errors(self):
+        governor = SpendGovernor(initial_limit=8)
+        seen = {"active": 0, "peak": 0}
+        estimator = X402Estimator("http://proxy/estimate", sign, structured=True, governor=governor,
+                                  client=httpx.AsyncClient(transport=httpx.MockTransport(proxy(503, 0.01, seen))))
+
+        async def run():
+            return await asyncio.gather(*(estimator(Market()) for _ in range(20)), return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert seen["peak"] <= 8
+        stats = governor.stats()
+        assert stats["concurrency_limit"] < 8
+        assert stats["spent_usd"] == 0 and stats["refunded_usd"] == pytest.approx(0.1)
+
+    def test_router_refunds_failed_proxy(self):
+        def handler(request):
+            if request.url.host == "a" and "X-PAYMENT" in request.headers:
+                return httpx.Response(503)
+            if "X-PAYMENT" not in request.headers:
+                return httpx.Response(402, json={"accepts": [{"maxAmountRequired": "5000", "payTo": "0xFRED"}]})
+            return httpx.Response(200, json={"response": "ok"})
+
+        governor = SpendGovernor(budget_usd=1.0)
+        router = InferenceRouter(["http://a/inference", "http://b/inference"], sign,
+                                 client=httpx.Client(transport=httpx.MockTransport(handler)), governor=governor)
+        router.endpoints[0].latency, router.endpoints[1].latency = 0.1, 0.5
+        assert router.request({"prompt": "hi"}) == {"response": "ok"}
+        stats = governor.stats()
+        assert stats["spent_usd"] == pytest.approx(0.005) and stats["refunded_usd"] == pytest.approx(0.005)
+        assert stats["in_flight"] == 0
+
+    def test_router_without_budget(self):
+        governor = SpendGovernor(budget_usd=0.001)
+        router = InferenceRouter(["http://a/inference"], sign, governor=governor,
+                                 client=httpx.Client(transport=httpx.MockTransport(
+                                     lambda r: httpx.Response(402, json={"maxAmountRequired": "5000"}))))
+        with pytest.raises(ValueError):
+            router.request({"prompt": "hi"})  # the price is more than the whole window's budget
+        assert governor.stats()["in_flight"] == 0
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Startup budget: importing the agent, proxy and treasury modules must stay
+cheap. Heavy dependencies (web3, eth_account, provider SDKs) load on first
+use, and nothing connects to the network at import time.
+"""
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROXY_DIR = os.path.join(ROOT, "fred-integration")
+
+# Cumulative -X importtime of the module itself, with headroom for slow CI.
+# FastAPI alone is ~300ms, hence the larger proxy budget.
+AGENT_BUDGET_MS = 400
+PROXY_BUDGET_MS = 1200
+
+HEAVY = ("web3", "eth_account", "anthropic", "openai")
+
+AGENT_MODULES = ["fred_x402_8004", "rpc_pool", "tx_builder", "tx_sequencer", "treasury_sweeper",
+                 "market_pipeline", "consolidate_funds", "unwrap_weth", "fred-8004-integration"]
+PROXY_MODULES = ["x402_inference_server", "payment_verifier", "settlement", "shared_state", "payment_ledger",
+                 "estimates"]
+
+PROBE = """
+import sys, socket
+
+def no_network(*args, **kwargs):
+    raise AssertionError("network access during import")
+
+socket.socket.connect = no_network
+socket.create_connection = no_network
+__import__(sys.argv[1])  # importlib.import_module is not traced by -X importtime
+loaded = [m for m in {heavy!r} if m in sys.modules]
+assert not loaded, f"imported at module load: {{loaded}}"
+"""
+
+
+def import_time_ms(module: str, cwd: str) -> float:
+    """Import `module` in a fresh interpreter; returns its cumulative import time."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(heavy=HEAVY), module],
+        cwd=cwd, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=cwd),
+    )
+    assert result.returncode == 0, result.stderr.splitlines()[-1]
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.split("|")[-1].strip() == module:
+            return int(line.split("|")[1]) / 1000
+    raise AssertionError(f"{module} not in -X importtime output")
+
+
+class TestStartup:
+    """Fresh-interpreter import of each module, no heavy deps, no network"""
+
+    @pytest.mark.parametrize("module", AGENT_MODULES)
+    def test_agent_modules(self, module):
+        assert import_time_ms(module, ROOT) < AGENT_BUDGET_MS
+
+    @pytest.mark.parametrize("module", PROXY_MODULES)
+    def test_proxy_modules(self, module):
+        assert import_time_ms(module, PROXY_DIR) < PROXY_BUDGET_MS
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for opt-in traffic capture and the replay tool
+"""
+
+import json
+
+import pytest
+
+import replay_traffic
+from fred_x402_8004 import USDC_ADDRESS
+from payment_verifier import PaymentVerifier
+from traffic_capture import TrafficRecorder, payment_outcome
+
+
+def read_capture(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.fixture
+def captured(server, tmp_path, monkeypatch):
+    """The proxy with X402_CAPTURE_FILE pointing at a temp file."""
+    path = tmp_path / "capture.jsonl"
+    monkeypatch.setattr(server, "CAPTURE_FILE", str(path))
+    return path
+
+
+class TestCapture:
+    """One line per HTTP request: timing, sizes and payment outcome, no bodies"""
+
+    def test_off_by_default(self, server, client):
+        client.get("/health")
+        assert not server.recorder.active
+
+    def test_records_requests(self, server, captured):
+        from fastapi.testclient import TestClient
+
+        with TestClient(server.app) as client:
+            client.get("/health")
+            client.post("/inference", json={"prompt": "a secret prompt"})
+            client.post("/inference", json={"prompt": "a secret prompt"}, headers={"X-PAYMENT": "paid"})
+        assert not server.recorder.active
+
+        header, *records = read_capture(captured)
+        assert header["capture"] == 1
+        assert [(r["method"], r["path"], r["status"], r["payment"]) for r in records] == [
+            ("GET", "/health", 200, "none"),
+            ("POST", "/inference", 402, "required"),
+            ("POST", "/inference", 200, "accepted"),
+        ]
+        assert records[1]["req"] == len(json.dumps({"prompt": "a secret prompt"}, separators=(",", ":")))
+        assert all(r["resp"] > 0 and r["ms"] >= 0 for r in records)
+        assert records[0]["t"] <= records[1]["t"] <= records[2]["t"]
+        assert "secret" not in captured.read_text()
+
+    def test_outcomes(self):
+        assert payment_outcome(False, 200) == "none"
+        assert payment_outcome(False, 402) == "required"
+        assert payment_outcome(True, 200) == "accepted"
+        assert payment_outcome(True, 402) == "rejected"
+        assert payment_outcome(True, 503) == "failed"
+
+    def test_inactive_recorder_ignores_records(self):
+        TrafficRecorder().record(0.0, "GET", "/health", 0, 10, 200, False)
+
+
+class TestReplay:
+    """Captured traffic re-sent in-process against stubs"""
+
+    def test_synth_body_size(self):
+        body = replay_traffic.synth_body("/inference", 300)
+        assert len(body) == 300 and json.loads(body)["prompt"]
+        assert replay_traffic.synth_body("/health", 0) is None
+
+    def test_signed_payments_verify(self, server):
+        headers = replay_traffic.sign_payments(2)
+        assert headers == replay_traffic.sign_payments(2)  # deterministic for a given seed
+        verifier = PaymentVerifier(server.RECIPIENT_ADDRESS, USDC_ADDRESS, server.PRICE_PER_CALL, workers=0)
+        try:
+            payers = {verifier.verify(h).payer for h in headers}
+        finally:
+            verifier.close()
+        assert len(payers) == 1
+
+    def test_replay_and_compare(self, server, tmp_path):
+        path = tmp_path / "capture.jsonl"
+        lines = [{"capture": 1, "started": 0}]
+        for i, (method, route, status, payment) in enumerate([
+            ("GET", "/health", 200, "none"),
+            ("POST", "/inference", 402, "required"),
+            ("POST", "/inference", 200, "accepted"),
+            ("POST", "/estimate", 200, "accepted"),
+            ("POST", "/estimate", 402, "rejected"),
+        ] * 4):
+            lines.append({"t": i * 0.001, "method": method, "path": route, "req": 0 if method == "GET" else 120,
+                          "resp": 100, "status": status, "ms": 2.0, "payment": payment})
+        path.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+
+        report = replay_traffic.run(str(path), speed=0, stub_verifier=True)
+        assert report["requests"] == 20
+        assert report["mismatched"] == 0
+        assert report["statuses"] == {"200": 12, "402": 8}
+        assert set(report["routes"]) == {"/health", "/inference", "/estimate"}
+        assert report["throughput_rps"] > 0 and report["latency_ms"]["p50"] is not None
+
+        lines = replay_traffic.compare(report, report)
+        assert any("throughput" in line and "+0.0%" in line for line in lines)
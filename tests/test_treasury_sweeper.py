@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched multi-wallet treasury sweeper
+"""
+
+from eth_account import Account
+
+from rpc_pool import make_web3
+from tx_sequencer import TxSequencer
+from treasury_sweeper import TreasurySweeper
+from tests.stubs import StubChain
+
+
+ETH = 10**18
+PAYMENT = "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"
+
+
+def treasury(chain, balances):
+    """Serve ETH/WETH balances keyed by address."""
+    eth = {a.lower(): b[0] for a, b in balances.items()}
+    weth = {a.lower(): b[1] for a, b in balances.items()}
+    chain.results["eth_getBalance"] = lambda params: hex(eth.get(params[0].lower(), 0))
+    chain.results["eth_call"] = lambda params: "0x" + hex(
+        weth.get("0x" + params[0]["data"][-40:], 0))[2:].zfill(64)
+
+
+def make_sweeper(chain, keys, **kwargs):
+    w3 = make_web3([chain.url])
+    return TreasurySweeper(w3, keys, payment_wallet=PAYMENT,
+                           sequencer=TxSequencer(w3, poll_interval=60), **kwargs)
+
+
+class TestBalances:
+    """All wallets are read in one JSON-RPC batch"""
+
+    def test_single_batch(self):
+        accounts = [Account.create() for _ in range(25)]
+        with StubChain() as chain:
+            treasury(chain, {a.address: (i * ETH, i) for i, a in enumerate(accounts)})
+            sweeper = make_sweeper(chain, [a.key for a in accounts])
+            posts = chain.posts
+            balances = sweeper.read_balances()
+            assert chain.posts == posts + 1
+            assert balances[accounts[3].address] == {"eth": 3 * ETH, "weth": 3}
+
+
+class TestPlanning:
+    """Moves are scheduled only when value beats gas by the threshold"""
+
+    def test_dust_is_left_alone(self):
+        rich, dust = Account.create(), Account.create()
+        with StubChain() as chain:
+            treasury(chain, {rich.address: (ETH, ETH), dust.address: (10**13, 10**9)})
+            sweeper = make_sweeper(chain, [rich.key, dust.key])
+            actions = sweeper.plan(sweeper.read_balances())
+            assert {(a.wallet, a.kind) for a in actions} == {
+                (rich.address, "unwrap"), (rich.address, "sweep")}
+
+    def test_sweep_reserves_gas(self):
+        account = Account.create()
+        with StubChain() as chain:
+            treasury(chain, {account.address: (ETH, 0)})
+            sweeper = make_sweeper(chain, [account.key], gas_reserve=10**14)
+            [sweep] = sweeper.plan(sweeper.read_balances())
+            assert sweep.amount == ETH - sweep.gas_cost - 10**14
+
+    def test_payment_wallet_only_unwraps(self):
+        with StubChain() as chain:
+            account = Account.create()
+            treasury(chain, {account.address: (ETH, ETH)})
+            sweeper = make_sweeper(chain, [account.key])
+            sweeper.payment_wallet = account.address
+            actions = sweeper.plan(sweeper.read_balances())
+            assert [a.kind for a in actions] == ["unwrap"]
+
+
+class TestRounds:
+    """Dry runs send nothing; live rounds are pipelined"""
+
+    def test_dry_run(self):
+        accounts = [Account.create() for _ in range(3)]
+        with StubChain() as chain:
+            treasury(chain, {a.address: (ETH, ETH) for a in accounts})
+            report = make_sweeper(chain, [a.key for a in accounts]).run_once(dry_run=True)
+            assert len(report["actions"]) == 6
+            assert all(a["status"] == "planned" for a in report["actions"])
+            assert chain.count("eth_sendRawTransaction") == 0
+
+    def test_live_round_and_inflight_skip(self):
+        accounts = [Account.create() for _ in range(3)]
+        with StubChain() as chain:
+            treasury(chain, {a.address: (ETH, ETH) for a in accounts})
+            sweeper = make_sweeper(chain, [a.key for a in accounts])
+            report = sweeper.run_once()
+            assert chain.count("eth_sendRawTransaction") == 6
+            assert all(a["status"] == "submitted" for a in report["actions"])
+
+            # Wallets with unmined sweeps are not swept twice
+            assert sweeper.run_once()["actions"] == []
+
+            chain.mine()
+            sweeper.sequencer.poll()
+            assert len(sweeper.run_once(dry_run=True)["actions"]) == 6
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared EIP-1559 transaction builder
+"""
+
+import time
+
+from eth_account import Account
+
+from rpc_pool import make_web3
+from tx_builder import TxBuilder, FeeOracle, TRANSFER_GAS
+from tests.stubs import StubRPC
+
+
+FRED = "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"
+WETH = "0x4200000000000000000000000000000000000006"
+
+CHAIN = {
+    "eth_feeHistory": {
+        "oldestBlock": "0x10",
+        "baseFeePerGas": ["0x3b9aca00", "0x3b9aca00"],  # 1 gwei
+        "gasUsedRatio": [0.5],
+        "reward": [["0x5f5e100"]],  # 0.1 gwei
+    },
+    "eth_estimateGas": "0x7530",  # 30000
+    "eth_getTransactionCount": "0x7",
+    "eth_chainId": "0x2105",
+}
+
+
+class TestFeeOracle:
+    """Fee quotes are cached and EIP-1559 shaped"""
+
+    def test_fee_fields(self):
+        with StubRPC(CHAIN) as node:
+            fees = FeeOracle(make_web3([node.url])).fees()
+            assert fees["maxPriorityFeePerGas"] == 100_000_000
+            assert fees["maxFeePerGas"] == 2 * 1_000_000_000 + 100_000_000
+
+    def test_burst_shares_one_lookup(self):
+        with StubRPC(CHAIN) as node:
+            builder = TxBuilder(make_web3([node.url]))
+            for _ in range(20):
+                builder.build({"from": FRED, "to": FRED}, nonce=0)
+            assert node.count("eth_feeHistory") == 1
+
+    def test_quote_expires(self):
+        with StubRPC(CHAIN) as node:
+            oracle = FeeOracle(make_web3([node.url]), ttl=0.01)
+            oracle.fees()
+            time.sleep(0.02)
+            oracle.fees()
+            assert node.count("eth_feeHistory") == 2
+
+
+class TestGasCache:
+    """Gas limits are estimated once per function selector"""
+
+    def test_transfer_uses_exact_gas(self):
+        with StubRPC(CHAIN) as node:
+            tx = TxBuilder(make_web3([node.url])).build({"from": FRED, "to": FRED})
+            assert tx["gas"] == TRANSFER_GAS
+            assert node.count("eth_estimateGas") == 0
+
+    def test_estimate_memoized_per_selector(self):
+        with StubRPC(CHAIN) as node:
+            builder = TxBuilder(make_web3([node.url]))
+            withdraw = "0x2e1a7d4d" + "00" * 31
+            for amount in range(1, 4):
+                tx = builder.build({"from": FRED, "to": WETH, "data": withdraw + f"{amount:02x}"})
+            assert tx["gas"] == 36000  # 30000 * 1.2 headroom
+            assert node.count("eth_estimateGas") == 1
+
+
+class TestBuild:
+    """Built transactions are signable type-2 transactions"""
+
+    def test_no_legacy_gas_price(self):
+        with StubRPC(CHAIN) as node:
+            tx = TxBuilder(make_web3([node.url])).build(
+                {"from": FRED, "to": FRED, "gasPrice": 1}
+            )
+            assert "gasPrice" not in tx
+            assert tx["type"] == 2
+            assert tx["nonce"] == 7
+            assert tx["chainId"] == 8453
+
+    def test_signable(self):
+        account = Account.create()
+        with StubRPC(CHAIN) as node:
+            tx = TxBuilder(make_web3([node.url])).build({"from": account.address, "to": FRED})
+            signed = account.sign_transaction(tx)
+            assert signed.raw_transaction[0] == 2  # EIP-2718 type byte
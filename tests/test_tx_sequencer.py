@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Tests for the pipelined transaction sequencer, against a stub dev chain
+"""
+
+import time
+
+from eth_account import Account
+
+from rpc_pool import make_web3
+from tx_sequencer import TxSequencer
+from tests.stubs import StubChain
+
+
+SKILL_WALLET = "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237"
+
+
+def transfer(value=1):
+    return {"to": SKILL_WALLET, "value": value}
+
+
+class TestNonces:
+    """Nonces are handed out locally"""
+
+    def test_back_to_back_nonces(self):
+        account = Account.create()
+        with StubChain(nonce=5) as chain:
+            seq = TxSequencer(make_web3([chain.url]), poll_interval=60)
+            for _ in range(10):
+                seq.submit(account, transfer())
+            assert chain.count("eth_getTransactionCount") == 1
+            assert chain.count("eth_sendRawTransaction") == 10
+            assert sorted(n for _, n in seq._pending) == list(range(5, 15))
+            seq.stop()
+
+
+class TestReceipts:
+    """One polling round resolves many futures"""
+
+    def test_batch_resolution(self):
+        account = Account.create()
+        with StubChain() as chain:
+            seq = TxSequencer(make_web3([chain.url]), poll_interval=60)
+            futures = [seq.submit(account, transfer(v)) for v in range(1, 21)]
+            seq.stop()
+
+            chain.mine()
+            assert seq.poll() == 20
+            assert all(f.result(timeout=0)["status"] == 1 for f in futures)
+            assert seq.pending == 0
+
+    def test_background_loop(self):
+        account = Account.create()
+        with StubChain() as chain:
+            seq = TxSequencer(make_web3([chain.url]), poll_interval=0.01)
+            future = seq.submit(account, transfer())
+            chain.mine()
+            assert future.result(timeout=2)["blockNumber"] == 2
+
+    def test_no_receipt_lookup_without_new_block(self):
+        account = Account.create()
+        with StubChain() as chain:
+            seq = TxSequencer(make_web3([chain.url]), poll_interval=60)
+            seq.submit(account, transfer())
+            seq.stop()
+            seq.poll()
+            seq.poll()
+            assert chain.count("eth_getTransactionReceipt") == 1
+
+
+class TestStuckTransactions:
+    """Stuck transactions are replaced with bumped fees"""
+
+    def test_replacement(self):
+        account = Account.create()
+        with StubChain() as chain:
+            seq = TxSequencer(make_web3([chain.url]), poll_interval=60)
+            future = seq.submit(account, transfer())
+            seq.stop()
+            # Only now: the loop's first poll must not replace it already
+            seq.stuck_after = 0.01
+            chain.stalled.update(chain.mempool)
+            original = dict(next(iter(seq._pending.values())).tx)
+
+            time.sleep(0.02)
+            seq.poll()
+            record = next(iter(seq._pending.values()))
+            assert len(record.hashes) == 2
+            assert record.tx["nonce"] == original["nonce"]
+            assert record.tx["maxFeePerGas"] > original["maxFeePerGas"]
+
+            chain.mine()
+            seq.poll()
+            assert future.result(timeout=0)["transactionHash"] == record.hashes[1]
+
+    def test_sweep_pays_the_bump_from_its_value(self):
+        account = Account.create()
+        with StubChain() as chain:
+            seq = TxSequencer(make_web3([chain.url]), poll_interval=60)
+            balance = 10**18
+            tx = {"to": SKILL_WALLET, **seq.builder.fee_oracle.fees()}
+            tx["value"] = balance - seq.builder.max_gas_cost(tx)
+            future = seq.submit(account, tx, sweep=True)
+            seq.stop()
+            seq.stuck_after = 0.01
+            chain.stalled.update(chain.mempool)
+            original = dict(next(iter(seq._pending.values())).tx)
+
+            time.sleep(0.02)
+            seq.poll()
+            record = next(iter(seq._pending.values()))
+            assert len(record.hashes) == 2
+            assert record.tx["maxFeePerGas"] > original["maxFeePerGas"]
+            assert record.tx["value"] < original["value"]
+            assert record.tx["value"] + record.tx["gas"] * record.tx["maxFeePerGas"] == balance
+
+            chain.mine()
+            seq.poll()
+            assert future.result(timeout=0)["transactionHash"] == record.hashes[1]
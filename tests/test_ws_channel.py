@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Tests for the deposit-paid /ws/inference channel and its client
+"""
+
+import time
+import socket
+import asyncio
+import threading
+
+import pytest
+
+from integration_test import MockMarket
+from inference_channel import ChannelError, InferenceChannel
+from market_pipeline import ChannelEstimator
+from spend_governor import SpendGovernor
+
+
+def deposit(nonce, value=25000, payer="0xDDD"):
+    return {"payload": {"authorization": {"from": payer, "nonce": nonce, "value": str(value)}}}
+
+
+@pytest.fixture
+def paid_by_value(server, monkeypatch):
+    """Verifier stub that accepts any deposit for its authorized value."""
+    async def by_value(header):
+        return int(server.parse_payment_header(header)["value"]) if header else None
+
+    monkeypatch.setattr(server, "verify_payment_header", by_value)
+    return server
+
+
+class TestPaidChannel:
+    """Server side: one deposit, per-frame debits, out-of-order replies"""
+
+    def test_offer_and_unpaid_request(self, paid_by_value, client):
+        server = paid_by_value
+        with client.websocket_connect("/ws/inference") as ws:
+            offer = ws.receive_json()
+            assert offer["type"] == "payment_required"
+            assert offer["price_per_call"] == server.PRICE_PER_CALL
+            assert offer["accepts"][0]["maxAmountRequired"] == str(server.PRICE_PER_CALL * offer["deposit_calls"])
+            assert offer["deposit_calls"] == server.ws_deposit_calls
+            ws.send_json({"type": "estimate", "id": "a", "question": "Will it rain?"})
+            assert ws.receive_json() == {"type": "error", "id": "a", "code": 402, "error": "Deposit exhausted"}
+
+    def test_deposit_then_debits(self, paid_by_value, client):
+        server = paid_by_value
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            assert ws.receive_json() == {"type": "deposited", "id": "d", "amount": 25000, "credit": 0,
+                                         "balance": 25000}
+            for i in range(5):
+                ws.send_json({"type": "estimate", "id": i, "question": f"Market {i}?"})
+            results = [ws.receive_json() for _ in range(5)]
+            assert sorted(r["id"] for r in results) == list(range(5))
+            assert all(r["type"] == "result" and r["probability"] == 0.62 for r in results)
+            ws.send_json({"type": "estimate", "id": 5, "question": "One too many?"})
+            assert ws.receive_json()["code"] == 402
+
+            # The deposit is settled once, not per call
+            assert list(server.settlement.queue.pending) == ["0xddd:1"]
+
+        calls = [r for r in server.ledger.records() if r.get("route") == server.WS_ROUTE]
+        assert len(calls) == 5 and {r["deposit"] for r in calls} == {"0xddd:1"}
+
+    def test_calls_join_their_deposit_settlement(self, paid_by_value, client):
+        server = paid_by_value
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            ws.receive_json()
+            ws.send_json({"type": "estimate", "id": "e", "question": "Will it rain?"})
+            ws.receive_json()
+        asyncio.run(server.settlement.flush(force=True))
+        [call] = [r for r in server.ledger.records() if r.get("route") == server.WS_ROUTE]
+        assert server.ledger.is_settled(call["deposit"])
+
+    def test_replies_out_of_order(self, paid_by_value, client, monkeypatch):
+        server = paid_by_value
+
+        async def slow_first(prompt, model, max_tokens, **kwargs):
+            await asyncio.sleep(0.3 if prompt == "slow" else 0)
+            return server.LLMReply(prompt, 1)
+
+        monkeypatch.setattr(server, "call_llm", slow_first)
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            ws.receive_json()
+            ws.send_json({"type": "inference", "id": "1", "prompt": "slow"})
+            ws.send_json({"type": "inference", "id": "2", "prompt": "fast"})
+            assert [ws.receive_json()["id"] for _ in range(2)] == ["2", "1"]
+
+    def test_failed_request_is_refunded(self, paid_by_value, client, monkeypatch):
+        server = paid_by_value
+
+        async def rambling(prompt, model, max_tokens, **kwargs):
+            return server.LLMReply("about 60%", 9)
+
+        monkeypatch.setattr(server, "call_llm", rambling)
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            ws.receive_json()
+            ws.send_json({"type": "estimate", "id": "e", "question": "Will it rain?"})
+            assert ws.receive_json()["code"] == 502
+            ws.send_json({"type": "balance", "id": "b"})
+            assert ws.receive_json()["balance"] == 25000
+
+    def test_replayed_deposit_and_carried_credit(self, paid_by_value, client):
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            ws.receive_json()
+            ws.send_json({"type": "estimate", "id": "e", "question": "Will it rain?"})
+            assert ws.receive_json()["balance"] == 20000
+
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            assert ws.receive_json()["error"] == "Payment authorization already used"
+            ws.send_json({"type": "deposit", "id": "d2", "payment": deposit(2)})
+            reply = ws.receive_json()
+            assert (reply["credit"], reply["balance"]) == (20000, 45000)
+
+    def test_ledger_records_each_call(self, paid_by_value, client):
+        server = paid_by_value
+        with client.websocket_connect("/ws/inference") as ws:
+            ws.receive_json()
+            ws.send_json({"type": "deposit", "id": "d", "payment": deposit(1)})
+            ws.receive_json()
+            for i in range(3):
+                ws.send_json({"type": "inference", "id": i, "prompt": "hi"})
+            [ws.receive_json() for _ in range(3)]
+            totals = server.ledger.totals()
+            assert (totals["count"], totals["amount"]) == (3, 3 * server.PRICE_PER_CALL)
+
+
+class TestDepositSizing:
+    """A deposit always fits the worker's share of the unsettled cap"""
+
+    def test_multi_worker_deposit_fits(self, paid_by_value, monkeypatch):
+        from fastapi.testclient import TestClient
+
+        server = paid_by_value
+        monkeypatch.setattr(server, "WORKERS", 4)
+        with TestClient(server.app) as client:
+            worker_cap = server.settlement.queue.max_unsettled
+            with client.websocket_connect("/ws/inference") as ws:
+                calls = ws.receive_json()["deposit_calls"]
+                assert 1 <= calls and calls * server.PRICE_PER_CALL * server.WS_DEPOSIT_SHARE <= worker_cap
+                for nonce in range(server.WS_DEPOSIT_SHARE):
+                    ws.send_json({"type": "deposit", "id": nonce,
+                                  "payment": deposit(nonce, value=calls * server.PRICE_PER_CALL)})
+                    assert ws.receive_json()["type"] == "deposited"
+                ws.send_json({"type": "deposit", "id": "big",
+                               "payment": deposit(99, value=(calls + 1) * server.PRICE_PER_CALL)})
+                assert ws.receive_json()["code"] == 413
+
+    def test_cap_too_small_fails_at_startup(self, server, monkeypatch):
+        monkeypatch.setattr(server, "MAX_UNSETTLED", server.PRICE_PER_CALL - 1)
+        with pytest.raises(RuntimeError, match="X402_MAX_UNSETTLED"):
+            server.deposit_calls_for(server.PRICE_PER_CALL - 1)
+
+
+@pytest.fixture
+def live_proxy(paid_by_value):
+    """The proxy on a real port (the client uses the websockets library)."""
+    import uvicorn
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    proxy = uvicorn.Server(uvicorn.Config(paid_by_value.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=proxy.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not proxy.started:
+        assert time.monotonic() < deadline, "proxy did not start"
+        time.sleep(0.01)
+    yield f"ws://127.0.0.1:{port}/ws/inference"
+    proxy.should_exit = True
+    thread.join(10)
+
+
+class TestInferenceChannel:
+    """Client side: pipelining, top-ups and price checks"""
+
+    @staticmethod
+    def signer():
+        nonces = iter(range(1, 1000))
+        signed = []
+
+        def sign(recipient, amount_usd, resource):
+            signed.append(amount_usd)
+            return deposit(next(nonces), value=round(amount_usd * 1_000_000))
+
+        return sign, signed
+
+    def test_pipelines_estimates_with_top_ups(self, live_proxy):
+        sign, signed = self.signer()
+
+        async def run():
+            async with InferenceChannel(live_proxy, sign, deposit_calls=20, low_water_calls=5) as channel:
+                estimate = ChannelEstimator(channel)
+                markets = [MockMarket(question=f"Market {i}?", price=0.4) for i in range(100)]
+                return await asyncio.gather(*(estimate(m) for m in markets))
+
+        results = asyncio.run(run())
+        assert results == [{"probability": 0.62, "confidence": 0.75}] * 100
+        assert len(signed) >= 5 and all(amount == pytest.approx(0.1) for amount in signed)
+
+    def test_deposit_capped_by_offer(self, paid_by_value, live_proxy):
+        sign, signed = self.signer()
+
+        async def run():
+            async with InferenceChannel(live_proxy, sign, deposit_calls=10_000) as channel:
+                return channel.calls_left
+
+        assert asyncio.run(run()) == paid_by_value.ws_deposit_calls
+        assert signed == [pytest.approx(paid_by_value.ws_deposit_calls * paid_by_value.PRICE_PER_CALL / 1_000_000)]
+
+    def test_scan_stops_at_governor_budget(self, live_proxy):
+        sign, signed = self.signer()
+        governor = SpendGovernor(budget_usd=0.2, window=3600)  # two deposits of 20 calls
+
+        async def run():
+            async with InferenceChannel(live_proxy, sign, deposit_calls=20, low_water_calls=5,
+                                        governor=governor) as channel:
+                estimate = ChannelEstimator(channel)
+                markets = [MockMarket(question=f"Market {i}?", price=0.4) for i in range(60)]
+                tasks = [asyncio.create_task(estimate(m)) for m in markets]
+                await asyncio.sleep(0.5)
+                done = sum(t.done() for t in tasks)
+                stats = governor.stats()
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                return done, stats
+
+        done, stats = asyncio.run(run())
+        assert done == 40
+        assert len(signed) == 2
+        assert stats["spent_usd"] == pytest.approx(0.2) and stats["waiting_budget"] == 1
+
+    def test_rejected_deposit_is_refunded(self, live_proxy):
+        governor = SpendGovernor(budget_usd=1.0)
+
+        def sign(recipient, amount_usd, resource):
+            return deposit(1, value=round(amount_usd * 1_000_000))  # same authorization every time
+
+        async def run():
+            async with InferenceChannel(live_proxy, sign, deposit_calls=20, governor=governor) as channel:
+                with pytest.raises(ChannelError) as error:
+                    await channel.deposit()  # replayed: the proxy refuses it
+                return error.value.code
+
+        assert asyncio.run(run()) == 402
+        stats = governor.stats()
+        assert stats["spent_usd"] == pytest.approx(0.1) and stats["refunded_usd"] == pytest.approx(0.1)
+
+    def test_dropped_connection_gives_the_call_back(self, paid_by_value, live_proxy, monkeypatch):
+        sign, _ = self.signer()
+
+        async def slow_llm(prompt, model, max_tokens, **kwargs):
+            await asyncio.sleep(1)
+            return paid_by_value.LLMReply('{"probability": 0.5, "confidence": 0.5}', 1)
+
+        monkeypatch.setattr(paid_by_value, "call_llm", slow_llm)
+
+        async def run():
+            channel = await InferenceChannel(live_proxy, sign, deposit_calls=3, low_water_calls=0).open()
+            pending = asyncio.create_task(channel.estimate("Will it rain?"))
+            await asyncio.sleep(0.1)
+            await channel._ws.close()  # the connection drops mid-call
+            with pytest.raises(Exception):
+                await pending
+            with pytest.raises(ConnectionError):
+                await channel.estimate("Still there?")  # never reaches the proxy
+            await channel.close()
+            return channel.calls_left
+
+        assert asyncio.run(run()) == 3
+
+    def test_rejects_overpriced_channel(self, live_proxy):
+        sign, signed = self.signer()
+
+        async def run():
+            async with InferenceChannel(live_proxy, sign, max_price_usd=0.001):
+                pass
+
+        with pytest.raises(ValueError, match="exceeds max"):
+            asyncio.run(run())
+        assert signed == []
+
+    def test_errors_are_not_charged(self, live_proxy):
+        sign, _ = self.signer()
+
+        async def run():
+            async with InferenceChannel(live_proxy, sign, deposit_calls=3, low_water_calls=0) as channel:
+                with pytest.raises(ChannelError) as error:
+                    await channel.infer("hi", max_tokens="lots")
+                assert error.value.code == 422
+                return channel.calls_left
+
+        assert asyncio.run(run()) == 3
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Treasury Sweeper for FRED
+
+Long-running replacement for running consolidate_funds.py and
+unwrap_weth.py by hand. Every round:
+
+  1. Read ETH and WETH balances of all configured wallets in ONE
+     JSON-RPC batch.
+  2. Schedule a WETH unwrap where the WETH is worth more than
+     SWEEP_MIN_GAS_MULTIPLE x its gas cost, and an ETH sweep to the
+     payment wallet under the same rule (keeping a small gas reserve).
+  3. Submit everything through the pipelined TxSequencer.
+
+LP fee revenue claimed as WETH therefore reaches the payment wallet
+without manual runs.
+
+Usage:
+    export SWEEP_PRIVATE_KEYS=0x...,0x...
+    python treasury_sweeper.py --dry-run --once    # report only
+    python treasury_sweeper.py --interval 300      # daemon
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from typing import Optional
+
+from rpc_pool import make_web3
+from tx_builder import TxBuilder, TRANSFER_GAS
+from tx_sequencer import TxSequencer
+
+logger = logging.getLogger(__name__)
+
+# ============ CONFIG ============
+
+PAYMENT_WALLET = os.getenv("PAYMENT_WALLET", "0xd5950fbB8393C3C50FA31a71faabc73C4EB2E237")
+WETH = "0x4200000000000000000000000000000000000006"
+
+# Private keys of wallets to sweep / unwrap, comma separated
+SWEEP_KEYS = [k.strip() for k in os.getenv("SWEEP_PRIVATE_KEYS", "").split(",") if k.strip()]
+
+# Only move value worth at least this many times its gas cost
+MIN_GAS_MULTIPLE = float(os.getenv("SWEEP_MIN_GAS_MULTIPLE", "10"))
+
+# ETH left in swept wallets to pay for future unwraps (wei)
+GAS_RESERVE = int(float(os.getenv("SWEEP_GAS_RESERVE_ETH", "0.0001")) * 10**18)
+
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", "300"))
+
+BALANCE_OF = "0x70a08231"
+
+WETH_ABI = [{"constant": False, "inputs": [{"name": "wad", "type": "uint256"}], "name": "withdraw",
+             "outputs": [], "payable": False, "stateMutability": "nonpayable", "type": "function"}]
+
+
+class SweepAction:
+    """One planned transfer or unwrap, and what happened to it."""
+
+    def __init__(self, wallet: str, kind: str, amount: int, gas_cost: int):
+        self.wallet = wallet
+        self.kind = kind  # "unwrap" | "sweep"
+        self.amount = amount
+        self.gas_cost = gas_cost
+        self.status = "planned"
+        self.tx_hash = None
+        self.future = None
+
+    def as_dict(self) -> dict:
+        return {
+            "wallet": self.wallet,
+            "kind": self.kind,
+            "amount_wei": self.amount,
+            "gas_cost_wei": self.gas_cost,
+            "status": self.status,
+            "tx_hash": self.tx_hash,
+        }
+
+
+class TreasurySweeper:
+    """Batched balance reads, threshold planning, pipelined submission."""
+
+    def __init__(
+        self,
+        w3,
+        keys: list[str],
+        payment_wallet: str = PAYMENT_WALLET,
+        min_gas_multiple: float = MIN_GAS_MULTIPLE,
+        gas_reserve: int = GAS_RESERVE,
+        sequencer: Optional[TxSequencer] = None,
+    ):
+        from eth_account import Account  # deferred: slow to import
+
+        self.w3 = w3
+        self.accounts = {a.address: a for a in (Account.from_key(k) for k in keys)}
+        self.payment_wallet = payment_wallet
+        self.min_gas_multiple = min_gas_multiple
+        self.gas_reserve = gas_reserve
+        self.sequencer = sequencer or TxSequencer(w3, TxBuilder(w3))
+        self.builder = self.sequencer.builder
+        self.weth = w3.eth.contract(address=WETH, abi=WETH_ABI)
+        self._inflight: dict[str, list[SweepAction]] = {}
+
+    # -- reads --
+
+    def read_balances(self) -> dict[str, dict]:
+        """ETH and WETH balances of every wallet, in one batch request."""
+        wallets = list(self.accounts)
+        calls = []
+        for wallet in wallets:
+            calls.append(("eth_getBalance", [wallet, "latest"]))
+            data = BALANCE_OF + wallet[2:].lower().zfill(64)
+            calls.append(("eth_call", [{"to": WETH, "data": data}, "latest"]))
+
+        responses = self.w3.provider.make_batch_request(calls)
+        if isinstance(responses, dict):
+            raise RuntimeError(f"Balance batch failed: {responses.get('error')}")
+
+        balances = {}
+        for i, wallet in enumerate(wallets):
+            eth, weth = responses[2 * i], responses[2 * i + 1]
+            balances[wallet] = {
+                "eth": int(eth.get("result") or "0x0", 16),
+                "weth": int(weth.get("result") or "0x0", 16),
+            }
+        return balances
+
+    # -- planning --
+
+    def plan(self, balances: dict[str, dict]) -> list[SweepAction]:
+        """Decide which unwraps and sweeps are worth their gas."""
+        max_fee = self.builder.fee_oracle.fees()["maxFeePerGas"]
+        transfer_cost = TRANSFER_GAS * max_fee
+        actions = []
+
+        for wallet, bal in balances.items():
+            if self._busy(wallet):
+                continue
+
+            eth = bal["eth"]
+            if bal["weth"] > 0:
+                unwrap_cost = self.builder.gas_cache.limit(self._unwrap_tx(wallet, bal["weth"])) * max_fee
+                if bal["weth"] >= unwrap_cost * self.min_gas_multiple and eth >= unwrap_cost:
+                    actions.append(SweepAction(wallet, "unwrap", bal["weth"], unwrap_cost))
+                    eth -= unwrap_cost
+
+            if wallet.lower() == self.payment_wallet.lower():
+                continue
+            # Unwrapped ETH only lands once the unwrap is mined; sweep it next round
+            amount = eth - transfer_cost - self.gas_reserve
+            if amount > 0 and amount >= transfer_cost * self.min_gas_multiple:
+                actions.append(SweepAction(wallet, "sweep", amount, transfer_cost))
+
+        return actions
+
+    def _unwrap_tx(self, wallet: str, amount: int) -> dict:
+        return {
+            "from": wallet,
+            "to": WETH,
+            "data": self.weth.encode_abi("withdraw", args=[amount]),
+        }
+
+    def _busy(self, wallet: str) -> bool:
+        """A wallet with unmined sweeps is skipped until they land."""
+        actions = self._inflight.get(wallet, [])
+        actions = [a for a in actions if a.future is not None and not a.future.done()]
+        if actions:
+            self._inflight[wallet] = actions
+        else:
+            self._inflight.pop(wallet, None)
+        return bool(actions)
+
+    # -- execution --
+
+    def execute(self, actions: list[SweepAction]):
+        """Submit all actions back to back; does not wait for receipts."""
+        fees = self.builder.fee_oracle.fees()
+        for action in actions:
+            account = self.accounts[action.wallet]
+            if action.kind == "unwrap":
+                tx = self._unwrap_tx(action.wallet, action.amount)
+            else:
+                tx = {"to": self.payment_wallet, "value": action.amount}
+            # Same fee quote the plan used, so reservations hold
+            tx.update(fees)
+            action.future = self.sequencer.submit(account, tx)
+            if action.future.done() and action.future.exception() is not None:
+                action.status = f"failed: {action.future.exception()}"
+                continue
+            action.tx_hash = action.future.tx_hash
+            action.status = "submitted"
+            self._inflight.setdefault(action.wallet, []).append(action)
+
+    def run_once(self, dry_run: bool = False, wait: bool = False) -> dict:
+        """One sweep round. Returns a report dict."""
+        started = time.monotonic()
+        balances = self.read_balances()
+        actions = self.plan(balances)
+
+        if not dry_run:
+            self.execute(actions)
+            if wait:
+                for action in actions:
+                    if action.future is None or action.status != "submitted":
+                        continue
+                    receipt = action.future.result()
+                    action.status = "confirmed" if receipt.get("status") == 1 else "reverted"
+
+        return {
+            "dry_run": dry_run,
+            "wallets": len(balances),
+            "total_eth_wei": sum(b["eth"] for b in balances.values()),
+            "total_weth_wei": sum(b["weth"] for b in balances.values()),
+            "balances": balances,
+            "actions": [a.as_dict() for a in actions],
+            "elapsed_s": round(time.monotonic() - started, 3),
+        }
+
+    def run(self, interval: float = SWEEP_INTERVAL, dry_run: bool = False):
+        """Sweep forever, every `interval` seconds."""
+        while True:
+            try:
+                print_report(self.run_once(dry_run=dry_run))
+            except Exception as e:
+                logger.error(f"Sweep round failed: {e}")
+            time.sleep(interval)
+
+
+def print_report(report: dict):
+    eth = report["total_eth_wei"] / 10**18
+    weth = report["total_weth_wei"] / 10**18
+    mode = " (dry run)" if report["dry_run"] else ""
+    print(f"=== Treasury sweep{mode}: {report['wallets']} wallets, "
+          f"{eth:.6f} ETH + {weth:.6f} WETH ===")
+    for wallet, bal in report["balances"].items():
+        print(f"  {wallet}: {bal['eth'] / 10**18:.6f} ETH, {bal['weth'] / 10**18:.6f} WETH")
+    if not report["actions"]:
+        print("  Nothing worth moving this round")
+    for action in report["actions"]:
+        line = (f"  {action['kind']:6} {action['amount_wei'] / 10**18:.6f} from {action['wallet']}"
+                f" (gas ≤ {action['gas_cost_wei'] / 10**18:.8f}) → {action['status']}")
+        if action["tx_hash"]:
+            line += f"  https://basescan.org/tx/{action['tx_hash']}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep FRED treasury wallets to the payment wallet")
+    parser.add_argument("--dry-run", action="store_true", help="plan and report, send nothing")
+    parser.add_argument("--once", action="store_true", help="run a single round and exit")
+    parser.add_argument("--interval", type=float, default=SWEEP_INTERVAL, help="seconds between rounds")
+    args = parser.parse_args(argv)
+
+    if not SWEEP_KEYS:
+        print("⚠️  Set SWEEP_PRIVATE_KEYS (comma separated) to sweep wallets")
+        return 1
+
+    sweeper = TreasurySweeper(make_web3(), SWEEP_KEYS)
+    if args.once:
+        print_report(sweeper.run_once(dry_run=args.dry_run, wait=not args.dry_run))
+        return 0
+    sweeper.run(interval=args.interval, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Transaction Builder for FRED
+
+One place to turn a call into a signed-ready EIP-1559 transaction:
+
+  - FeeOracle: maxFeePerGas / maxPriorityFeePerGas from a single
+    eth_feeHistory call, cached for FEE_TTL seconds so bursts of
+    transactions share one lookup.
+  - GasCache: eth_estimateGas memoized per (contract, function selector),
+    with headroom, instead of hardcoded 200000 / 50000 limits.
+
+Usage:
+    builder = TxBuilder(w3)
+    tx = builder.build({
+        "from": address,
+        "to": WETH,
+        "data": weth.encode_abi("withdraw", args=[amount]),
+    })
+"""
+
+import os
+import time
+import threading
+from typing import Optional
+
+# ============ CONFIG ============
+
+CHAIN_ID = 8453
+
+# How long a fee quote is reused
+FEE_TTL = float(os.getenv("FEE_TTL", "2"))
+
+# maxFeePerGas = base fee * multiplier + tip (survives base fee rises)
+BASE_FEE_MULTIPLIER = 2
+
+# Tip percentile from recent blocks, and a floor for empty blocks
+PRIORITY_PERCENTILE = 50
+MIN_PRIORITY_FEE = int(os.getenv("MIN_PRIORITY_FEE_WEI", "1000000"))  # 0.001 gwei
+
+# Multiplier on estimated gas for contract calls; plain transfers are exact
+GAS_HEADROOM = 1.2
+TRANSFER_GAS = 21000
+
+
+# ============ FEES ============
+
+class FeeOracle:
+    """EIP-1559 fee quotes from eth_feeHistory, cached for a short TTL."""
+
+    def __init__(self, w3, ttl: float = FEE_TTL):
+        self.w3 = w3
+        self.ttl = ttl
+        self.lookups = 0
+        self._quote = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def fees(self) -> dict:
+        """Return {"maxFeePerGas", "maxPriorityFeePerGas"} in wei."""
+        with self._lock:
+            now = time.monotonic()
+            if self._quote is None or now >= self._expires:
+                self._quote = self._fetch()
+                self._expires = now + self.ttl
+            return dict(self._quote)
+
+    def invalidate(self):
+        with self._lock:
+            self._quote = None
+
+    def _fetch(self) -> dict:
+        self.lookups += 1
+        history = self.w3.eth.fee_history(1, "pending", [PRIORITY_PERCENTILE])
+        # Last entry is the base fee of the block after the newest one
+        base_fee = int(history["baseFeePerGas"][-1])
+        rewards = history.get("reward") or [[0]]
+        tip = max(int(rewards[-1][0]), MIN_PRIORITY_FEE)
+        return {
+            "maxFeePerGas": base_fee * BASE_FEE_MULTIPLIER + tip,
+            "maxPriorityFeePerGas": tip,
+        }
+
+
+# ============ GAS ============
+
+def selector(tx: dict) -> str:
+    """Function selector of a call, or "0x" for a plain transfer."""
+    data = tx.get("data") or "0x"
+    if isinstance(data, bytes):
+        data = "0x" + data.hex()
+    return data[:10].lower()
+
+
+class GasCache:
+    """eth_estimateGas results memoized per (to, selector)."""
+
+    def __init__(self, w3, headroom: float = GAS_HEADROOM):
+        self.w3 = w3
+        self.headroom = headroom
+        self.estimates = 0
+        self._limits: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, tx: dict) -> int:
+        sel = selector(tx)
+        if sel == "0x":
+            return TRANSFER_GAS
+
+        key = ((tx.get("to") or "").lower(), sel)
+        with self._lock:
+            cached = self._limits.get(key)
+        if cached is not None:
+            return cached
+
+        call = {k: tx[k] for k in ("from", "to", "data", "value") if k in tx}
+        self.estimates += 1
+        limit = int(self.w3.eth.estimate_gas(call) * self.headroom)
+        with self._lock:
+            self._limits[key] = limit
+        return limit
+
+    def forget(self, tx: dict):
+        """Drop a cached limit, e.g. after an out-of-gas failure."""
+        with self._lock:
+            self._limits.pop(((tx.get("to") or "").lower(), selector(tx)), None)
+
+
+# ============ BUILDER ============
+
+class TxBuilder:
+    """Fills nonce, gas and EIP-1559 fee fields for a transaction."""
+
+    def __init__(
+        self,
+        w3,
+        chain_id: int = CHAIN_ID,
+        fee_oracle: Optional[FeeOracle] = None,
+        gas_cache: Optional[GasCache] = None,
+    ):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.fee_oracle = fee_oracle or FeeOracle(w3)
+        self.gas_cache = gas_cache or GasCache(w3)
+
+    def build(self, tx: dict, nonce: Optional[int] = None) -> dict:
+        """
+        Complete a transaction dict ("from", "to", optional "data"/"value").
+
+        Explicit "gas" or fee fields in `tx` are kept as given.
+        """
+        built = {k: v for k, v in tx.items() if k != "gasPrice"}
+        built.setdefault("value", 0)
+        built["chainId"] = self.chain_id
+        built["type"] = 2
+        if "nonce" not in built:
+            built["nonce"] = (
+                nonce if nonce is not None
+                else self.w3.eth.get_transaction_count(built["from"], "pending")
+            )
+        if "gas" not in built:
+            built["gas"] = self.gas_cache.limit(built)
+        for field, value in self.fee_oracle.fees().items():
+            built.setdefault(field, value)
+        return built
+
+    def max_gas_cost(self, tx: dict) -> int:
+        """Worst-case wei reserved for gas by `tx`, built or not."""
+        gas = tx.get("gas") or self.gas_cache.limit(tx)
+        max_fee = tx.get("maxFeePerGas") or self.fee_oracle.fees()["maxFeePerGas"]
+        return gas * max_fee
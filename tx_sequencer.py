@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Transaction Sequencer for FRED
+
+Submits many transactions back to back instead of one per block:
+
+  - Local nonces per wallet: the chain is asked once, after that nonces are
+    handed out in memory, so sends never wait on the previous receipt.
+  - One shared polling thread: on each new block, receipts for every
+    pending transaction are fetched in a single JSON-RPC batch and their
+    futures resolved together.
+  - Stuck transactions (no receipt after STUCK_AFTER seconds) are re-signed
+    with the same nonce and fees bumped by FEE_BUMP. A max-send (submitted
+    with sweep=True) pays the bump out of its value, so value plus the gas
+    reservation still fits the balance.
+
+Usage:
+    seq = TxSequencer(w3)
+    futures = [seq.submit(account, {"from": addr, "to": dest, "value": v}) for ...]
+    receipts = [f.result() for f in futures]
+
+Point BASE_RPC_URLS at a local dev chain (anvil, hardhat) to try it out.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Optional
+
+from tx_builder import TxBuilder
+
+logger = logging.getLogger(__name__)
+
+# ============ CONFIG ============
+
+POLL_INTERVAL = float(os.getenv("TX_POLL_INTERVAL", "1.0"))
+
+# Seconds without a receipt before a transaction is replaced
+STUCK_AFTER = float(os.getenv("TX_STUCK_AFTER", "30"))
+
+# Replacement fee multiplier (nodes require >= 10% on both fee fields)
+FEE_BUMP = 1.125
+
+# Give up replacing after this many attempts and keep waiting
+MAX_REPLACEMENTS = 5
+
+RECEIPT_INT_FIELDS = ("blockNumber", "status", "gasUsed", "effectiveGasPrice", "transactionIndex")
+
+
+class NonceManager:
+    """Hands out nonces per wallet from a local counter."""
+
+    def __init__(self, w3):
+        self.w3 = w3
+        self._next: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def next(self, address: str) -> int:
+        with self._lock:
+            if address not in self._next:
+                self._next[address] = self.w3.eth.get_transaction_count(address, "pending")
+            nonce = self._next[address]
+            self._next[address] = nonce + 1
+            return nonce
+
+    def reset(self, address: str):
+        """Forget the local counter; the next nonce is read from the chain."""
+        with self._lock:
+            self._next.pop(address, None)
+
+
+class PendingTx:
+    """A submitted transaction and every hash sent for its nonce."""
+
+    def __init__(self, account, tx: dict, tx_hash: str, future: Future, sweep: bool = False):
+        self.account = account
+        self.tx = tx
+        self.sweep = sweep
+        self.hashes = [tx_hash]
+        self.future = future
+        self.sent_at = time.monotonic()
+        self.replacements = 0
+
+
+def _format_receipt(raw: dict) -> dict:
+    receipt = dict(raw)
+    for field in RECEIPT_INT_FIELDS:
+        if isinstance(receipt.get(field), str):
+            receipt[field] = int(receipt[field], 16)
+    return receipt
+
+
+class TxSequencer:
+    """Pipelined transaction submission with shared receipt tracking."""
+
+    def __init__(
+        self,
+        w3,
+        builder: Optional[TxBuilder] = None,
+        poll_interval: float = POLL_INTERVAL,
+        stuck_after: float = STUCK_AFTER,
+    ):
+        self.w3 = w3
+        self.builder = builder or TxBuilder(w3)
+        self.nonces = NonceManager(w3)
+        self.poll_interval = poll_interval
+        self.stuck_after = stuck_after
+        self._pending: dict[tuple[str, int], PendingTx] = {}
+        self._lock = threading.Lock()
+        self._wallet_locks: dict[str, threading.Lock] = {}
+        self._last_block = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- submission --
+
+    def submit(self, account, tx: dict, sweep: bool = False) -> Future:
+        """
+        Sign and send `tx` from `account` (LocalAccount or private key).
+
+        With `sweep`, `tx` sends the whole balance minus its gas reservation;
+        replacements then lower the value by what the fee bump adds.
+
+        Returns a Future resolving to the receipt once mined; the first
+        hash sent is available as `future.tx_hash`.
+        """
+        if isinstance(account, str):
+            from eth_account import Account  # deferred: slow to import
+
+            account = Account.from_key(account)
+        tx = dict(tx, **{"from": account.address})
+        future = Future()
+
+        with self._wallet_lock(account.address):
+            nonce = self.nonces.next(account.address)
+            try:
+                built = self.builder.build(tx, nonce=nonce)
+                tx_hash = self._send(account, built)
+            except Exception as e:
+                # Later nonces would queue behind the gap; resync from chain
+                self.nonces.reset(account.address)
+                future.set_exception(e)
+                return future
+
+        future.tx_hash = tx_hash
+        with self._lock:
+            self._pending[(account.address, nonce)] = PendingTx(account, built, tx_hash, future, sweep)
+        self.start()
+        return future
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _wallet_lock(self, address: str) -> threading.Lock:
+        with self._lock:
+            return self._wallet_locks.setdefault(address, threading.Lock())
+
+    def _send(self, account, tx: dict) -> str:
+        signed = account.sign_transaction(tx)
+        tx_hash = self.w3.eth.send_raw_transaction(signed.raw_transaction)
+        return "0x" + bytes(tx_hash).hex()
+
+    # -- receipt tracking --
+
+    def poll(self) -> int:
+        """
+        One round of the polling loop. Returns the number of futures resolved.
+        """
+        with self._lock:
+            records = list(self._pending.items())
+        if not records:
+            return 0
+
+        block = self.w3.eth.block_number
+        resolved = 0
+        if block != self._last_block:
+            self._last_block = block
+            resolved = self._check_receipts(records)
+
+        self._replace_stuck()
+        return resolved
+
+    def _check_receipts(self, records) -> int:
+        lookups = [(key, h) for key, record in records for h in record.hashes]
+        responses = self.w3.provider.make_batch_request(
+            [("eth_getTransactionReceipt", [h]) for _, h in lookups]
+        )
+        if isinstance(responses, dict):
+            logger.warning(f"Receipt batch failed: {responses.get('error')}")
+            return 0
+
+        resolved = 0
+        for (key, _), response in zip(lookups, responses):
+            raw = response.get("result")
+            if not raw:
+                continue
+            with self._lock:
+                record = self._pending.pop(key, None)
+            if record is not None:
+                record.future.set_result(_format_receipt(raw))
+                resolved += 1
+        return resolved
+
+    def _replace_stuck(self):
+        now = time.monotonic()
+        with self._lock:
+            stuck = [
+                r for r in self._pending.values()
+                if now - r.sent_at > self.stuck_after and r.replacements < MAX_REPLACEMENTS
+            ]
+        for record in stuck:
+            fees = self.builder.fee_oracle.fees()
+            tx = dict(record.tx)
+            for field in ("maxFeePerGas", "maxPriorityFeePerGas"):
+                tx[field] = max(int(tx[field] * FEE_BUMP) + 1, fees[field])
+            if record.sweep:
+                # The balance is fixed: value + gas * maxFeePerGas must not grow
+                tx["value"] -= tx["gas"] * (tx["maxFeePerGas"] - record.tx["maxFeePerGas"])
+                if tx["value"] <= 0:
+                    logger.warning(f"Not replacing sweep nonce {tx['nonce']}: bumped gas exceeds its value")
+                    record.replacements = MAX_REPLACEMENTS
+                    continue
+            try:
+                tx_hash = self._send(record.account, tx)
+            except Exception as e:
+                # Usually "nonce too low": the original got mined meanwhile
+                logger.warning(f"Replacement for nonce {tx['nonce']} failed: {e}")
+                record.sent_at = now
+                continue
+            logger.info(f"Replaced stuck nonce {tx['nonce']} with {tx_hash}")
+            record.tx = tx
+            record.hashes.append(tx_hash)
+            record.sent_at = now
+            record.replacements += 1
+
+    # -- loop --
+
+    def start(self):
+        """Start the shared polling thread if it is not running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="tx-sequencer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"Receipt poll failed: {e}")
+            if self.pending == 0:
+                # Exit when idle; the next submit() restarts the loop
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+            self._stop.wait(self.poll_interval)